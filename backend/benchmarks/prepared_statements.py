@@ -0,0 +1,75 @@
+"""
+Latency of registered hot statements, prepared server side vs. unprepared.
+
+Runs against the database in DB_URI, the schema has to be migrated. The
+statements run on empty results, so the numbers are mostly planning cost:
+
+    PYTHONPATH=.:jarvis python benchmarks/prepared_statements.py --runs 2000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Optional
+from uuid import uuid4
+import numpy as np
+import psycopg
+from psycopg.rows import dict_row
+from jarvis.db.db import DB_URI
+from jarvis.db.statements import Params, Statement
+from jarvis.db.vector import as_vector, register_vector
+from jarvis.queries.query_handlers import (
+    GET_CHAT_MODEL,
+    GET_DOC_TOKENS,
+    READ_DOC_SEGMENTS,
+)
+from jarvis.question_pack.retriever import TEXT_CANDIDATES, VECTOR_CANDIDATES
+
+WARMUP_RUNS = 50
+
+
+async def bench(
+    statement: Statement, params: Params, prepare_threshold: Optional[int], runs: int
+) -> float:
+    """Mean latency in microseconds."""
+    async with await psycopg.AsyncConnection.connect(
+        DB_URI, autocommit=True, prepare_threshold=prepare_threshold
+    ) as conn:
+        await register_vector(conn)
+        async with conn.cursor(row_factory=dict_row) as cur:
+            for _ in range(WARMUP_RUNS):
+                await (await statement.execute(cur, params)).fetchall()
+            start = time.perf_counter()
+            for _ in range(runs):
+                await (await statement.execute(cur, params)).fetchall()
+            return (time.perf_counter() - start) / runs * 1e6
+
+
+async def main(runs: int):
+    retrieval = {
+        "pack_id": str(uuid4()),
+        "query_embedding": as_vector(np.full(1536, 0.01)),
+        "query": "how do i reset my password",
+        "deleted": False,
+        "k": 100,
+    }
+    cases = [
+        (VECTOR_CANDIDATES, retrieval),
+        (TEXT_CANDIDATES, retrieval),
+        (GET_CHAT_MODEL, (str(uuid4()),)),
+        (READ_DOC_SEGMENTS, ([str(uuid4())],)),
+        (GET_DOC_TOKENS, ([str(uuid4())],)),
+    ]
+    for statement, params in cases:
+        unprepared = await bench(statement, params, None, runs)
+        prepared = await bench(statement, params, 0, runs)
+        print(
+            f"{statement.name:<28} unprepared {unprepared:7.0f}us"
+            f"  prepared {prepared:7.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=2000)
+    asyncio.run(main(parser.parse_args().runs))
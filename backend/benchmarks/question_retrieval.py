@@ -0,0 +1,130 @@
+"""
+Question pack retrieval latency and recall per mode and pack size.
+
+Seeds one pack per size with random embeddings into the database in DB_URI
+(packs of the `benchmark` owner are reused on later runs), then times the
+retrieval engine in `exact`, `two_stage` and `auto` mode. Recall is the
+overlap of the top results with the ones of `exact` mode:
+
+    PYTHONPATH=.:jarvis python benchmarks/question_retrieval.py 1000 10000 100000
+
+Large packs take minutes to seed, the hnsw index is updated per row.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+from uuid import UUID, uuid4
+import numpy as np
+from jarvis.db.db import close_connection_pool, get_connection_pool
+from jarvis.db.vector import as_vector
+from jarvis.question_pack.importer import QUESTION_PAIR_TYPES
+from jarvis.question_pack.retriever import RetrievalEngine
+
+OWNER = "benchmark"
+DIMENSIONS = 1536
+MODES = ("exact", "two_stage", "auto")
+WORDS = (
+    "account billing cancel card delivery error invoice login order password "
+    "payment plan refund reset shipping upgrade"
+).split()
+
+
+async def seed_pack(size: int, rng: np.random.Generator) -> str:
+    pack_id = uuid4()
+    pool = await get_connection_pool("background")
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                """
+                INSERT INTO common.question_packs (id, owner, name, description)
+                VALUES (%s, %s, %s, 'retrieval benchmark')
+                """,
+                (pack_id, OWNER, f"benchmark {size}"),
+            )
+            cur = conn.cursor()
+            async with cur.copy(
+                """
+                COPY common.question_pairs
+                    (id, pack_id, question, answer, updated_by, metadata, question_embedding)
+                FROM STDIN (FORMAT BINARY)
+                """
+            ) as copy:
+                copy.set_types(QUESTION_PAIR_TYPES)
+                for _ in range(size):
+                    question = " ".join(rng.choice(WORDS, 6))
+                    await copy.write_row(
+                        (
+                            uuid4(),
+                            pack_id,
+                            question,
+                            f"answer to {question}",
+                            OWNER,
+                            None,
+                            as_vector(rng.standard_normal(DIMENSIONS)),
+                        )
+                    )
+        await conn.execute("ANALYZE common.question_pairs")
+    return str(pack_id)
+
+
+async def get_packs(sizes: List[int], rng: np.random.Generator) -> Dict[int, str]:
+    pool = await get_connection_pool("background")
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT p.id, COUNT(x.id)
+            FROM common.question_packs p
+            JOIN common.question_pairs x ON x.pack_id = p.id
+            WHERE p.owner = %s AND p.deleted = false
+            GROUP BY p.id
+            """,
+            (OWNER,),
+        )
+        existing = {size: str(id) for id, size in await cur.fetchall()}
+    packs = {}
+    for size in sizes:
+        if size not in existing:
+            print(f"seeding a pack of {size} questions")
+            existing[size] = await seed_pack(size, rng)
+        packs[size] = existing[size]
+    return packs
+
+
+async def main(sizes: List[int], queries: int):
+    rng = np.random.default_rng(0)
+    try:
+        packs = await get_packs(sizes, rng)
+        vectors = [as_vector(rng.standard_normal(DIMENSIONS)) for _ in range(queries)]
+        for size, pack_id in packs.items():
+            reference: List[List[UUID]] = []
+            for mode in MODES:
+                engine = RetrievalEngine(mode=mode)
+                timings, results = [], []
+                for vector in vectors:
+                    start = time.perf_counter()
+                    ranked = await engine.search(pack_id, "refund card payment", vector)
+                    timings.append(time.perf_counter() - start)
+                    results.append([r["id"] for r in ranked])
+                if mode == "exact":
+                    reference = results
+                recall = statistics.mean(
+                    len(set(a) & set(b)) / max(len(a), 1)
+                    for a, b in zip(reference, results)
+                )
+                print(
+                    f"{size:>8} {mode:<10} p50 {statistics.median(timings) * 1000:7.1f}ms"
+                    f"  recall {recall:.2f}"
+                )
+    finally:
+        await close_connection_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("sizes", type=int, nargs="+", help="questions per pack")
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.queries))
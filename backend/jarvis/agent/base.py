@@ -1,11 +1,14 @@
 from __future__ import annotations
 from typing import AsyncGenerator, Dict, Optional, Sequence, Union
 import logging
-from typing import TypedDict
+from typing import NotRequired, TypedDict
+from jarvis.agent.cache import graph_cache, graph_key
+from jarvis.agent.compaction import COMPACTION_TAG
 from jarvis.agent.utils import Memory
 from jarvis.context.context import Context
 from jarvis.messages.type import Message
 from langchain_anthropic import ChatAnthropic
+from langchain_core.messages.ai import UsageMetadata
 from langchain_google_vertexai import ChatVertexAI
 from langchain_openai import ChatOpenAI
 from langgraph.graph.state import CompiledStateGraph
@@ -21,25 +24,34 @@ load_dotenv()
 async def build_graph(
     llm: Union[ChatOpenAI, ChatVertexAI, ChatAnthropic],
     tools: Sequence[StructuredTool],
-    chat_id: str,
-    ctx: Context,
+    model_name: str,
+    personality_id: Optional[str] = None,
 ) -> CompiledStateGraph:
     mem = Memory()
     if not mem.saver:
         await mem.setup()
+
+    key = graph_key(model_name, tools, personality_id)
+    cached = graph_cache.get(key)
+    if cached is not None:
+        logger.info(f"reusing cached agent - {graph_cache.stats()}")
+        return cached
+
     await mem.check()
     if len(tools) > 0:
         logger.info("creating react agent")
-        agent_executor = build_react_chatbot(llm, mem, tools, chat_id, ctx)
+        agent_executor = build_react_chatbot(llm, mem, tools)
     else:
         logger.info("creating basic chatbot")
-        agent_executor = build_basic_chatbot(llm, mem, chat_id, ctx)
+        agent_executor = build_basic_chatbot(llm, mem)
+    graph_cache.put(key, agent_executor)
     return agent_executor
 
 
 class StreamData(TypedDict):
     type: StreamType
     data: str
+    usage: NotRequired[UsageMetadata]
 
 
 class StreamType(TypedDict):
@@ -48,14 +60,16 @@ class StreamType(TypedDict):
 
 
 async def runner(
-    app: CompiledStateGraph, input: Dict, event_name: str
+    app: CompiledStateGraph, input: Dict, event_name: str, ctx: Context
 ) -> AsyncGenerator[StreamData]:
     async for event in app.astream_events(
-        input, config={"configurable": {"thread_id": event_name}}
+        input, config={"configurable": {"thread_id": event_name, "ctx": ctx}}
     ):
         # print("event:", event)
         kind = event["event"]
         if kind == "on_chat_model_stream":
+            if COMPACTION_TAG in event.get("tags", []):
+                continue
             content = event["data"]["chunk"].content  # type: ignore
             # logger.info(f"on_chat_model_stream - {content}")
             if content:
@@ -72,6 +86,18 @@ async def runner(
                 type=StreamType(logical_type="on_tool_start", type="tools"),
             )
 
+        elif kind == "on_chat_model_end":
+            # the summary call of the compaction node is not part of the response
+            if COMPACTION_TAG in event.get("tags", []):
+                continue
+            # token usage incl. provider prompt cache reads, one per model call
+            usage = getattr(event["data"].get("output"), "usage_metadata", None)
+            if usage:
+                yield StreamData(
+                    data="",
+                    type=StreamType(logical_type="on_chat_model_end", type="agent"),
+                    usage=usage,
+                )
         elif kind == "on_tool_end":
             logger.info(f"Done tool: {event['name']}")
     logger.info("Runner done")
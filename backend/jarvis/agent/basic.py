@@ -1,11 +1,12 @@
 from __future__ import annotations
-from typing import Annotated, Optional, Union
+from typing import Annotated, Any, NotRequired, Optional, Union
+from jarvis.agent.compaction import compact_history
 from jarvis.agent.utils import Memory
 from jarvis.context.context import Context
-from jarvis.messages.type import Message
-from jarvis.messages.utils import convert_to_langchain_message
+from jarvis.models.caching import build_prompt, model_provider
 from langchain_anthropic import ChatAnthropic
 from langchain_core.messages.base import BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_google_vertexai import ChatVertexAI
 from langchain_openai import ChatOpenAI
 from langgraph.graph.state import CompiledStateGraph
@@ -19,31 +20,38 @@ class State(TypedDict):
     # in the annotation defines how this state key should be updated
     # (in this case, it appends messages to the list, rather than overwriting them)
     messages: Annotated[list, add_messages]
+    # running summary of compacted turns, see jarvis.agent.compaction
+    summary: NotRequired[str]
 
 
 def build_basic_chatbot(
     llm: Union[ChatOpenAI, ChatVertexAI, ChatAnthropic],
     memory: Memory,
-    chat_id: str,
-    ctx: Context,
 ) -> CompiledStateGraph:
     graph_builder = StateGraph(State)
+    provider = model_provider(llm)
 
-    def chatbot(state: State) -> dict[str, list[BaseMessage]]:
-        s = (
-            [convert_to_langchain_message(ctx.system_prompt)]
-            if ctx.system_prompt
-            else []
+    def chatbot(state: State, config: RunnableConfig) -> dict[str, list[BaseMessage]]:
+        ctx = Context.from_config(config)
+        messages, kwargs = build_prompt(
+            provider,
+            ctx.system_prompt,
+            state["messages"],
+            state.get("summary"),
+            getattr(llm, "extra_body", None),
         )
-        return {"messages": [llm.invoke(s + state["messages"])]}
+        return {"messages": [llm.invoke(messages, **kwargs)]}
+
+    async def compact(state: State, config: RunnableConfig) -> dict[str, Any]:
+        return await compact_history(state, config, llm, provider)  # type: ignore
 
     # The first argument is the unique node name
     # The second argument is the function or object that will be called whenever
     # the node is used.
     graph_builder.add_node("chatbot", chatbot)
-    graph_builder.add_edge(START, "chatbot")
+    graph_builder.add_node("compact", compact)
+    graph_builder.add_edge(START, "compact")
+    graph_builder.add_edge("compact", "chatbot")
     graph_builder.add_edge("chatbot", END)
-    graph = graph_builder.compile(checkpointer=memory.saver).with_config(
-        {"configurable": {"thread_id": chat_id}}
-    )
+    graph = graph_builder.compile(checkpointer=memory.saver)
     return graph
@@ -0,0 +1,79 @@
+from __future__ import annotations
+from collections import OrderedDict
+import logging
+import os
+from typing import Hashable, Optional, Sequence, Tuple, TypedDict
+from langchain.tools import StructuredTool
+from langgraph.graph.state import CompiledStateGraph
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+
+GraphKey = Tuple[str, Tuple[Tuple[str, str], ...], Optional[str]]
+
+
+class GraphCacheStats(TypedDict):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+def graph_key(
+    model_name: str,
+    tools: Sequence[StructuredTool],
+    personality_id: Optional[str],
+) -> GraphKey:
+    # tool descriptions embed the pack description, so they are part of the key
+    tool_signature = tuple(sorted((tool.name, tool.description) for tool in tools))
+    return (model_name, tool_signature, personality_id)
+
+
+class GraphCache:
+    """
+    Bounded LRU cache of compiled agent graphs.
+
+    Compiled graphs are chat agnostic, the per-chat `Context` and `thread_id`
+    are passed in the runnable config at invoke time.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._graphs: OrderedDict[Hashable, CompiledStateGraph] = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[CompiledStateGraph]:
+        graph = self._graphs.get(key)
+        if graph is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._graphs.move_to_end(key)
+        return graph
+
+    def put(self, key: Hashable, graph: CompiledStateGraph):
+        self._graphs[key] = graph
+        self._graphs.move_to_end(key)
+        while len(self._graphs) > self.max_size:
+            self._graphs.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._graphs.clear()
+
+    def stats(self) -> GraphCacheStats:
+        return GraphCacheStats(
+            size=len(self._graphs),
+            max_size=self.max_size,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+graph_cache = GraphCache(max_size=int(os.getenv("AGENT_GRAPH_CACHE_SIZE", "128")))
@@ -0,0 +1,201 @@
+from __future__ import annotations
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.runnables import RunnableConfig
+from jarvis.models.caching import Provider
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+COMPACTION_TAG = "compaction"
+COMPACTION_MAX_TOKENS = int(os.getenv("COMPACTION_MAX_TOKENS", "32000"))
+COMPACTION_KEEP_TURNS = max(1, int(os.getenv("COMPACTION_KEEP_TURNS", "3")))
+COMPACTION_TOOL_PAYLOAD_CHARS = int(os.getenv("COMPACTION_TOOL_PAYLOAD_CHARS", "2000"))
+
+# rough per provider estimates, exact counting needs a network round trip for
+# anthropic and google
+CHARS_PER_TOKEN: Dict[Provider, float] = {
+    "openai": 4.0,
+    "antrophic": 3.5,
+    "google": 4.0,
+}
+IMAGE_TOKENS = 1600
+TRUNCATION_MARKER = "\n\n[... output truncated during history compaction]"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+The summary replaces the original messages, so keep facts, decisions, user preferences, open questions and
+references to documents or tool results that later turns may rely on. Be concise and write in plain prose."""
+
+
+def _blocks(msg: BaseMessage) -> List[Any]:
+    return [msg.content] if isinstance(msg.content, str) else list(msg.content)
+
+
+def _text(msg: BaseMessage) -> str:
+    out = []
+    for block in _blocks(msg):
+        if isinstance(block, str):
+            out.append(block)
+        elif block.get("type") == "text":
+            out.append(block.get("text", ""))
+        elif block.get("type") == "tool_use":
+            out.append(json.dumps(block.get("input", {})))
+    return "\n".join(out)
+
+
+def count_tokens(
+    provider: Provider, llm: BaseChatModel, messages: Sequence[BaseMessage]
+) -> int:
+    images = sum(
+        1
+        for msg in messages
+        for block in _blocks(msg)
+        if isinstance(block, dict) and block.get("type") in ("image_url", "image")
+    )
+    text = "\n".join(
+        _text(msg)
+        + "".join(json.dumps(tc["args"]) for tc in getattr(msg, "tool_calls", []))
+        for msg in messages
+    )
+    if provider == "openai":
+        try:
+            # tiktoken, runs locally
+            return llm.get_num_tokens(text) + images * IMAGE_TOKENS
+        except Exception as err:
+            logger.debug(f"tiktoken unavailable, falling back to estimate: {err}")
+    return int(len(text) / CHARS_PER_TOKEN[provider]) + images * IMAGE_TOKENS
+
+
+def _turn_starts(messages: Sequence[BaseMessage]) -> List[int]:
+    # human messages directly after tool messages carry tool output (images)
+    return [
+        i
+        for i, msg in enumerate(messages)
+        if isinstance(msg, HumanMessage)
+        and (i == 0 or not isinstance(messages[i - 1], ToolMessage))
+    ]
+
+
+def _is_tool_payload(messages: Sequence[BaseMessage], i: int) -> bool:
+    msg = messages[i]
+    return isinstance(msg, ToolMessage) or (
+        isinstance(msg, HumanMessage)
+        and i > 0
+        and isinstance(messages[i - 1], ToolMessage)
+    )
+
+
+def _prune_payload(msg: BaseMessage, limit: int) -> Optional[BaseMessage]:
+    blocks = _blocks(msg)
+    has_media = any(isinstance(b, dict) and b.get("type") != "text" for b in blocks)
+    text = _text(msg)
+    if not has_media and len(text) <= limit:
+        return None
+    parts = [text[:limit] + TRUNCATION_MARKER if len(text) > limit else text]
+    if has_media:
+        parts.append("[non-text tool output omitted during history compaction]")
+    # same id, the reducer replaces the checkpointed message
+    return msg.model_copy(update={"content": "\n\n".join(p for p in parts if p)})
+
+
+def _transcript(messages: Sequence[BaseMessage], limit: int) -> str:
+    lines = []
+    for msg in messages:
+        text = _text(msg)
+        if len(text) > limit:
+            text = text[:limit] + TRUNCATION_MARKER
+        if isinstance(msg, ToolMessage):
+            lines.append(f"Tool ({msg.name or 'tool'}): {text}")
+        elif isinstance(msg, AIMessage):
+            calls = ", ".join(tc["name"] for tc in msg.tool_calls)
+            lines.append(
+                f"Assistant: {text}" + (f" [called tools: {calls}]" if calls else "")
+            )
+        else:
+            lines.append(f"User: {text}")
+    return "\n\n".join(lines)
+
+
+async def summarize(
+    llm: BaseChatModel,
+    previous: Optional[str],
+    messages: Sequence[BaseMessage],
+) -> str:
+    transcript = _transcript(messages, COMPACTION_TOOL_PAYLOAD_CHARS)
+    request = (
+        f"Current summary:\n\n{previous}\n\nExtend it with these newer messages:\n\n{transcript}"
+        if previous
+        else f"Summarize these messages:\n\n{transcript}"
+    )
+    res = await llm.ainvoke(
+        [SystemMessage(SUMMARY_PROMPT), HumanMessage(request)],
+        # keeps the summary out of the streamed response, see agent.base.runner
+        config={"tags": [COMPACTION_TAG]},
+    )
+    if getattr(res, "tool_calls", None):
+        raise ValueError("summary request was answered with a tool call")
+    summary = _text(res).strip()
+    if not summary:
+        raise ValueError("summary request returned no text")
+    return summary
+
+
+async def compact_history(
+    state: Dict[str, Any],
+    config: RunnableConfig,
+    llm: BaseChatModel,
+    provider: Provider,
+) -> Dict[str, Any]:
+    """
+    Keeps the checkpointed history within `COMPACTION_MAX_TOKENS`.
+
+    Tool payloads of finished turns are truncated in place. Once the history
+    is over budget, everything but the last `COMPACTION_KEEP_TURNS` turns is
+    folded into the running summary and removed from the state.
+    """
+    messages: List[BaseMessage] = state["messages"]
+    starts = _turn_starts(messages)
+    current = starts[-1] if starts else len(messages)
+
+    updates: Dict[int, BaseMessage] = {}
+    for i in range(current):
+        if _is_tool_payload(messages, i):
+            pruned = _prune_payload(messages[i], COMPACTION_TOOL_PAYLOAD_CHARS)
+            if pruned is not None:
+                updates[i] = pruned
+    history = [updates.get(i, msg) for i, msg in enumerate(messages)]
+
+    tokens = count_tokens(provider, llm, history)
+    if tokens <= COMPACTION_MAX_TOKENS or len(starts) <= COMPACTION_KEEP_TURNS:
+        return {"messages": list(updates.values())}
+
+    cut = starts[-COMPACTION_KEEP_TURNS]
+    try:
+        summary = await summarize(llm, state.get("summary"), history[:cut])
+    except Exception as err:
+        logger.warning(f"history summarization failed, keeping full history: {err}")
+        return {"messages": list(updates.values())}
+
+    logger.info(f"compacted {cut} messages (~{tokens} tokens) into the summary")
+    return {
+        "messages": [RemoveMessage(id=_message_id(msg)) for msg in messages[:cut]]
+        + [msg for i, msg in updates.items() if i >= cut],
+        "summary": summary,
+    }
+
+
+def _message_id(msg: BaseMessage) -> str:
+    assert msg.id, "checkpointed messages always carry an id"
+    return msg.id
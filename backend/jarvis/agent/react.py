@@ -1,10 +1,9 @@
 from __future__ import annotations
+from jarvis.agent.compaction import compact_history
 from jarvis.agent.utils import Memory
 from jarvis.context.context import Context
-from jarvis.messages.type import Message
-from jarvis.messages.utils import convert_to_langchain_message
+from jarvis.models.caching import Provider, build_prompt, model_provider
 from langchain_anthropic import ChatAnthropic
-from langchain_core.language_models.chat_models import BaseChatModel
 from langchain.tools import StructuredTool
 from typing import (
     Annotated,
@@ -14,6 +13,8 @@ from typing import (
     Dict,
     List,
     Literal,
+    Mapping,
+    NotRequired,
     Optional,
     Sequence,
     TypedDict,
@@ -23,7 +24,7 @@ from langchain_core.messages import BaseMessage, ToolMessage
 from langchain_google_vertexai import ChatVertexAI
 from langchain_openai import ChatOpenAI
 from langgraph.graph.message import add_messages
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig
 from langgraph.graph import StateGraph, END
 import asyncio
 from langgraph.graph.state import CompiledStateGraph
@@ -35,14 +36,17 @@ class AgentState(TypedDict):
     # add_messages is a reducer
     # See https://langchain-ai.github.io/langgraph/concepts/low_level/#reducers
     messages: Annotated[list[BaseMessage], add_messages]
+    # running summary of compacted turns, see jarvis.agent.compaction
+    summary: NotRequired[str]
 
 
 async def tool_call_handler(
-    fun: Callable[[Any], Awaitable[Union[Dict[str, Any], str]]],
+    fun: Callable[[Any, RunnableConfig], Awaitable[Union[Dict[str, Any], str]]],
     context: Dict[str, Any],
     model: str,
+    config: RunnableConfig,
 ) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
-    res = await fun(context["args"])
+    res = await fun(context["args"], config)
     if not isinstance(res, (str, dict)):
         raise TypeError("Expected str or list result from tool")
     if isinstance(res, str):
@@ -88,7 +92,10 @@ def flatten(x: List):
 
 # Define our tool node
 async def tool_node(
-    state: AgentState, tools_by_name: Dict[str, StructuredTool], model: str
+    state: AgentState,
+    config: RunnableConfig,
+    tools_by_name: Dict[str, StructuredTool],
+    model: str,
 ) -> Dict[str, List[ToolMessage]]:
 
     # print("tool calls:", state["messages"][-1].tool_calls)
@@ -96,7 +103,7 @@ async def tool_node(
     outputs = await asyncio.gather(
         *[
             tool_call_handler(
-                tools_by_name[tool_call["name"]].ainvoke, tool_call, model
+                tools_by_name[tool_call["name"]].ainvoke, tool_call, model, config
             )
             for tool_call in tool_calls
         ],
@@ -129,13 +136,19 @@ async def tool_node(
 async def call_model(
     state: AgentState,
     config: RunnableConfig,
-    model: BaseChatModel,
-    ctx: Context,
+    model: Runnable,
+    provider: Provider,
+    extra_body: Optional[Mapping[str, Any]] = None,
 ) -> Dict[str, List[BaseMessage]]:
-    # TODO: handle chat history compaction here
-
-    s = [convert_to_langchain_message(ctx.system_prompt)] if ctx.system_prompt else []
-    res = await model.ainvoke(s + state["messages"], config)
+    ctx = Context.from_config(config)
+    messages, kwargs = build_prompt(
+        provider,
+        ctx.system_prompt,
+        state["messages"],
+        state.get("summary"),
+        extra_body,
+    )
+    res = await model.ainvoke(messages, config, **kwargs)
     # We return a list, because this will get added to the existing list
     return {"messages": [res]}
 
@@ -156,28 +169,31 @@ def build_react_chatbot(
     llm: Union[ChatOpenAI, ChatVertexAI, ChatAnthropic],
     mem: Memory,
     tools: Sequence[StructuredTool],
-    chat_id: str,
-    ctx: Context,
 ) -> CompiledStateGraph:
-    if isinstance(llm, ChatOpenAI):
-        model = "openai"
-    elif isinstance(llm, ChatAnthropic):
-        model = "antrophic"
-    elif isinstance(llm, ChatVertexAI):
-        model = "google"
-    else:
-        raise TypeError("Unsupported LLM type")
+    model = model_provider(llm)
+    # summaries are requested from the model without tools, a tool call
+    # instead of text would replace the history with an empty summary
+    base_llm = llm
+
+    async def compact_partial(
+        state: AgentState, config: RunnableConfig
+    ) -> Dict[str, Any]:
+        return await compact_history(state, config, base_llm, model)  # type: ignore
 
+    # the bound model no longer exposes its configured extra_body
+    extra_body = getattr(llm, "extra_body", None)
     llm = llm.bind_tools(tools)  # type: ignore
     tools_by_name = {tool.name: tool for tool in tools}
 
-    async def tool_node_partial(state: AgentState) -> Dict[str, List]:
-        return await tool_node(state, tools_by_name, model)
+    async def tool_node_partial(
+        state: AgentState, config: RunnableConfig
+    ) -> Dict[str, List]:
+        return await tool_node(state, config, tools_by_name, model)
 
     async def call_model_partial(
         state: AgentState, config: RunnableConfig
     ) -> Dict[str, List[BaseMessage]]:
-        return await call_model(state, config, llm, ctx)
+        return await call_model(state, config, llm, model, extra_body)
 
     # Define a new graph
     workflow = StateGraph(AgentState)
@@ -185,10 +201,13 @@ def build_react_chatbot(
     # Define the two nodes we will cycle between
     workflow.add_node("agent", call_model_partial)
     workflow.add_node("tools", tool_node_partial)
+    # history compaction runs once per turn, before the first model call
+    workflow.add_node("compact", compact_partial)
 
-    # Set the entrypoint as `agent`
+    # Set the entrypoint as `compact`
     # This means that this node is the first one called
-    workflow.set_entry_point("agent")
+    workflow.set_entry_point("compact")
+    workflow.add_edge("compact", "agent")
 
     # We now add a conditional edge
     workflow.add_conditional_edges(
@@ -216,7 +235,5 @@ def build_react_chatbot(
     workflow.add_edge("tools", "agent")
 
     # Now we can compile and visualize our graph
-    graph = workflow.compile(checkpointer=mem.saver).with_config(
-        {"configurable": {"thread_id": chat_id}}
-    )
+    graph = workflow.compile(checkpointer=mem.saver)
     return graph
@@ -11,11 +11,11 @@ class Memory:
     @classmethod
     async def setup(cls):
         cls.logger.info("setting up memory")
-        pool = await get_connection_pool()
+        pool = await get_connection_pool("agent")
         cls.saver = AsyncPostgresSaver(pool)  # type: ignore
         await cls.saver.setup()
 
     @classmethod
     async def check(cls):
         cls.logger.info("checking db connections...")
-        await check_connection_pool()
+        await check_connection_pool("agent")
@@ -39,6 +39,7 @@ app.include_router(doc_router)
 app.include_router(question_pack_router)
 app.include_router(personality_router)
 app.include_router(misc_router)
+app.include_router(admin_router)
 
 
 # @app.get("/api/v1/users/{user_id}/chats")
@@ -3,6 +3,7 @@ from .doc import router as doc_router
 from .question_pack import router as question_pack_router
 from .personality import router as personality_router
 from .misc import router as misc_router
+from .admin import router as admin_router
 
 __all__ = [
     "chat_router",
@@ -10,4 +11,5 @@ __all__ = [
     "question_pack_router",
     "personality_router",
     "misc_router",
+    "admin_router",
 ]
@@ -0,0 +1,163 @@
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel
+import logging
+from jarvis.db.db import pool_metrics, supervisor
+from jarvis.generation import generation_locks, generation_registry
+from jarvis.lookup_cache import lookup_cache
+from jarvis.models.pool import model_pool
+from jarvis.prompt_cache import prompt_cache
+from jarvis.question_pack.embedding_cache import embedding_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+async def require_admin(req: Request):
+    if req.state.claims.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin role required.")
+
+
+router = APIRouter(
+    prefix="/api/v1/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+)
+
+
+class ProviderConnectionMetrics(BaseModel):
+    clients: int
+    hits: int
+    misses: int
+    requests: int
+    pending: int
+    errors: int
+    connections: int
+    idle_connections: int
+
+
+class ModelClientMetrics(BaseModel):
+    providers: Dict[str, ProviderConnectionMetrics]
+
+
+@router.get("/metrics/models", response_model=ModelClientMetrics)
+async def get_model_client_metrics() -> ModelClientMetrics:
+    return ModelClientMetrics(
+        providers={
+            provider: ProviderConnectionMetrics(**metrics)
+            for provider, metrics in model_pool.metrics().items()
+        }
+    )
+
+
+class GenerationLockMetrics(BaseModel):
+    backend: str
+    active: int
+    queued: int
+    max_queue_depth: int
+    acquisitions: int
+    contended: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+@router.get("/metrics/generation-locks", response_model=GenerationLockMetrics)
+async def get_generation_lock_metrics() -> GenerationLockMetrics:
+    return GenerationLockMetrics(**generation_locks.metrics())
+
+
+class RunningGeneration(BaseModel):
+    chat_id: str
+    message_id: str
+    user_id: Optional[str]
+    model: Optional[str]
+    age_s: float
+    tokens_streamed: int
+    chars_streamed: int
+    timeout_s: Optional[float]
+
+
+@router.get("/generations", response_model=List[RunningGeneration])
+async def get_running_generations() -> List[RunningGeneration]:
+    return [RunningGeneration(**g) for g in generation_registry.snapshot()]
+
+
+class PromptCacheMetrics(BaseModel):
+    memory_entries: int
+    memory_bytes: int
+    disk_bytes: int
+    memory_hits: int
+    disk_hits: int
+    misses: int
+
+
+@router.get("/metrics/prompt-cache", response_model=PromptCacheMetrics)
+async def get_prompt_cache_metrics() -> PromptCacheMetrics:
+    return PromptCacheMetrics(**prompt_cache.stats())
+
+
+class EmbeddingCacheMetrics(BaseModel):
+    memory_entries: int
+    memory_hits: int
+    db_hits: int
+    misses: int
+
+
+@router.get("/metrics/embedding-cache", response_model=EmbeddingCacheMetrics)
+async def get_embedding_cache_metrics() -> EmbeddingCacheMetrics:
+    return EmbeddingCacheMetrics(**embedding_cache.stats())
+
+
+class LookupCacheMetrics(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    invalidations: int
+    hit_rate: float
+
+
+@router.get("/metrics/lookup-cache", response_model=Dict[str, LookupCacheMetrics])
+async def get_lookup_cache_metrics() -> Dict[str, LookupCacheMetrics]:
+    return {
+        name: LookupCacheMetrics(**metrics)
+        for name, metrics in lookup_cache.stats().items()
+    }
+
+
+class ConnectionPoolMetrics(BaseModel):
+    min_size: int
+    max_size: int
+    size: int
+    available: int
+    waiting: int
+    requests: int
+    queued: int
+    timeouts: int
+    avg_wait_ms: float
+    saturation: float
+
+
+class DatabaseHealth(BaseModel):
+    state: str
+    consecutive_failures: int
+    checks: int
+    errors: int
+    connections_lost: int
+    last_check: Optional[str]
+    last_error: Optional[str]
+
+
+class DatabaseMetrics(BaseModel):
+    pools: Dict[str, ConnectionPoolMetrics]
+    health: DatabaseHealth
+
+
+@router.get("/metrics/db-pools", response_model=DatabaseMetrics)
+async def get_db_pool_metrics() -> DatabaseMetrics:
+    return DatabaseMetrics(
+        pools={
+            name: ConnectionPoolMetrics(**metrics)
+            for name, metrics in pool_metrics().items()
+        },
+        health=DatabaseHealth(**supervisor.health()),
+    )
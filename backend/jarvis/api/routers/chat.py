@@ -1,12 +1,16 @@
 import asyncio
+import base64
 import datetime
-from typing import Any, List, Optional, Union
+import json
+from typing import Annotated, Any, AsyncIterator, List, Optional, Union
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import logging
 from jarvis.chat.chat_title import create_chat_title
 from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
 from jarvis.messages.type import MessageContent
 from jarvis.models.models import model_factory
 from jarvis.queries.query_handlers import (
@@ -60,6 +64,22 @@ class UserChats(BaseModel):
     chats: List[UserChat]
 
 
+GET_ALL_USER_CHATS = statements.register(
+    "get_all_user_chats",
+    """
+        SELECT 
+            id,
+            owner_email,
+            title,
+            created_at, 
+            updated_at
+        FROM common.chat_history 
+        WHERE owner_email = %(user_id)s AND deleted = %(deleted)s
+        ORDER BY updated_at DESC
+    """,
+)
+
+
 @router.get(
     "",
     response_model=UserChats,
@@ -73,23 +93,12 @@ class UserChats(BaseModel):
 )
 async def get_all_user_chats(req: Request, deleted: bool = False) -> UserChats:
     user_id: str = req.state.claims["sub"]
-    query = """
-        SELECT 
-            id,
-            owner_email,
-            title,
-            created_at, 
-            updated_at
-        FROM common.chat_history 
-        WHERE owner_email = %(user_id)s AND deleted = %(deleted)s
-        ORDER BY updated_at DESC
-    """
     try:
         pool = await get_connection_pool()
         async with pool.connection() as conn:
             async with conn.cursor(row_factory=dict_row) as cur:
-                resp = await cur.execute(
-                    query,
+                resp = await GET_ALL_USER_CHATS.execute(
+                    cur,
                     {
                         "user_id": user_id,
                         "deleted": deleted,
@@ -229,20 +238,24 @@ class ChatTitle(BaseModel):
     title: Optional[str] = None
 
 
-@router.get("/{chat_id}/title", response_model=ChatTitle)
-async def get_chat_title(chat_id: str) -> ChatTitle:
-    query = """
+GET_CHAT_TITLE = statements.register(
+    "get_chat_title",
+    """
         SELECT
             title
         FROM common.chat_history
         WHERE id = (%s)
-    """
+    """,
+)
+
 
+@router.get("/{chat_id}/title", response_model=ChatTitle)
+async def get_chat_title(chat_id: str) -> ChatTitle:
     try:
         pool = await get_connection_pool()
         async with pool.connection() as conn:
             async with conn.cursor(row_factory=dict_row) as cur:
-                resp = await cur.execute(query, (chat_id,))
+                resp = await GET_CHAT_TITLE.execute(cur, (chat_id,))
                 res = await resp.fetchall()
                 return ChatTitle(title=res[0]["title"] if res else None)
 
@@ -257,6 +270,7 @@ async def get_chat_title(chat_id: str) -> ChatTitle:
 class ChatMessage(BaseModel):
     chatId: UUID
     content: list[MessageContent]
+    context: Optional[str] = None
     createdAt: datetime.datetime
     data: Optional[dict[str, Any]] = None
     id: UUID
@@ -268,51 +282,147 @@ class ChatMessage(BaseModel):
 
 class MessageHistory(BaseModel):
     messages: List[ChatMessage]
+    nextCursor: Optional[str] = None
 
 
-@router.get("/{chat_id}/messages", response_model=MessageHistory)
-async def get_chat_messages(chat_id: str) -> MessageHistory:
-    query = """
-        SELECT 
+MESSAGE_COLUMNS = """
             chat_id,
-            content, 
+            content,
             created_at,
             data,
             id,
-            liked, 
+            liked,
             role,
             score,
-            updated_at,
-            context 
+            updated_at"""
+
+GET_CHAT_MESSAGES = statements.register(
+    "get_chat_messages",
+    f"""
+        SELECT {MESSAGE_COLUMNS}
+        FROM common.message_history
+        WHERE chat_id = %(chat_id)s AND role IN ('user', 'assistant')
+        ORDER BY created_at ASC
+    """,
+)
+
+GET_CHAT_MESSAGES_WITH_CONTEXT = statements.register(
+    "get_chat_messages_with_context",
+    f"""
+        SELECT {MESSAGE_COLUMNS},
+            context
         FROM common.message_history
         WHERE chat_id = %(chat_id)s AND role IN ('user', 'assistant')
         ORDER BY created_at ASC
+    """,
+)
+
+
+def _message_page_query(include_context: bool, before: bool) -> str:
+    return f"""
+        SELECT {MESSAGE_COLUMNS}{", context" if include_context else ""}
+        FROM common.message_history
+        WHERE chat_id = %(chat_id)s AND role IN ('user', 'assistant')
+            {"AND (created_at, id) < (%(before_created_at)s, %(before_id)s)" if before else ""}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %(limit)s
     """
 
+
+def _encode_cursor(created_at: datetime.datetime, id: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime.datetime, UUID]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(created_at), UUID(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _to_chat_message(r: dict[str, Any]) -> ChatMessage:
+    return ChatMessage(
+        chatId=r["chat_id"],
+        content=r["content"],
+        context=r.get("context"),
+        createdAt=r["created_at"],
+        data=r["data"],
+        id=r["id"],
+        liked=r["liked"],
+        role=r["role"],
+        score=r["score"],
+        updatedAt=r["updated_at"],
+    )
+
+
+async def _stream_chat_messages(
+    chat_id: str, include_context: bool
+) -> AsyncIterator[str]:
+    statement = GET_CHAT_MESSAGES_WITH_CONTEXT if include_context else GET_CHAT_MESSAGES
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            # rows are fetched one at a time, the history is never held in memory
+            async for r in cur.stream(statement.sql, {"chat_id": chat_id}):
+                yield _to_chat_message(r).model_dump_json() + "\n"
+
+
+@router.get("/{chat_id}/messages", response_model=MessageHistory)
+async def get_chat_messages(
+    chat_id: str,
+    limit: Annotated[Optional[int], Query(ge=1)] = None,
+    before: Optional[str] = None,
+    include_context: bool = False,
+    stream: bool = False,
+) -> Union[MessageHistory, StreamingResponse]:
+    """
+    Without `limit` the whole history is returned oldest first. With `limit`
+    a page of the newest messages is returned newest first, pass its
+    `nextCursor` as `before` for the next older page. `stream` exports the
+    whole history as NDJSON, one message per line. The retrieval `context`
+    of a message is only included with `include_context`.
+    """
+    if stream:
+        return StreamingResponse(
+            _stream_chat_messages(chat_id, include_context),
+            media_type="application/x-ndjson",
+        )
+    before_created_at, before_id = _decode_cursor(before) if before else (None, None)
     try:
         pool = await get_connection_pool()
         async with pool.connection() as conn:
             async with conn.cursor(row_factory=dict_row) as cur:
+                if limit is None:
+                    statement = (
+                        GET_CHAT_MESSAGES_WITH_CONTEXT
+                        if include_context
+                        else GET_CHAT_MESSAGES
+                    )
+                    resp = await statement.execute(cur, {"chat_id": chat_id})
+                    res = await resp.fetchall()
+                    return MessageHistory(messages=[_to_chat_message(r) for r in res])
+
                 resp = await cur.execute(
-                    query,
-                    {"chat_id": chat_id},
+                    _message_page_query(include_context, before is not None),
+                    {
+                        "chat_id": chat_id,
+                        "before_created_at": before_created_at,
+                        "before_id": before_id,
+                        # one extra row tells whether there is an older page
+                        "limit": limit + 1,
+                    },
                 )
                 res = await resp.fetchall()
+                page = res[:limit]
                 return MessageHistory(
-                    messages=[
-                        ChatMessage(
-                            chatId=r["chat_id"],
-                            content=r["content"],
-                            createdAt=r["created_at"],
-                            data=r["data"],
-                            id=r["id"],
-                            liked=r["liked"],
-                            role=r["role"],
-                            score=r["score"],
-                            updatedAt=r["updated_at"],
-                        )
-                        for r in res
-                    ]
+                    messages=[_to_chat_message(r) for r in page],
+                    nextCursor=(
+                        _encode_cursor(page[-1]["created_at"], page[-1]["id"])
+                        if len(res) > limit
+                        else None
+                    ),
                 )
     except Exception as err:
         logger.error(f"failed to fetch message history: {err}", exc_info=True)
@@ -6,6 +6,8 @@ import logging
 from pydantic import BaseModel
 from jarvis.blob_storage import resolve_storage
 from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
+from jarvis.lookup_cache import lookup_cache
 from psycopg.rows import dict_row
 
 
@@ -27,6 +29,22 @@ class UserDocuments(BaseModel):
     docs: List[UserDocument]
 
 
+GET_USER_DOCS = statements.register(
+    "get_user_docs",
+    """
+        SELECT 
+            document_id,
+            document_name,
+            num_pages,
+            num_tokens,
+            created_at 
+        FROM common.document_repo
+        WHERE owner = %(user_id)s AND deleted = %(deleted)s
+        ORDER BY updated_at DESC
+    """,
+)
+
+
 @router.get(
     "",
     response_model=UserDocuments,
@@ -39,24 +57,13 @@ class UserDocuments(BaseModel):
 )
 async def get_user_docs(req: Request, deleted: bool = False) -> UserDocuments:
     user_id: str = req.state.claims["sub"]
-    query = """
-        SELECT 
-            document_id,
-            document_name,
-            num_pages,
-            num_tokens,
-            created_at 
-        FROM common.document_repo
-        WHERE owner = %(user_id)s AND deleted = %(deleted)s
-        ORDER BY updated_at DESC
-    """
     try:
         storage = resolve_storage()
         pool = await get_connection_pool()
         async with pool.connection() as conn:
             async with conn.cursor(row_factory=dict_row) as cur:
-                resp = await cur.execute(
-                    query,
+                resp = await GET_USER_DOCS.execute(
+                    cur,
                     {
                         "user_id": user_id,
                         "deleted": deleted,
@@ -111,7 +118,8 @@ async def delete_doc(doc_id: str) -> DeleteDocumentResult:
                 async with conn.cursor(row_factory=dict_row) as cur:
                     resp = await cur.execute(query, (doc_id,))
                     res = await resp.fetchall()
-                    return DeleteDocumentResult(id=res[0]["document_id"])
+        await lookup_cache.invalidate("doc_tokens", doc_id)
+        return DeleteDocumentResult(id=res[0]["document_id"])
     except Exception as err:
         logger.error(f"failed to delete user document: {err}", exc_info=True)
         raise HTTPException(
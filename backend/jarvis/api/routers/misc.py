@@ -7,6 +7,7 @@ from psycopg.rows import dict_row
 from jarvis.blob_storage import resolve_storage
 from jarvis.db.db import get_connection_pool
 from jarvis.document_parsers.parser import resolve_parser
+from jarvis.lookup_cache import lookup_cache
 from jarvis.models import ALL_SUPPORTED_MODELS
 from jarvis.models.models import get_default_model
 from jarvis.queries.query_handlers import insert_doc
@@ -200,7 +201,8 @@ async def set_user_model_selection(
                         },
                     )
                     res = await resp.fetchall()
-                    return SetModelResult(model=res[0]["model_name"])
+        await lookup_cache.invalidate("model_selection", user_id)
+        return SetModelResult(model=res[0]["model_name"])
     except Exception as err:
         logger.error(f"failed to update user model: {err}", exc_info=True)
         raise HTTPException(
@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from psycopg.rows import dict_row
 import logging
 from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
 from jarvis.tools import ALL_AVAILABLE_TOOLS
 
 
@@ -106,6 +107,21 @@ async def get_default_personality(req: Request) -> Personality:
         )
 
 
+GET_USER_PERSONALITIES = statements.register(
+    "get_user_personalities",
+    """
+        SELECT 
+            id,
+            description,
+            name,
+            owner
+        FROM common.personalities
+        WHERE deleted = false AND owner IN ('system', %(user_id)s)
+        ORDER BY updated_at DESC
+    """,
+)
+
+
 @router.get(
     "",
     response_model=Personalities,
@@ -120,16 +136,6 @@ async def get_default_personality(req: Request) -> Personality:
 async def get_user_personalities(req: Request) -> Personalities:
     user_id: str = req.state.claims["sub"]
     # TODO: This needs to be a join!
-    list_query = """
-        SELECT 
-            id,
-            description,
-            name,
-            owner
-        FROM common.personalities
-        WHERE deleted = false AND owner IN ('system', %(user_id)s)
-        ORDER BY updated_at DESC
-    """
     default_query = """
         SELECT 
             user_id,
@@ -146,7 +152,7 @@ async def get_user_personalities(req: Request) -> Personalities:
 
     async def _get_personalities(conn: AsyncConnection) -> List[Dict[str, Any]]:
         async with conn.cursor(row_factory=dict_row) as cur:
-            resp = await cur.execute(list_query, {"user_id": user_id})
+            resp = await GET_USER_PERSONALITIES.execute(cur, {"user_id": user_id})
             res = await resp.fetchall()
             return res
 
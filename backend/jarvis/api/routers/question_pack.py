@@ -1,15 +1,29 @@
 import asyncio
+import base64
 import datetime
 import json
-from typing import Annotated, Any, Dict, Optional
+import os
+from typing import Annotated, Any, Dict, Hashable, Literal, Optional
 from uuid import UUID, uuid4
-from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile
 from psycopg import AsyncConnection
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from psycopg.rows import dict_row
 import logging
 from jarvis.db.db import get_connection_pool
-from jarvis.question_pack.retriever import generate_embedding
+from jarvis.lookup_cache import lookup_cache
+from jarvis.question_pack.importer import (
+    ImportFormatError,
+    QuestionImport,
+    get_import,
+    resume_import,
+    start_import,
+)
+from jarvis.question_pack.retriever import (
+    RetrievalConfig,
+    generate_embedding,
+    retrieval_engine,
+)
 
 
 router = APIRouter(prefix="/api/v1/question-packs")
@@ -68,7 +82,10 @@ async def create_question(
 
         async with pool.connection() as conn:
             async with conn.transaction():
-                return await insert_question(conn)
+                question = await insert_question(conn)
+        await lookup_cache.invalidate("question_pack_size", question_pack_id)
+        await lookup_cache.invalidate("question_count", question_pack_id)
+        return question
     except Exception as err:
         logger.error(f"failed to create new question: {err}", exc_info=True)
         raise HTTPException(
@@ -88,7 +105,127 @@ class UserQuestion(BaseModel):
 
 class QuestionList(BaseModel):
     questions: list[UserQuestion]
-    maxPageNo: int
+    maxPageNo: Optional[int] = None
+    nextCursor: Optional[str] = None
+
+
+# counts of large packs are expensive, they are cached per pack and filter set
+_QUESTION_COUNT_FILTER_SETS = 64
+# best matches of a search that are listed
+QUESTION_SEARCH_MAX_RESULTS = int(os.getenv("QUESTION_SEARCH_MAX_RESULTS", "200"))
+
+
+def _encode_cursor(updated_at: datetime.datetime, id: UUID) -> str:
+    raw = json.dumps([updated_at.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime.datetime, UUID]:
+    try:
+        updated_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(updated_at), UUID(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _cached_count(pack_id: str, key: Hashable) -> Optional[int]:
+    hit, counts = lookup_cache.lookup("question_count", pack_id)
+    return counts.get(key) if hit else None
+
+
+def _store_count(pack_id: str, key: Hashable, count: int, epoch: int):
+    # one entry per pack, so that writes to the pack drop all its filter sets
+    _, counts = lookup_cache.lookup("question_count", pack_id)
+    counts = dict(counts or {})
+    if key not in counts and len(counts) >= _QUESTION_COUNT_FILTER_SETS:
+        counts.pop(next(iter(counts)))
+    counts[key] = count
+    lookup_cache.store("question_count", pack_id, counts, epoch)
+
+
+def question_listing_queries(
+    tags: bool = False,
+    additional_info: int = 0,
+    search: bool = False,
+    keyset: bool = False,
+) -> tuple[str, str]:
+    """
+    List and count queries of `get_question_pack_questions` for a filter set,
+    `additional_info` is the number of key/values filters.
+    """
+    # build tag filter
+    tag_filter = (
+        ""
+        if not tags
+        else """EXISTS (
+            SELECT 1 FROM common.question_tags y
+            WHERE y.question_id = x.id AND y.tag = ANY(%(tags)s)
+        )"""
+    )
+
+    # build additional info filter
+    additional_info_filter = (
+        ""
+        if not additional_info
+        else """EXISTS (
+            SELECT 1 FROM common.question_additional_info z
+            WHERE z.question_id = x.id AND ("""
+        + " OR ".join(
+            [
+                f"(z.key = %(key{i})s AND z.value = ANY(%(value{i})s))"
+                for i in range(additional_info)
+            ]
+        )
+        + "))"
+    )
+
+    similarity_filter = "" if not search else "x.id = ANY(%(search_ids)s)"
+
+    where = " AND ".join(
+        f
+        for f in (
+            "x.deleted = %(deleted)s",
+            "x.pack_id = %(question_pack_id)s",
+            tag_filter,
+            additional_info_filter,
+            similarity_filter,
+        )
+        if f
+    )
+    keyset_filter = (
+        "AND (x.updated_at, x.id) < (%(cursor_updated_at)s, %(cursor_id)s)"
+        if keyset
+        else ""
+    )
+
+    order_by = (
+        "array_position(%(search_ids)s::uuid[], x.id)"
+        if search
+        else "x.updated_at DESC, x.id DESC"
+    )
+
+    # semi joins instead of LEFT JOIN + DISTINCT, a question is listed once
+    list_question_query = f"""
+        SELECT
+            x.id,
+            x.answer,
+            x.question,
+            x.updated_at,
+            x.updated_by
+        FROM common.question_pairs x
+        WHERE {where}
+            {keyset_filter}
+        ORDER BY {order_by}
+        LIMIT %(limit)s
+        OFFSET %(offset)s
+    """
+
+    question_count_query = f"""
+        SELECT COUNT(*)
+        FROM common.question_pairs x
+        WHERE {where}
+    """
+    return list_question_query, question_count_query
 
 
 @router.get(
@@ -104,30 +241,31 @@ async def get_question_pack_questions(
     tags: Annotated[Optional[list[str]], Query()] = None,
     additional_info: Annotated[Optional[list[str]], Query()] = None,
     search_query: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_count: bool = True,
 ) -> QuestionList:
+    """
+    Lists questions newest first. Pass `nextCursor` of the previous page as
+    `cursor` to page in constant time, `offset` (in pages) is kept for jumping
+    to a page. `maxPageNo` is cached until the questions of the pack change
+    and left out with `include_count=false`.
+
+    With `search_query` the best QUESTION_SEARCH_MAX_RESULTS matches are
+    listed most relevant first, ranked by the pack's retrieval config, and
+    paged by `offset`.
+    """
+    # relevance order has no keyset, search results are paged by offset
+    cursor_updated_at, cursor_id = (
+        _decode_cursor(cursor) if cursor and not search_query else (None, None)
+    )
+    keyset = cursor_id is not None
     try:
-        # build tag filter
         tag_list = None if not tags else tags
-        tag_filter = "" if not tag_list else "tag = ANY(%(tags)s)"
-
-        # build additional info filter
         additional_info_list = (
             None
             if not additional_info
             else [json.loads(element) for element in additional_info]
         )
-        additional_info_filter = (
-            ""
-            if not additional_info_list
-            else "("
-            + " OR ".join(
-                [
-                    f"(key = %(key{i})s AND value = ANY(%(value{i})s))"
-                    for i in range(len(additional_info_list))
-                ]
-            )
-            + ")"
-        )
 
         # construct the query params
         additional_info_query_params = {}
@@ -135,95 +273,68 @@ async def get_question_pack_questions(
             additional_info_query_params[f"key{i}"] = element["key"]
             additional_info_query_params[f"value{i}"] = element["value"].split(",")
 
-        # build similarity filter
-        similarity_filter = (
-            ""
+        # build similarity filter, matches are ranked by the pack's retrieval config
+        search_matches = (
+            None
             if not search_query
-            else "(1 - (question_embedding <=> %(vector)s::vector)) > 0.3 OR x.question_tsv @@ plainto_tsquery('english', %(search_query)s)"
+            else await retrieval_engine.search(
+                question_pack_id,
+                search_query,
+                top_k=QUESTION_SEARCH_MAX_RESULTS,
+                deleted=deleted,
+            )
         )
 
-        # build similarity column
-        similarity_col = (
-            ""
-            if not search_query
-            else "(0.7 * (1 - (question_embedding <=> %(vector)s::vector)) + 0.3 * ts_rank_cd(x.question_tsv, plainto_tsquery('english', %(search_query)s))) AS similarity"
-        )
-        real_offset = offset * limit
-        query_vector = (
-            None if not search_query else await generate_embedding(search_query)
+        list_question_query, question_count_query = question_listing_queries(
+            tags=bool(tag_list),
+            additional_info=len(additional_info_list or []),
+            search=bool(search_query),
+            keyset=keyset,
         )
 
-        question_count_query = f"""
-            SELECT COUNT(DISTINCT x.*)
-            FROM common.question_pairs x 
-            LEFT JOIN common.question_tags y
-            ON x.id = y.question_id
-            LEFT JOIN common.question_additional_info z
-            ON x.id = z.question_id
-            WHERE x.deleted = %(deleted)s 
-                AND x.pack_id = %(question_pack_id)s
-                {"AND" if len(tag_filter) > 0 else ""} {tag_filter} 
-                {"AND" if len(additional_info_filter) > 0 else ""} {additional_info_filter}
-                {"AND" if len(similarity_filter) > 0 else ""} {similarity_filter}
-        """
-
-        list_question_query = f"""
-            SELECT 
-                DISTINCT x.id,
-                x.answer, 
-                x.question, 
-                x.updated_at,
-                x.updated_by {"," if len(similarity_col) > 0 else ""}
-                {similarity_col}
-            FROM common.question_pairs x
-            LEFT JOIN common.question_tags y 
-            ON x.id = y.question_id 
-            LEFT JOIN common.question_additional_info z 
-            ON x.id = z.question_id
-            WHERE x.deleted = %(deleted)s 
-                AND x.pack_id = %(question_pack_id)s
-                {"AND" if len(tag_filter) > 0 else ""} {tag_filter} 
-                {"AND" if len(additional_info_filter) > 0 else ""} {additional_info_filter}
-                {"AND" if len(similarity_filter) > 0 else ""} {similarity_filter}
-            ORDER BY x.updated_at DESC {", similarity DESC" if len(similarity_col) > 0 else ""}
-            LIMIT %(limit)s
-            OFFSET %(offset)s
-        """
-
         logger.info(f"query:\n{list_question_query}")
 
+        params = {
+            "tags": tag_list,
+            "search_ids": [m["id"] for m in search_matches or []],
+            "deleted": deleted,
+            "question_pack_id": question_pack_id,
+            **additional_info_query_params,
+        }
+
         async def list_questions(conn: AsyncConnection) -> list[Dict[str, Any]]:
             async with conn.cursor(row_factory=dict_row) as cur:
                 resp = await cur.execute(
                     list_question_query,
                     {
-                        "tags": tag_list,
-                        "vector": query_vector,
-                        "search_query": search_query,
-                        "limit": limit,
-                        "offset": real_offset,
-                        "deleted": deleted,
-                        "question_pack_id": question_pack_id,
-                        **additional_info_query_params,
+                        **params,
+                        # one extra row tells whether there is a next page
+                        "limit": limit + 1,
+                        "offset": 0 if keyset else offset * limit,
+                        "cursor_updated_at": cursor_updated_at,
+                        "cursor_id": cursor_id,
                     },
                 )
                 res = await resp.fetchall()
                 return res
 
-        async def count_questions(conn: AsyncConnection):
+        async def count_questions(conn: AsyncConnection) -> Optional[int]:
+            if not include_count:
+                return None
+            count_key = (
+                deleted,
+                tuple(tag_list or ()),
+                tuple(additional_info or ()),
+                search_query,
+            )
+            count = _cached_count(question_pack_id, count_key)
+            if count is not None:
+                return count
+            epoch = lookup_cache.epoch
             async with conn.cursor(row_factory=dict_row) as cur:
-                resp = await cur.execute(
-                    question_count_query,
-                    {
-                        "tags": tag_list,
-                        "vector": query_vector,
-                        "search_query": search_query,
-                        "deleted": deleted,
-                        "question_pack_id": question_pack_id,
-                        **additional_info_query_params,
-                    },
-                )
+                resp = await cur.execute(question_count_query, params)
                 res = await resp.fetchall()
+                _store_count(question_pack_id, count_key, res[0]["count"], epoch)
                 return res[0]["count"]
 
         pool = await get_connection_pool()
@@ -232,8 +343,18 @@ async def get_question_pack_questions(
                 list_questions(conn),
                 count_questions(conn),
             )
+            page = question_list[:limit]
             return QuestionList(
-                maxPageNo=((question_count - 1) // limit) + 1,
+                maxPageNo=(
+                    None
+                    if question_count is None
+                    else ((question_count - 1) // limit) + 1
+                ),
+                nextCursor=(
+                    _encode_cursor(page[-1]["updated_at"], page[-1]["id"])
+                    if len(question_list) > limit and not search_query
+                    else None
+                ),
                 questions=[
                     UserQuestion(
                         id=r["id"],
@@ -242,7 +363,7 @@ async def get_question_pack_questions(
                         updatedAt=r["updated_at"],
                         updatedBy=r["updated_by"],
                     )
-                    for r in question_list
+                    for r in page
                 ],
             )
     except Exception as err:
@@ -251,3 +372,156 @@ async def get_question_pack_questions(
             status_code=500,
             detail="Failed to list questions due to internal error, please check the server logs for more information.",
         )
+
+
+class QuestionImportStatus(BaseModel):
+    id: UUID
+    status: str
+    totalRows: int
+    importedRows: int
+    error: Optional[str] = None
+
+
+def _import_status(job: QuestionImport) -> QuestionImportStatus:
+    return QuestionImportStatus(
+        id=job["id"],
+        status=job["status"],
+        totalRows=job["total_rows"],
+        importedRows=job["imported_rows"],
+        error=job["error"],
+    )
+
+
+@router.post(
+    "/{question_pack_id}/imports",
+    response_model=QuestionImportStatus,
+    status_code=202,
+    tags=["question pack"],
+)
+async def import_questions(
+    req: Request, question_pack_id: str, fileb: UploadFile
+) -> QuestionImportStatus:
+    """
+    Bulk imports questions from a CSV or JSONL file. The questions are
+    embedded and written in batches in the background, poll the returned
+    import for progress.
+    """
+    user_id: str = req.state.claims["sub"]
+    try:
+        content = await fileb.read()
+        job = await start_import(
+            question_pack_id, user_id, fileb.filename or "", content
+        )
+        return _import_status(job)
+    except ImportFormatError as err:
+        raise HTTPException(status_code=400, detail=str(err))
+    except Exception as err:
+        logger.error(f"failed to start question import: {err}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to import questions due to internal error, please check the server logs for more information.",
+        )
+
+
+@router.get(
+    "/{question_pack_id}/imports/{import_id}",
+    response_model=QuestionImportStatus,
+    tags=["question pack"],
+)
+async def get_question_import(
+    question_pack_id: UUID, import_id: UUID
+) -> QuestionImportStatus:
+    job = await get_import(str(question_pack_id), str(import_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import not found.")
+    return _import_status(job)
+
+
+@router.post(
+    "/{question_pack_id}/imports/{import_id}/resume",
+    response_model=QuestionImportStatus,
+    status_code=202,
+    tags=["question pack"],
+)
+async def resume_question_import(
+    question_pack_id: UUID, import_id: UUID
+) -> QuestionImportStatus:
+    """Continues a failed or stalled import, questions imported before are skipped."""
+    try:
+        job = await resume_import(str(question_pack_id), str(import_id))
+    except Exception as err:
+        logger.error(f"failed to resume question import: {err}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to resume import due to internal error, please check the server logs for more information.",
+        )
+    if job is None:
+        if await get_import(str(question_pack_id), str(import_id)) is None:
+            raise HTTPException(status_code=404, detail="Import not found.")
+        raise HTTPException(
+            status_code=409, detail="Import is completed or still running."
+        )
+    return _import_status(job)
+
+
+class RetrievalSettings(BaseModel):
+    strategy: Literal["weighted", "rrf"] = "weighted"
+    vectorWeight: float = Field(default=0.7, ge=0)
+    textWeight: float = Field(default=0.3, ge=0)
+    rrfK: int = Field(default=60, ge=1)
+    topK: int = Field(default=5, ge=1, le=50)
+    minScore: float = 0.0
+
+
+def _retrieval_settings(config: RetrievalConfig) -> RetrievalSettings:
+    return RetrievalSettings(
+        strategy=config.strategy,
+        vectorWeight=config.vector_weight,
+        textWeight=config.text_weight,
+        rrfK=config.rrf_k,
+        topK=config.top_k,
+        minScore=config.min_score,
+    )
+
+
+@router.get(
+    "/{question_pack_id}/retrieval-config",
+    response_model=RetrievalSettings,
+    tags=["question pack"],
+)
+async def get_retrieval_config(question_pack_id: UUID) -> RetrievalSettings:
+    config = await retrieval_engine.get_config(str(question_pack_id))
+    return _retrieval_settings(config)
+
+
+@router.put(
+    "/{question_pack_id}/retrieval-config",
+    response_model=RetrievalSettings,
+    tags=["question pack"],
+)
+async def set_retrieval_config(
+    question_pack_id: UUID, payload: RetrievalSettings
+) -> RetrievalSettings:
+    """
+    Sets how questions of the pack are ranked by the question pack tool and
+    by searches of the question listing, see `RetrievalConfig`.
+    """
+    config = RetrievalConfig(
+        strategy=payload.strategy,
+        vector_weight=payload.vectorWeight,
+        text_weight=payload.textWeight,
+        rrf_k=payload.rrfK,
+        top_k=payload.topK,
+        min_score=payload.minScore,
+    )
+    try:
+        updated = await retrieval_engine.set_config(str(question_pack_id), config)
+    except Exception as err:
+        logger.error(f"failed to update retrieval config: {err}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to update retrieval config due to internal error, please check the server logs for more information.",
+        )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Question pack not found.")
+    return _retrieval_settings(config)
@@ -5,12 +5,19 @@ from dotenv import load_dotenv
 from os import getenv
 import logging
 import sys
+from typing import Optional
 import logging
 import traceback
 from jarvis.cleanup.cleanup import run_cleanup
-from jarvis.db.db import close_connection_pool
-from jarvis.namespaces import Jarvis
+from jarvis.db.db import DB_URI, close_connection_pool
+from jarvis.generation import generation_locks
+from jarvis.namespaces import AsyncPostgresManager, Jarvis
 from jarvis.db.migrations import run_migrations
+from jarvis.lookup_cache import lookup_cache
+from jarvis.models.models import get_default_model
+from jarvis.models.pool import model_pool
+from jarvis.queries.message_writer import message_writer
+from jarvis.scoring import scoring_queue
 from jarvis.api.api import app
 import uvicorn
 
@@ -37,11 +44,22 @@ logger.debug(f"CORS_ALLOWED_ORIGINS -> {getenv('CORS_ALLOWED_ORIGINS')}")
 
 
 async def main():
+    client_manager: Optional[AsyncPostgresManager] = None
     try:
-        await run_migrations()
+        # disable when migrations run as a separate step, see jarvis/db/migrations.py
+        if getenv("RUN_MIGRATIONS", "true").lower() == "true":
+            await run_migrations()
+        await model_pool.warmup(getenv("WARMUP_MODELS", get_default_model()).split(";"))
         asyncio.create_task(run_cleanup(), name="clean_up_task")
+        # share rooms across replicas if configured, otherwise rooms are process local
+        client_manager = (
+            AsyncPostgresManager(DB_URI, channel=getenv("SOCKETIO_CHANNEL", "socketio"))
+            if getenv("SOCKETIO_MANAGER") == "postgres"
+            else None
+        )
         sio = socketio.AsyncServer(
             async_mode="asgi",
+            client_manager=client_manager,
             cors_allowed_origins=getenv("CORS_ALLOWED_ORIGINS", "").split(";"),
             logger=True,
             engineio_logger=True,
@@ -59,7 +77,14 @@ async def main():
         raise RuntimeError from err
     finally:
         logger.info("tearing down connection pool")
+        if client_manager is not None:
+            await client_manager.close()
+        await message_writer.close()
+        await lookup_cache.close()
         await close_connection_pool()
+        await scoring_queue.close()
+        await generation_locks.close()
+        await model_pool.close()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ import logging
 from typing import List
 from jarvis.blob_storage import resolve_storage
 from jarvis.db.db import get_connection_pool
+from jarvis.lookup_cache import lookup_cache
 from psycopg.rows import dict_row, DictRow
 from dotenv import load_dotenv
 from pathlib import Path
@@ -23,6 +24,7 @@ async def run_cleanup():
             await clean_old_question_packs()
             await clean_old_questions()
             await clean_old_document_packs()
+            await clean_old_embeddings()
             logger.info("cleanup done")
         except Exception as err:
             logger.error(f"cleanup failed with {err}", exc_info=True)
@@ -84,15 +86,29 @@ async def clean_old_questions():
     query = """
     DELETE FROM common.question_pairs
     WHERE deleted = TRUE AND updated_at < (CURRENT_DATE - INTERVAL '30 days')
-    RETURNING id
+    RETURNING id, pack_id
     """
 
     logger.info("cleaning old questions")
+    res = await executor(query)
+    for pack_id in {str(r["pack_id"]) for r in res}:
+        await lookup_cache.invalidate("question_pack_size", pack_id)
+        await lookup_cache.invalidate("question_count", pack_id)
+
+
+async def clean_old_embeddings():
+    query = """
+    DELETE FROM common.embedding_cache
+    WHERE created_at < (CURRENT_DATE - INTERVAL '30 days')
+    RETURNING model
+    """
+
+    logger.info("cleaning old cached embeddings")
     await executor(query)
 
 
 async def executor(query: str) -> List[DictRow]:
-    pool = await get_connection_pool()
+    pool = await get_connection_pool("background")
 
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=dict_row) as cur:
@@ -7,6 +7,7 @@ from jarvis.messages.type import Message
 from langchain_core.documents import Document
 import json
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig
 from jarvis.document_pack.type import DocumentPack
 from jarvis.question_pack.type import QuestionPack
 
@@ -27,6 +28,13 @@ class Context:
         self.document_pack = document_pack
         self.system_prompt = system_prompt
 
+    @classmethod
+    def from_config(cls, config: RunnableConfig) -> Context:
+        ctx = config.get("configurable", {}).get("ctx")
+        if not isinstance(ctx, cls):
+            raise ValueError("context is missing from runnable config!")
+        return ctx
+
     @property
     def size(self) -> int:
         return self.q.qsize()
@@ -1,39 +1,121 @@
+from typing import Dict, Literal, TypedDict
 from psycopg_pool import AsyncConnectionPool
 from os import getenv
 from dotenv import load_dotenv
+from jarvis.db.statements import statements
+from jarvis.db.supervisor import CircuitBreaker, PoolSupervisor
+from jarvis.db.vector import ensure_vector, register_vector
 
 load_dotenv()
-DB_URI = getenv("DB_URI")
+DB_URI = getenv("DB_URI", "")
 assert DB_URI, "db uri missing!"
 
-_pool = AsyncConnectionPool(
+# api: REST and Socket.IO handlers, agent: LangGraph checkpointer and tools,
+# background: cleanup, migrations and scoring
+PoolName = Literal["api", "agent", "background"]
+
+POOL_DEFAULTS: Dict[PoolName, tuple[int, int]] = {
+    "api": (2, 5),
+    "agent": (2, 5),
+    "background": (1, 2),
+}
+
+
+class PoolMetrics(TypedDict):
+    min_size: int
+    max_size: int
+    size: int
+    available: int
+    waiting: int
+    requests: int
+    queued: int
+    timeouts: int
+    avg_wait_ms: float
+    saturation: float
+
+
+def _create_pool(name: PoolName) -> AsyncConnectionPool:
+    min_size, max_size = POOL_DEFAULTS[name]
+    prefix = f"DB_POOL_{name.upper()}"
+    return AsyncConnectionPool(
+        DB_URI,
+        open=False,
+        name=name,
+        min_size=int(getenv(f"{prefix}_MIN_SIZE", min_size)),
+        max_size=int(getenv(f"{prefix}_MAX_SIZE", max_size)),
+        kwargs={
+            "autocommit": True,
+            "prepare_threshold": statements.prepare_threshold,
+            "connect_timeout": 60,
+        },
+        timeout=float(getenv(f"{prefix}_TIMEOUT", "60")),
+        reconnect_failed=lambda pool: supervisor.on_reconnect_failed(pool),
+        configure=register_vector,
+        check=ensure_vector,
+    )
+
+
+_pools: Dict[PoolName, AsyncConnectionPool] = {
+    name: _create_pool(name) for name in POOL_DEFAULTS
+}
+
+# health is checked in the background, the hot path only consults the breaker
+supervisor = PoolSupervisor(
     DB_URI,
-    open=False,
-    max_size=5,
-    kwargs={
-        "autocommit": True,
-        "prepare_threshold": 0,
-        "connect_timeout": 60,
-    },
-    timeout=60,
+    _pools,  # type: ignore
+    interval=float(getenv("DB_POOL_CHECK_INTERVAL", "30")),
+    breaker=CircuitBreaker(
+        threshold=int(getenv("DB_BREAKER_THRESHOLD", "3")),
+        retry_after=float(getenv("DB_BREAKER_RETRY_AFTER", "5")),
+    ),
 )
 
 
-async def open_connection_pool():
-    await _pool.open(wait=True)
+async def open_connection_pool(name: PoolName = "api"):
+    await _pools[name].open(wait=True)
 
 
 async def close_connection_pool():
-    if not _pool.closed:
-        await _pool.close()
+    await supervisor.close()
+    for pool in _pools.values():
+        if not pool.closed:
+            await pool.close()
+
+
+async def get_connection_pool(name: PoolName = "api") -> AsyncConnectionPool:
+    supervisor.ensure_available()
+    pool = _pools[name]
+    if pool.closed:
+        await open_connection_pool(name)
+    supervisor.ensure_started()
+    return pool
 
 
-async def get_connection_pool():
-    if _pool.closed:
-        await open_connection_pool()
-    await check_connection_pool()
-    return _pool
+async def check_connection_pool(name: PoolName = "api"):
+    await _pools[name].check()
 
 
-async def check_connection_pool():
-    await _pool.check()
+def pool_metrics() -> Dict[str, PoolMetrics]:
+    metrics: Dict[str, PoolMetrics] = {}
+    for name, pool in _pools.items():
+        # a closed pool still reports its configured connections
+        stats = {} if pool.closed else pool.get_stats()
+        size = stats.get("pool_size", 0)
+        queued = stats.get("requests_queued", 0)
+        metrics[name] = PoolMetrics(
+            min_size=pool.min_size,
+            max_size=pool.max_size,
+            size=size,
+            available=stats.get("pool_available", 0),
+            waiting=stats.get("requests_waiting", 0),
+            requests=stats.get("requests_num", 0),
+            queued=queued,
+            timeouts=stats.get("requests_errors", 0),
+            avg_wait_ms=(
+                round(stats.get("requests_wait_ms", 0) / queued, 2) if queued else 0.0
+            ),
+            saturation=round(
+                (size - stats.get("pool_available", 0)) / pool.max_size, 3
+            ),
+        )
+    return metrics
@@ -1,25 +1,94 @@
+import asyncio
+import hashlib
 import logging
+from pathlib import Path
+from typing import List
 import psycopg
-from jarvis.db.db import get_connection_pool
+from jarvis.db.db import close_connection_pool, get_connection_pool
 import yaml
 
 logger = logging.getLogger(__name__)
 
+REVISIONS_DIR = Path(__file__).parent / "revisions"
+
+# arbitrary constant shared by all replicas, only one of them migrates at a time
+MIGRATION_LOCK_ID = 0x6A61727669
+
+BOOTSTRAP = """
+CREATE SCHEMA IF NOT EXISTS common;
+
+CREATE TABLE IF NOT EXISTS common.schema_revisions (
+    revision text PRIMARY KEY,
+    checksum text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT now()
+);
+"""
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+def load_revisions() -> List[str]:
+    with open(REVISIONS_DIR / "revisions.yaml", "rb") as f:
+        return yaml.safe_load(f).get("revisions", [])
+
 
 async def run_migrations():
+    """
+    Applies the revisions listed in `revisions.yaml` that are not recorded in
+    `common.schema_revisions` yet. Concurrent callers are serialized with an
+    advisory lock, whoever acquires it second finds nothing left to apply.
+    """
     logger.info("starting db migrations")
+    revisions = load_revisions()
 
-    with open("jarvis/db/revisions/revisions.yaml", "rb") as f:
-        revisions = yaml.safe_load(f).get("revisions", [])
-
-    for revision in revisions:
-        logger.info(f"applying revision {revision}")
-        with open(f"jarvis/db/revisions/{revision}/jarvis.sql") as f:
-            script = f.read()
-        pool = await get_connection_pool()
-        async with pool.connection() as conn:
+    pool = await get_connection_pool("background")
+    async with pool.connection() as conn:
+        # session level lock, it is held across the per revision transactions
+        await conn.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
             async with conn.transaction():
-                cur = psycopg.AsyncClientCursor(conn)
-                await cur.execute(script)
+                await psycopg.AsyncClientCursor(conn).execute(BOOTSTRAP)
+            cur = await conn.execute(
+                "SELECT revision, checksum FROM common.schema_revisions"
+            )
+            applied = dict(await cur.fetchall())
+
+            for revision in revisions:
+                script = (REVISIONS_DIR / revision / "jarvis.sql").read_text()
+                checksum = hashlib.sha256(script.encode()).hexdigest()
+                if revision in applied:
+                    if applied[revision] != checksum:
+                        raise MigrationError(
+                            f"revision {revision} was modified after it has been applied, add a new revision instead"
+                        )
+                    continue
+
+                logger.info(f"applying revision {revision}")
+                async with conn.transaction():
+                    await psycopg.AsyncClientCursor(conn).execute(script)
+                    await conn.execute(
+                        "INSERT INTO common.schema_revisions (revision, checksum) VALUES (%s, %s)",
+                        (revision, checksum),
+                    )
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
 
     logger.info("completed migrations")
+
+
+async def main():
+    try:
+        await run_migrations()
+    finally:
+        await close_connection_pool()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s,%(msecs)d | %(name)s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+        level=logging.INFO,
+    )
+    asyncio.run(main())
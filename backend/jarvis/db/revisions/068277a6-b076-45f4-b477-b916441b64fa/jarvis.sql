@@ -0,0 +1,2 @@
+-- Per pack retrieval configuration, NULL uses the defaults, see jarvis/question_pack/retriever.py
+ALTER TABLE common.question_packs ADD COLUMN IF NOT EXISTS retrieval_config jsonb;
@@ -0,0 +1,5 @@
+-- Per message token usage, cached tokens are served from the provider prompt cache
+ALTER TABLE common.message_history ADD COLUMN IF NOT EXISTS input_tokens integer;
+ALTER TABLE common.message_history ADD COLUMN IF NOT EXISTS output_tokens integer;
+ALTER TABLE common.message_history ADD COLUMN IF NOT EXISTS cached_input_tokens integer;
+ALTER TABLE common.message_history ADD COLUMN IF NOT EXISTS cache_creation_tokens integer;
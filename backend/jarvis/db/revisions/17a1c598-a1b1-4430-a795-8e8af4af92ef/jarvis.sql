@@ -0,0 +1,27 @@
+-- Composite indexes for the listing queries. Queries that bind deleted as a
+-- parameter are prepared, generic plans cannot use partial indexes, so those
+-- keep deleted as an index column. Queries with a literal deleted = false get
+-- partial indexes.
+
+-- chats and documents of a user, ORDER BY updated_at DESC
+CREATE INDEX IF NOT EXISTS chat_history_owner_listing_index ON common.chat_history USING btree (owner_email, deleted, updated_at DESC);
+DROP INDEX IF EXISTS common.chat_history_user_index;
+CREATE INDEX IF NOT EXISTS document_repo_owner_listing_index ON common.document_repo USING btree (owner, deleted, updated_at DESC);
+DROP INDEX IF EXISTS common.document_repo_user_index;
+
+-- personalities, question and document packs are only listed when not deleted
+CREATE INDEX IF NOT EXISTS personalities_owner_active_index ON common.personalities USING btree (owner, updated_at DESC) WHERE deleted = false;
+CREATE INDEX IF NOT EXISTS question_packs_active_index ON common.question_packs USING btree (updated_at DESC) WHERE deleted = false;
+CREATE INDEX IF NOT EXISTS document_packs_active_index ON common.document_packs USING btree (updated_at DESC) WHERE deleted = false;
+CREATE INDEX IF NOT EXISTS document_pack_docs_pack_index ON common.document_pack_docs USING btree (pack_id);
+
+-- tag and additional info filters (semi joins on question_id) and the
+-- filterable tag/key/value listings of a pack (index only scans)
+CREATE INDEX IF NOT EXISTS question_tags_question_index ON common.question_tags USING btree (question_id);
+CREATE INDEX IF NOT EXISTS question_tags_pack_index ON common.question_tags USING btree (pack_id, tag);
+CREATE INDEX IF NOT EXISTS question_additional_info_question_index ON common.question_additional_info USING btree (question_id);
+CREATE INDEX IF NOT EXISTS question_additional_info_pack_index ON common.question_additional_info USING btree (pack_id, key, value);
+
+-- chat history in order and keyset pages of it
+CREATE INDEX IF NOT EXISTS message_history_chat_created_index ON common.message_history USING btree (chat_id, created_at, id);
+DROP INDEX IF EXISTS common.message_history_chat_index;
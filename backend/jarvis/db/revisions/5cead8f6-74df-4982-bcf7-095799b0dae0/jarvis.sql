@@ -0,0 +1,9 @@
+-- Socket.IO payloads that are too large for NOTIFY
+CREATE TABLE IF NOT EXISTS common.socketio_payloads (
+    id uuid NOT NULL,
+    payload text NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS socketio_payloads_created_at_index ON common.socketio_payloads USING btree (created_at);
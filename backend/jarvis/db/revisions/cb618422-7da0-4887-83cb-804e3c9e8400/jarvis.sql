@@ -0,0 +1,55 @@
+-- Question writes invalidate the cached pack sizes and listing counts of their
+-- pack on every replica, including writes that bypass the backend (the frontend
+-- deletes questions and edits tags directly), see jarvis/lookup_cache/cache.py.
+-- Notifications go to the lookup cache channel, set jarvis.lookup_cache_channel
+-- on the database when LOOKUP_CACHE_CHANNEL is changed. Identical notifications
+-- of a transaction are delivered once, so bulk writes send one per pack.
+CREATE OR REPLACE FUNCTION common.notify_question_pack_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    channel text := COALESCE(NULLIF(current_setting('jarvis.lookup_cache_channel', true), ''), 'jarvis_lookup_cache');
+    pack_ids uuid[];
+    pack_id uuid;
+    ns text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        pack_ids := ARRAY[NEW.pack_id];
+    ELSIF TG_OP = 'DELETE' THEN
+        pack_ids := ARRAY[OLD.pack_id];
+    ELSE
+        pack_ids := ARRAY[OLD.pack_id, NEW.pack_id];
+    END IF;
+
+    FOREACH pack_id IN ARRAY pack_ids LOOP
+        FOREACH ns IN ARRAY TG_ARGV LOOP
+            PERFORM pg_notify(channel, json_build_object('origin', 'db', 'ns', ns, 'key', pack_id::text)::text);
+        END LOOP;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS notify_question_pairs_change ON common.question_pairs;
+CREATE TRIGGER notify_question_pairs_change
+AFTER INSERT OR DELETE ON common.question_pairs
+FOR EACH ROW EXECUTE FUNCTION common.notify_question_pack_change('question_pack_size', 'question_count');
+
+-- soft deletes and restores, edits of the text do not change any count
+DROP TRIGGER IF EXISTS notify_question_pairs_update ON common.question_pairs;
+CREATE TRIGGER notify_question_pairs_update
+AFTER UPDATE OF deleted, pack_id ON common.question_pairs
+FOR EACH ROW
+WHEN (OLD.deleted IS DISTINCT FROM NEW.deleted OR OLD.pack_id IS DISTINCT FROM NEW.pack_id)
+EXECUTE FUNCTION common.notify_question_pack_change('question_pack_size', 'question_count');
+
+DROP TRIGGER IF EXISTS notify_question_tags_change ON common.question_tags;
+CREATE TRIGGER notify_question_tags_change
+AFTER INSERT OR DELETE OR UPDATE OF tag, question_id, pack_id ON common.question_tags
+FOR EACH ROW EXECUTE FUNCTION common.notify_question_pack_change('question_count');
+
+DROP TRIGGER IF EXISTS notify_question_additional_info_change ON common.question_additional_info;
+CREATE TRIGGER notify_question_additional_info_change
+AFTER INSERT OR DELETE OR UPDATE OF key, value, question_id, pack_id ON common.question_additional_info
+FOR EACH ROW EXECUTE FUNCTION common.notify_question_pack_change('question_count');
@@ -0,0 +1,2 @@
+-- Keyset pagination of question pack listings, (updated_at, id) is the cursor
+CREATE INDEX IF NOT EXISTS question_pairs_pack_listing_index ON common.question_pairs USING btree (pack_id, deleted, updated_at DESC, id DESC);
@@ -0,0 +1,10 @@
+-- Query embeddings keyed by model and normalized text hash, see jarvis/question_pack/embedding_cache.py
+CREATE TABLE IF NOT EXISTS common.embedding_cache (
+    model text NOT NULL,
+    text_hash text NOT NULL,
+    embedding common.vector NOT NULL,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+
+CREATE INDEX IF NOT EXISTS embedding_cache_created_at_index ON common.embedding_cache USING btree (created_at);
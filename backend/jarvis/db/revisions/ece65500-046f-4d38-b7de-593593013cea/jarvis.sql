@@ -0,0 +1,17 @@
+-- Bulk question imports, see jarvis/question_pack/importer.py
+CREATE TABLE IF NOT EXISTS common.question_imports (
+    id uuid NOT NULL,
+    pack_id uuid NOT NULL,
+    owner text NOT NULL,
+    source text NOT NULL,
+    status text NOT NULL,
+    total_rows integer NOT NULL,
+    imported_rows integer DEFAULT 0 NOT NULL,
+    error text,
+    created_at timestamp with time zone DEFAULT now() NOT NULL,
+    updated_at timestamp with time zone DEFAULT now() NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT question_imports_pack_id_fkey FOREIGN KEY (pack_id) REFERENCES common.question_packs(id) ON UPDATE CASCADE ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS question_imports_pack_index ON common.question_imports USING btree (pack_id, created_at DESC);
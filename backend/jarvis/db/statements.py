@@ -0,0 +1,62 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from os import getenv
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+from psycopg import AsyncCursor
+from psycopg.rows import Row
+from dotenv import load_dotenv
+
+load_dotenv()
+
+Params = Union[Sequence[Any], Mapping[str, Any], None]
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    sql: str
+
+    async def execute(
+        self, cur: AsyncCursor[Row], params: Params = None
+    ) -> AsyncCursor[Row]:
+        # prepared on first use per connection, unless preparation is disabled
+        # on the pool (prepare_threshold=None)
+        return await cur.execute(self.sql, params, prepare=True)
+
+
+class StatementRegistry:
+    """
+    Named hot statements that are prepared server side on every connection.
+    Ad-hoc queries are only prepared after `threshold` executions.
+
+    Transaction-mode poolers (f.ex. PgBouncer) hand out a different backend
+    per transaction, so preparation has to be disabled entirely behind them.
+    """
+
+    def __init__(self, enabled: bool = True, threshold: int = 5):
+        self.enabled = enabled
+        self.threshold = threshold
+        self._statements: Dict[str, Statement] = {}
+
+    @property
+    def prepare_threshold(self) -> Optional[int]:
+        return self.threshold if self.enabled else None
+
+    def register(self, name: str, sql: str) -> Statement:
+        existing = self._statements.get(name)
+        if existing is not None and existing.sql != sql:
+            raise ValueError(
+                f"statement {name} is already registered with different sql"
+            )
+        statement = Statement(name=name, sql=sql)
+        self._statements[name] = statement
+        return statement
+
+    def names(self) -> List[str]:
+        return list(self._statements)
+
+
+statements = StatementRegistry(
+    enabled=getenv("DB_PREPARED_STATEMENTS", "true").lower() == "true",
+    threshold=int(getenv("DB_PREPARE_THRESHOLD", "5")),
+)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timezone
+import logging
+import time
+from typing import Dict, Literal, Optional, TypedDict
+import psycopg
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+
+class DatabaseUnavailableError(RuntimeError):
+    pass
+
+
+class DatabaseHealth(TypedDict):
+    state: BreakerState
+    consecutive_failures: int
+    checks: int
+    errors: int
+    connections_lost: int
+    last_check: Optional[str]
+    last_error: Optional[str]
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the database is unreachable. Opens after `threshold`
+    consecutive failed probes, the next probe after `retry_after` seconds
+    runs half-open and a success closes it again.
+    """
+
+    def __init__(self, threshold: int = 3, retry_after: float = 5.0):
+        self.threshold = threshold
+        self.retry_after = retry_after
+        self.state: BreakerState = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if (
+            self.state == "open"
+            and time.monotonic() - self._opened_at >= self.retry_after
+        ):
+            self.state = "half_open"
+        return self.state != "open"
+
+    def success(self):
+        if self.state != "closed":
+            logger.info("database reachable again, closing circuit breaker")
+        self.state = "closed"
+        self.failures = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                logger.error(
+                    f"database unreachable, opening circuit breaker after {self.failures} failures"
+                )
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class PoolSupervisor:
+    """
+    Probes the database on an interval instead of on every pool checkout.
+
+    Each round opens a dedicated connection (independent of pool saturation)
+    to run `SELECT 1` and, if that succeeds, lets every open pool drop its
+    broken idle connections. Probe results drive the circuit breaker.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        pools: Dict[str, AsyncConnectionPool],
+        interval: float = 30.0,
+        probe_timeout: int = 5,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.url = url
+        self.pools = pools
+        self.interval = interval
+        self.probe_timeout = probe_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.checks = 0
+        self.errors = 0
+        self.last_check: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="db_pool_supervisor")
+
+    def ensure_available(self):
+        if not self.breaker.allow():
+            raise DatabaseUnavailableError(
+                f"database is unavailable: {self.last_error or 'unknown error'}"
+            )
+
+    async def _run(self):
+        while True:
+            await self.check()
+            # retry sooner while the database is down
+            await asyncio.sleep(
+                self.interval
+                if self.breaker.state == "closed"
+                else self.breaker.retry_after
+            )
+
+    async def check(self):
+        self.checks += 1
+        self.last_check = datetime.now(timezone.utc)
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                self.url, autocommit=True, connect_timeout=self.probe_timeout
+            ) as conn:
+                await conn.execute("SELECT 1")
+        except Exception as err:
+            self.errors += 1
+            self.last_error = str(err)
+            self.breaker.failure()
+            logger.warning(f"database health probe failed: {err}")
+            return
+        self.breaker.success()
+        for name, pool in self.pools.items():
+            if pool.closed:
+                continue
+            try:
+                await pool.check()
+            except Exception as err:
+                self.errors += 1
+                self.last_error = str(err)
+                logger.warning(f"health check of pool {name} failed: {err}")
+
+    def on_reconnect_failed(self, pool: AsyncConnectionPool):
+        # the pool gave up reconnecting, no need to wait for the next probe
+        self.errors += 1
+        self.last_error = f"pool {pool.name} failed to reconnect"
+        self.breaker.failure()
+
+    def health(self) -> DatabaseHealth:
+        return DatabaseHealth(
+            state=self.breaker.state,
+            consecutive_failures=self.breaker.failures,
+            checks=self.checks,
+            errors=self.errors,
+            connections_lost=sum(
+                pool.get_stats().get("connections_lost", 0)
+                for pool in self.pools.values()
+                if not pool.closed
+            ),
+            last_check=self.last_check.isoformat() if self.last_check else None,
+            last_error=self.last_error,
+        )
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,92 @@
+from __future__ import annotations
+import logging
+from struct import pack, unpack_from
+import numpy as np
+from psycopg import AsyncConnection
+from psycopg.adapt import Dumper, Loader
+from psycopg.pq import Format
+from psycopg.types import TypeInfo
+
+logger = logging.getLogger(__name__)
+
+# the extension is installed into the common schema, see the first revision
+VECTOR_TYPE_NAMES = ("common.vector", "vector")
+
+
+def as_vector(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float32)
+
+
+class VectorDumper(Dumper):
+    format = Format.TEXT
+
+    def dump(self, obj: np.ndarray) -> bytes:
+        return ("[" + ",".join(map(str, as_vector(obj).tolist())) + "]").encode()
+
+
+class VectorBinaryDumper(VectorDumper):
+    """pgvector binary format: dimensions and an unused flag as int16, then big endian float32 values."""
+
+    format = Format.BINARY
+
+    def dump(self, obj: np.ndarray) -> bytes:
+        vector = as_vector(obj)
+        if vector.ndim != 1:
+            raise ValueError(
+                f"expected a one dimensional vector, got shape {vector.shape}"
+            )
+        return pack(">HH", vector.shape[0], 0) + vector.astype(">f4").tobytes()
+
+
+class VectorLoader(Loader):
+    format = Format.TEXT
+
+    def load(self, data) -> np.ndarray:
+        text = bytes(data).decode()
+        return np.array(text[1:-1].split(","), dtype=np.float32)
+
+
+class VectorBinaryLoader(Loader):
+    format = Format.BINARY
+
+    def load(self, data) -> np.ndarray:
+        dim, _ = unpack_from(">HH", data)
+        return np.frombuffer(data, dtype=">f4", count=dim, offset=4).astype(np.float32)
+
+
+async def register_vector(conn: AsyncConnection):
+    """
+    Lets numpy arrays be bound as pgvector `vector` parameters, sent in binary
+    (4 bytes per dimension) instead of as formatted text, and loads `vector`
+    columns back into float32 arrays.
+    """
+    info = None
+    for name in VECTOR_TYPE_NAMES:
+        info = await TypeInfo.fetch(conn, name)
+        if info is not None:
+            break
+    if info is None:
+        # fresh database, the extension is created by the migrations
+        logger.warning("vector type not found, vector adapters are not registered")
+        return
+
+    # makes the type known by name, e.g. to `Copy.set_types`
+    info.register(conn)
+    adapters = conn.adapters
+    # the dumper registered last is used for %s placeholders
+    for dumper in (VectorDumper, VectorBinaryDumper):
+        adapters.register_dumper(
+            np.ndarray, type(dumper.__name__, (dumper,), {"oid": info.oid})
+        )
+    adapters.register_loader(info.oid, VectorLoader)
+    adapters.register_loader(info.oid, VectorBinaryLoader)
+
+
+async def ensure_vector(conn: AsyncConnection):
+    """
+    Registers the adapters on connections opened before the migrations
+    created the extension, e.g. the pool running them on a fresh database.
+    Used on checkout, no round trip once the type is registered.
+    """
+    if conn.adapters.types.get("vector") is None:
+        await register_vector(conn)
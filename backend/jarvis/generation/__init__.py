@@ -0,0 +1,11 @@
+from .lock import GenerationLocks, GenerationManager, generation_locks
+from .registry import Generation, GenerationRegistry, generation_registry
+
+__all__ = [
+    "GenerationLocks",
+    "GenerationManager",
+    "generation_locks",
+    "Generation",
+    "GenerationRegistry",
+    "generation_registry",
+]
@@ -0,0 +1,216 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+import logging
+import os
+import time
+from typing import Dict, Optional, TypedDict
+import psycopg
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# first key of the two-key advisory lock form, keeps our locks apart from others
+ADVISORY_LOCK_NAMESPACE = 0x4A56
+
+
+@dataclass
+class _ChatLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    waiters: int = 0
+
+
+class GenerationLockMetrics(TypedDict):
+    backend: str
+    active: int
+    queued: int
+    max_queue_depth: int
+    acquisitions: int
+    contended: int
+    avg_wait_ms: float
+    max_wait_ms: float
+
+
+class AdvisoryLockBackend:
+    """
+    Cross-process chat locks based on Postgres session level advisory locks.
+
+    All locks of a process are held on one dedicated connection, so waiting
+    is done by polling `pg_try_advisory_lock` instead of blocking the session.
+    """
+
+    def __init__(self, url: str, poll_interval: float = 0.2):
+        self.url = url
+        self.poll_interval = poll_interval
+        self._conn: Optional[psycopg.AsyncConnection] = None
+        self._conn_lock = asyncio.Lock()
+
+    async def _connection(self) -> psycopg.AsyncConnection:
+        async with self._conn_lock:
+            if self._conn is None or self._conn.closed:
+                if self._conn is not None:
+                    logger.warning("advisory lock connection lost, reconnecting")
+                self._conn = await psycopg.AsyncConnection.connect(
+                    self.url, autocommit=True
+                )
+            return self._conn
+
+    async def try_lock(self, chat_id: str) -> bool:
+        conn = await self._connection()
+        cur = await conn.execute(
+            "SELECT pg_try_advisory_lock(%s, hashtext(%s))",
+            (ADVISORY_LOCK_NAMESPACE, chat_id),
+        )
+        row = await cur.fetchone()
+        return bool(row and row[0])
+
+    async def lock(self, chat_id: str):
+        while not await self.try_lock(chat_id):
+            await asyncio.sleep(self.poll_interval)
+
+    async def unlock(self, chat_id: str):
+        conn = await self._connection()
+        await conn.execute(
+            "SELECT pg_advisory_unlock(%s, hashtext(%s))",
+            (ADVISORY_LOCK_NAMESPACE, chat_id),
+        )
+
+    async def close(self):
+        if self._conn is not None and not self._conn.closed:
+            await self._conn.close()
+
+
+class GenerationLocks:
+    """
+    Per-chat generation locks. Entries are evicted as soon as a chat has no
+    holder and no waiters, so memory is bounded by the number of active chats.
+    """
+
+    def __init__(self, backend: Optional[AdvisoryLockBackend] = None):
+        self.backend = backend
+        self._locks: Dict[str, _ChatLock] = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _entry(self, chat_id: str) -> _ChatLock:
+        if chat_id not in self._locks:
+            self._locks[chat_id] = _ChatLock()
+        return self._locks[chat_id]
+
+    def _evict_if_idle(self, chat_id: str):
+        entry = self._locks.get(chat_id)
+        if entry and not entry.lock.locked() and entry.waiters == 0:
+            del self._locks[chat_id]
+
+    async def try_acquire(self, chat_id: str) -> bool:
+        entry = self._entry(chat_id)
+        if entry.lock.locked():
+            return False
+        await entry.lock.acquire()
+        if self.backend and not await self._backend_call(
+            self.backend.try_lock(chat_id), entry, chat_id
+        ):
+            entry.lock.release()
+            self._evict_if_idle(chat_id)
+            return False
+        self.acquisitions += 1
+        return True
+
+    async def acquire(self, chat_id: str):
+        entry = self._entry(chat_id)
+        entry.waiters += 1
+        start = time.monotonic()
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            entry.waiters -= 1
+            self._evict_if_idle(chat_id)
+            raise
+        entry.waiters -= 1
+        if self.backend:
+            await self._backend_call(self.backend.lock(chat_id), entry, chat_id)
+        wait = time.monotonic() - start
+        self.acquisitions += 1
+        self.contended += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        logger.info(f"generation lock for {chat_id} acquired after {wait:.3f}s")
+
+    async def _backend_call(self, call, entry: _ChatLock, chat_id: str):
+        # release the local lock if the cross-process lock cannot be taken
+        try:
+            return await call
+        except BaseException:
+            entry.lock.release()
+            self._evict_if_idle(chat_id)
+            raise
+
+    async def release(self, chat_id: str):
+        entry = self._locks.get(chat_id)
+        if not entry or not entry.lock.locked():
+            logger.warning(
+                f"generation lock for {chat_id} is not held - internal error"
+            )
+            return
+        try:
+            if self.backend:
+                await self.backend.unlock(chat_id)
+        except Exception as err:
+            logger.error(f"failed to release advisory lock for {chat_id}: {err}")
+        finally:
+            entry.lock.release()
+            self._evict_if_idle(chat_id)
+
+    def metrics(self) -> GenerationLockMetrics:
+        return GenerationLockMetrics(
+            backend="postgres" if self.backend else "local",
+            active=sum(1 for e in self._locks.values() if e.lock.locked()),
+            queued=sum(e.waiters for e in self._locks.values()),
+            max_queue_depth=max((e.waiters for e in self._locks.values()), default=0),
+            acquisitions=self.acquisitions,
+            contended=self.contended,
+            avg_wait_ms=(
+                round(self.total_wait / self.contended * 1000, 2)
+                if self.contended
+                else 0.0
+            ),
+            max_wait_ms=round(self.max_wait * 1000, 2),
+        )
+
+    async def close(self):
+        if self.backend:
+            await self.backend.close()
+
+
+class GenerationManager:
+    def __init__(self, chat_id: str, locks: Optional[GenerationLocks] = None):
+        self.chat_id = chat_id
+        self.locks = locks or generation_locks
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_tb):
+        await self.locks.release(self.chat_id)
+
+    async def acquire_nowait(self) -> bool:
+        return await self.locks.try_acquire(self.chat_id)
+
+    async def acquire(self):
+        return await self.locks.acquire(self.chat_id)
+
+
+def _resolve_backend() -> Optional[AdvisoryLockBackend]:
+    if os.getenv("GENERATION_LOCK_BACKEND", "local") != "postgres":
+        return None
+    url = os.getenv("DB_URI")
+    assert url, "db uri missing!"
+    return AdvisoryLockBackend(
+        url, poll_interval=float(os.getenv("GENERATION_LOCK_POLL_INTERVAL", "0.2"))
+    )
+
+
+generation_locks = GenerationLocks(_resolve_backend())
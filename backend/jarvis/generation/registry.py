@@ -0,0 +1,116 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+import logging
+import os
+import time
+from typing import Dict, List, Optional, TypedDict
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+
+class GenerationInfo(TypedDict):
+    chat_id: str
+    message_id: str
+    user_id: Optional[str]
+    model: Optional[str]
+    age_s: float
+    tokens_streamed: int
+    chars_streamed: int
+    timeout_s: Optional[float]
+
+
+@dataclass
+class Generation:
+    chat_id: str
+    message_id: str
+    task: asyncio.Task
+    user_id: Optional[str] = None
+    model: Optional[str] = None
+    timeout: Optional[float] = None
+    started_at: float = field(default_factory=time.monotonic)
+    # one stream chunk is roughly one token
+    tokens_streamed: int = 0
+    chars_streamed: int = 0
+
+    def record(self, text: str):
+        self.tokens_streamed += 1
+        self.chars_streamed += len(text)
+
+    def info(self) -> GenerationInfo:
+        return GenerationInfo(
+            chat_id=self.chat_id,
+            message_id=self.message_id,
+            user_id=self.user_id,
+            model=self.model,
+            age_s=round(time.monotonic() - self.started_at, 3),
+            tokens_streamed=self.tokens_streamed,
+            chars_streamed=self.chars_streamed,
+            timeout_s=self.timeout,
+        )
+
+
+class GenerationRegistry:
+    """
+    In-flight generations of this process keyed by chat id. There is at most
+    one generation per chat, see `GenerationManager`.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self._running: Dict[str, Generation] = {}
+
+    def register(
+        self,
+        chat_id: str,
+        message_id: str,
+        task: asyncio.Task,
+        user_id: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> Generation:
+        if chat_id in self._running:
+            logger.warning(
+                f"generation for {chat_id} is already registered - internal error"
+            )
+        generation = Generation(
+            chat_id=chat_id,
+            message_id=message_id,
+            task=task,
+            user_id=user_id,
+            model=model,
+            timeout=self.timeout,
+        )
+        self._running[chat_id] = generation
+        task.add_done_callback(lambda _: self._unregister(generation))
+        return generation
+
+    def _unregister(self, generation: Generation):
+        # a newer generation of the same chat must not be dropped
+        if self._running.get(generation.chat_id) is generation:
+            del self._running[generation.chat_id]
+
+    def get(self, chat_id: str) -> Optional[Generation]:
+        return self._running.get(chat_id)
+
+    def cancel(self, chat_id: str) -> bool:
+        generation = self._running.get(chat_id)
+        if generation is None:
+            return False
+        return generation.task.cancel()
+
+    async def wait(self, generation: Generation):
+        """Awaits the generation task, raises `TimeoutError` once the limit is hit."""
+        await asyncio.wait_for(generation.task, generation.timeout)
+
+    def snapshot(self) -> List[GenerationInfo]:
+        return [g.info() for g in self._running.values()]
+
+
+def _resolve_timeout() -> Optional[float]:
+    timeout = float(os.getenv("GENERATION_TIMEOUT", "600"))
+    return timeout if timeout > 0 else None
+
+
+generation_registry = GenerationRegistry(_resolve_timeout())
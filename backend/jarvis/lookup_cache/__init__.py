@@ -0,0 +1 @@
+from .cache import LookupCache, lookup_cache
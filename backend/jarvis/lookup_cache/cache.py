@@ -0,0 +1,248 @@
+from __future__ import annotations
+import asyncio
+from collections import OrderedDict
+import json
+import logging
+import os
+import time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypedDict,
+    TypeVar,
+)
+from uuid import uuid4
+import psycopg
+from psycopg import sql
+from jarvis.db.db import DB_URI, get_connection_pool
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+_MISSING = object()
+K = TypeVar("K", bound=Hashable)
+
+
+class LookupCacheStats(TypedDict):
+    entries: int
+    hits: int
+    misses: int
+    invalidations: int
+    hit_rate: float
+
+
+class _Namespace:
+    def __init__(self):
+        self.entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+
+class LookupCache:
+    """
+    In-process TTL/LRU cache for small per chat and per user lookups that
+    rarely change (chat model, model selection, chat documents, document
+    token counts).
+
+    Writers call `invalidate`, which drops the local entry and, with `notify`,
+    publishes the key on a Postgres channel so that other replicas drop it as
+    well. The TTL bounds staleness if a notification is missed.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300.0,
+        max_entries: int = 10_000,
+        channel: str = "jarvis_lookup_cache",
+        notify: bool = True,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.channel = channel
+        self.notify = notify
+        self.origin = uuid4().hex
+        self._namespaces: Dict[str, _Namespace] = {}
+        # bumped on every invalidation, loads that raced with one are not stored
+        self._epoch = 0
+        self._listener: Optional[asyncio.Task] = None
+
+    def _namespace(self, name: str) -> _Namespace:
+        ns = self._namespaces.get(name)
+        if ns is None:
+            ns = self._namespaces[name] = _Namespace()
+        return ns
+
+    def _get(self, namespace: str, key: Hashable) -> Any:
+        ns = self._namespace(namespace)
+        entry = ns.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            ns.misses += 1
+            return _MISSING
+        ns.hits += 1
+        ns.entries.move_to_end(key)
+        return entry[1]
+
+    def _set(self, namespace: str, key: Hashable, value: Any, epoch: int):
+        # a load that raced with an invalidation may have read the old value
+        if self.ttl <= 0 or epoch != self._epoch:
+            return
+        ns = self._namespace(namespace)
+        ns.entries[key] = (time.monotonic() + self.ttl, value)
+        ns.entries.move_to_end(key)
+        while len(ns.entries) > self.max_entries:
+            ns.entries.popitem(last=False)
+
+    async def get_or_load(
+        self, namespace: str, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        self._ensure_listening()
+        value = self._get(namespace, key)
+        if value is not _MISSING:
+            return value
+        epoch = self._epoch
+        value = await loader()
+        self._set(namespace, key, value, epoch)
+        return value
+
+    async def get_or_load_many(
+        self,
+        namespace: str,
+        keys: Sequence[K],
+        loader: Callable[[List[K]], Awaitable[Mapping[K, Any]]],
+    ) -> Dict[K, Any]:
+        """`loader` receives the missing keys, keys it does not return are cached as None."""
+        self._ensure_listening()
+        values: Dict[K, Any] = {}
+        missing: List[K] = []
+        for key in keys:
+            value = self._get(namespace, key)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                values[key] = value
+        if missing:
+            epoch = self._epoch
+            loaded = await loader(missing)
+            for key in missing:
+                values[key] = loaded.get(key)
+                self._set(namespace, key, values[key], epoch)
+        return values
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch
+
+    def lookup(self, namespace: str, key: Hashable) -> Tuple[bool, Any]:
+        """Returns `(hit, value)`, for callers that batch their own loads."""
+        self._ensure_listening()
+        value = self._get(namespace, key)
+        return (False, None) if value is _MISSING else (True, value)
+
+    def store(self, namespace: str, key: Hashable, value: Any, epoch: int):
+        """Stores a value loaded by the caller, `epoch` is read before loading."""
+        self._set(namespace, key, value, epoch)
+
+    def _drop(self, namespace: str, key: Hashable):
+        self._epoch += 1
+        ns = self._namespace(namespace)
+        if ns.entries.pop(key, None) is not None:
+            ns.invalidations += 1
+
+    async def invalidate(self, namespace: str, key: str):
+        self._drop(namespace, key)
+        if not self.notify:
+            return
+        payload = json.dumps({"origin": self.origin, "ns": namespace, "key": key})
+        try:
+            pool = await get_connection_pool()
+            async with pool.connection() as conn:
+                await conn.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+        except Exception as err:
+            # other replicas catch up once the entry expires
+            logger.warning(f"failed to publish cache invalidation: {err}")
+
+    def clear(self):
+        self._epoch += 1
+        for ns in self._namespaces.values():
+            ns.entries.clear()
+
+    def _ensure_listening(self):
+        if not self.notify or self.ttl <= 0:
+            return
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(
+                self._listen(), name="lookup_cache_listener"
+            )
+
+    async def _listen(self):
+        retry_sleep = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    DB_URI, autocommit=True
+                ) as conn:
+                    await conn.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(self.channel))
+                    )
+                    # notifications may have been missed while disconnected
+                    self.clear()
+                    retry_sleep = 1
+                    async for notify in conn.notifies():
+                        self._on_notify(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.error(
+                    f"lookup cache listener failed, retrying in {retry_sleep}s: {err}"
+                )
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+    def _on_notify(self, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning(f"ignoring malformed cache invalidation: {payload}")
+            return
+        if message.get("origin") != self.origin:
+            self._drop(message["ns"], message["key"])
+
+    def stats(self) -> Dict[str, LookupCacheStats]:
+        return {
+            name: LookupCacheStats(
+                entries=len(ns.entries),
+                hits=ns.hits,
+                misses=ns.misses,
+                invalidations=ns.invalidations,
+                hit_rate=(
+                    round(ns.hits / (ns.hits + ns.misses), 3)
+                    if ns.hits + ns.misses
+                    else 0.0
+                ),
+            )
+            for name, ns in self._namespaces.items()
+        }
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+
+lookup_cache = LookupCache(
+    ttl=float(os.getenv("LOOKUP_CACHE_TTL", "300")),
+    max_entries=int(os.getenv("LOOKUP_CACHE_MAX_ENTRIES", "10000")),
+    channel=os.getenv("LOOKUP_CACHE_CHANNEL", "jarvis_lookup_cache"),
+    notify=os.getenv("LOOKUP_CACHE_NOTIFY", "true").lower() == "true",
+)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Literal, Optional, TypedDict
+from jarvis.messages.type import Message
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+StreamMode = Literal["full", "delta"]
+Emitter = Callable[[str, Any], Awaitable[Any]]
+
+STREAM_COALESCE_MS = int(os.getenv("STREAM_COALESCE_MS", "50"))
+STREAM_COALESCE_CHARS = int(os.getenv("STREAM_COALESCE_CHARS", "512"))
+
+
+class MessageDelta(TypedDict):
+    id: str
+    chatId: str
+    seq: int
+    text: str
+
+
+class MessageStreamer(ABC):
+    def __init__(self, resp: Message, emit: Emitter):
+        self.resp = resp
+        self.emit = emit
+
+    @abstractmethod
+    async def push(self, text: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def close(self):
+        raise NotImplementedError
+
+
+class FullMessageStreamer(MessageStreamer):
+    """Legacy protocol, the whole message is emitted for every chunk."""
+
+    async def push(self, text: str):
+        await self.emit("server_message", self.resp)
+
+    async def close(self):
+        pass
+
+
+class DeltaMessageStreamer(MessageStreamer):
+    """
+    Emits only the appended text with a sequence number. Chunks are coalesced
+    until either the time window elapses or the buffer grows past the size
+    limit, and the full message is emitted on close for reconciliation.
+
+    Deltas only go to the client that asked for them through `emit`. Other
+    clients in the chat room may not handle deltas, they keep receiving the
+    full message through `broadcast`.
+    """
+
+    def __init__(
+        self,
+        resp: Message,
+        emit: Emitter,
+        broadcast: Optional[Emitter] = None,
+        window_ms: int = STREAM_COALESCE_MS,
+        max_chars: int = STREAM_COALESCE_CHARS,
+    ):
+        super().__init__(resp, emit)
+        self.broadcast = broadcast
+        self.window = window_ms / 1000
+        self.max_chars = max_chars
+        self.seq = 0
+        self._buffer: list[str] = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._timer: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def push(self, text: str):
+        if not text:
+            return
+        if self.broadcast is not None:
+            await self.broadcast("server_message", self.resp)
+        self._buffer.append(text)
+        self._size += len(text)
+        if (
+            self._size >= self.max_chars
+            or time.monotonic() - self._last_flush >= self.window
+        ):
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as err:
+            logger.warning(f"failed to flush message delta: {err}")
+
+    async def flush(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            delta = MessageDelta(
+                id=self.resp["id"],
+                chatId=self.resp["chatId"],
+                seq=self.seq,
+                text="".join(self._buffer),
+            )
+            self._buffer = []
+            self._size = 0
+            self.seq += 1
+            self._last_flush = time.monotonic()
+            await self.emit("server_message_delta", delta)
+
+    async def close(self):
+        await self.flush()
+        await self.emit("server_message", self.resp)
+        if self.broadcast is not None:
+            await self.broadcast("server_message", self.resp)
+
+
+def resolve_streamer(
+    mode: StreamMode,
+    resp: Message,
+    emit_room: Emitter,
+    emit_sender: Emitter,
+    emit_others: Emitter,
+) -> MessageStreamer:
+    """
+    `emit_room` reaches the whole chat room, `emit_sender` only the requesting
+    client and `emit_others` everyone else in the room.
+    """
+    if mode == "delta":
+        return DeltaMessageStreamer(resp, emit_sender, broadcast=emit_others)
+    return FullMessageStreamer(resp, emit_room)
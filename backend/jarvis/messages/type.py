@@ -1,4 +1,4 @@
-from typing import Any, Literal, Optional, TypedDict, Union
+from typing import Any, Literal, NotRequired, Optional, TypedDict, Union
 
 
 class TextContent(TypedDict):
@@ -18,6 +18,13 @@ class ImageContent(TypedDict):
 MessageContent = Union[TextContent, ImageContent]
 
 
+class TokenUsage(TypedDict):
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int
+    cache_creation_tokens: int
+
+
 class Message(TypedDict):
     id: str
     chatId: str
@@ -29,3 +36,4 @@ class Message(TypedDict):
     score: Optional[float]
     liked: Optional[bool]
     context: Optional[str]
+    usage: NotRequired[Optional[TokenUsage]]
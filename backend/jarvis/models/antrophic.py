@@ -1,5 +1,10 @@
+from functools import cached_property
 import os
+from typing import Optional
+import anthropic
+import httpx
 from langchain_anthropic import ChatAnthropic
+from pydantic import PrivateAttr
 
 SUPPORTED_MODELS = (
     {
@@ -13,13 +18,41 @@ SUPPORTED_MODELS = (
 )
 
 
-def antrophic_model_resolver(model_name: str) -> ChatAnthropic:
+class PooledChatAnthropic(ChatAnthropic):
+    """ChatAnthropic whose sdk clients send requests through shared http clients."""
+
+    _http_client: Optional[httpx.Client] = PrivateAttr(default=None)
+    _http_async_client: Optional[httpx.AsyncClient] = PrivateAttr(default=None)
+
+    @cached_property
+    def _client(self) -> anthropic.Client:
+        if self._http_client is None:
+            return super()._client
+        return anthropic.Client(**self._client_params, http_client=self._http_client)
+
+    @cached_property
+    def _async_client(self) -> anthropic.AsyncClient:
+        if self._http_async_client is None:
+            return super()._async_client
+        return anthropic.AsyncClient(
+            **self._client_params, http_client=self._http_async_client
+        )
+
+
+def antrophic_model_resolver(
+    model_name: str,
+    http_client: Optional[httpx.Client] = None,
+    http_async_client: Optional[httpx.AsyncClient] = None,
+) -> ChatAnthropic:
     if model_name not in SUPPORTED_MODELS.keys():
         raise ValueError(
             f"unknown antrophic model  - supported models: {SUPPORTED_MODELS}"
         )
-    return ChatAnthropic(
+    llm = PooledChatAnthropic(
         **SUPPORTED_MODELS[model_name],
         model=model_name,  # type: ignore
-        stream_usage=False,
+        stream_usage=True,
     )
+    llm._http_client = http_client
+    llm._http_async_client = http_async_client
+    return llm
@@ -0,0 +1,158 @@
+import hashlib
+import os
+from typing import (
+    Any,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.messages.ai import UsageMetadata
+from langchain_google_vertexai import ChatVertexAI
+from langchain_openai import ChatOpenAI
+from jarvis.messages.type import Message, TextContent, TokenUsage
+from jarvis.messages.utils import convert_to_langchain_message
+from dotenv import load_dotenv
+
+load_dotenv()
+
+Provider = Literal["openai", "antrophic", "google"]
+
+PROMPT_CACHING = os.getenv("PROMPT_CACHING", "true").lower() == "true"
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def model_provider(llm: Union[ChatOpenAI, ChatVertexAI, ChatAnthropic]) -> Provider:
+    if isinstance(llm, ChatOpenAI):
+        return "openai"
+    elif isinstance(llm, ChatAnthropic):
+        return "antrophic"
+    elif isinstance(llm, ChatVertexAI):
+        return "google"
+    raise TypeError("Unsupported LLM type")
+
+
+def _with_breakpoint(msg: BaseMessage) -> BaseMessage:
+    # copies the message, checkpointed state must stay free of cache markers
+    if isinstance(msg, ToolMessage):
+        return msg.model_copy(
+            update={
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "content": msg.content,
+                        "tool_use_id": msg.tool_call_id,
+                        "is_error": msg.status == "error",
+                        "cache_control": EPHEMERAL,
+                    }
+                ]
+            }
+        )
+    if isinstance(msg.content, str):
+        if not msg.content.strip():
+            return msg
+        return msg.model_copy(
+            update={
+                "content": [
+                    {"type": "text", "text": msg.content, "cache_control": EPHEMERAL}
+                ]
+            }
+        )
+    content = list(msg.content)
+    for i in range(len(content) - 1, -1, -1):
+        block = content[i]
+        if isinstance(block, dict) and block.get("type") == "text":
+            content[i] = {**block, "cache_control": EPHEMERAL}
+            return msg.model_copy(update={"content": content})
+    return msg
+
+
+def _text_blocks(message: Message) -> List[str]:
+    return [
+        cast(TextContent, block)["text"]
+        for block in message["content"]
+        if block["type"] == "text"
+    ]
+
+
+def build_prompt(
+    provider: Provider,
+    system_prompt: Optional[Message],
+    messages: Sequence[BaseMessage],
+    summary: Optional[str] = None,
+    extra_body: Optional[Mapping[str, Any]] = None,
+) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+    """
+    Assembles the model input as `[system prompt, summary, *history]` and
+    returns it together with provider specific invoke kwargs. `extra_body` is
+    the one configured on the model, invoke kwargs replace it, so it is merged
+    into the returned one.
+
+    The system prompt (instructions + documents) is the long, stable prefix of
+    every request, so it is marked for provider side prompt caching:
+
+    - Anthropic: `cache_control` breakpoints on the system prompt and on the
+      last human/tool message, so later turns and ReAct iterations read the
+      whole conversation prefix from cache.
+    - OpenAI: prefixes are cached automatically, requests sharing a system
+      prompt are routed together via `prompt_cache_key`.
+    - Google: implicit caching, only needs the stable prefix.
+
+    The running history summary (see `jarvis.agent.compaction`) goes after the
+    system prompt, so a new summary does not invalidate the cached documents.
+    """
+    history = list(messages)
+    if summary:
+        history.insert(
+            0,
+            SystemMessage(content=f"Summary of the earlier conversation:\n\n{summary}"),
+        )
+    if not system_prompt:
+        return history, {}
+
+    system = convert_to_langchain_message(system_prompt)
+    if not PROMPT_CACHING:
+        return [system, *history], {}
+
+    if provider == "antrophic":
+        blocks: List[Any] = [
+            {"type": "text", "text": text} for text in _text_blocks(system_prompt)
+        ]
+        if blocks:
+            blocks[-1]["cache_control"] = EPHEMERAL
+        system = SystemMessage(content=blocks)
+        if history and isinstance(history[-1], (HumanMessage, ToolMessage)):
+            history[-1] = _with_breakpoint(history[-1])
+        return [system, *history], {}
+    elif provider == "openai":
+        digest = hashlib.sha256(
+            "".join(_text_blocks(system_prompt)).encode("utf-8")
+        ).hexdigest()
+        return [system, *history], {
+            "extra_body": {**(extra_body or {}), "prompt_cache_key": digest[:32]}
+        }
+    return [system, *history], {}
+
+
+def to_token_usage(usage: Optional[UsageMetadata]) -> Optional[TokenUsage]:
+    if not usage:
+        return None
+    details = usage.get("input_token_details") or {}
+    return TokenUsage(
+        input_tokens=usage.get("input_tokens", 0),
+        output_tokens=usage.get("output_tokens", 0),
+        cached_input_tokens=details.get("cache_read") or 0,
+        cache_creation_tokens=details.get("cache_creation") or 0,
+    )
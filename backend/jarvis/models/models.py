@@ -3,9 +3,7 @@ from typing import Optional
 import logging
 
 from jarvis.models import VENDOR_MODEL_MAPPING
-from jarvis.models.antrophic import antrophic_model_resolver
-from jarvis.models.google import google_model_resolver
-from jarvis.models.openai import openai_model_resolver
+from jarvis.models.pool import model_pool
 from jarvis.models.type import Model
 
 logger = logging.getLogger(__name__)
@@ -24,20 +22,8 @@ def model_factory(
     provider = provider or VENDOR_MODEL_MAPPING.get(model_selection)
     assert provider, "provider is required for model resolution!"
 
-    if provider == "antrophic":
-        return Model(
-            model_impl=antrophic_model_resolver(model_selection),
-            model_name=model_selection,
-        )
-
-    if provider == "google":
-        return Model(
-            model_impl=google_model_resolver(model_selection),
-            model_name=model_selection,
-        )
-
-    # openai
+    # clients are shared across turns, see jarvis.models.pool
     return Model(
-        model_impl=openai_model_resolver(model_selection),
+        model_impl=model_pool.get(model_selection, provider),
         model_name=model_selection,
     )
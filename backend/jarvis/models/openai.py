@@ -1,4 +1,6 @@
 import os
+from typing import Optional
+import httpx
 from langchain_openai import ChatOpenAI
 
 SUPPORTED_MODELS = (
@@ -23,10 +25,17 @@ SUPPORTED_MODELS = (
 )
 
 
-def openai_model_resolver(model_name: str) -> ChatOpenAI:
+def openai_model_resolver(
+    model_name: str,
+    http_client: Optional[httpx.Client] = None,
+    http_async_client: Optional[httpx.AsyncClient] = None,
+) -> ChatOpenAI:
     if model_name not in SUPPORTED_MODELS.keys():
         raise ValueError(f"unknown openai model - supported models: {SUPPORTED_MODELS}")
     return ChatOpenAI(
         model=model_name,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        stream_usage=True,
         **SUPPORTED_MODELS[model_name],  # type: ignore
     )
@@ -0,0 +1,209 @@
+from __future__ import annotations
+from collections import defaultdict
+from dataclasses import dataclass
+import logging
+import os
+from typing import Any, Dict, Iterable, Optional, Tuple, TypedDict, Union
+import httpx
+from langchain_anthropic import ChatAnthropic
+from langchain_google_vertexai import ChatVertexAI
+from langchain_openai import ChatOpenAI
+from dotenv import load_dotenv
+
+from jarvis.models import VENDOR_MODEL_MAPPING
+from jarvis.models.antrophic import antrophic_model_resolver
+from jarvis.models.google import google_model_resolver
+from jarvis.models.openai import openai_model_resolver
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+ChatModel = Union[ChatOpenAI, ChatVertexAI, ChatAnthropic]
+
+MODEL_HTTP_MAX_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "100"))
+MODEL_HTTP_MAX_KEEPALIVE = int(os.getenv("MODEL_HTTP_MAX_KEEPALIVE", "20"))
+MODEL_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MODEL_HTTP_KEEPALIVE_EXPIRY", "120"))
+MODEL_HTTP_TIMEOUT = float(os.getenv("MODEL_HTTP_TIMEOUT", "600"))
+
+
+@dataclass
+class ProviderStats:
+    clients: int = 0
+    hits: int = 0
+    misses: int = 0
+    requests: int = 0
+    pending: int = 0
+    errors: int = 0
+
+
+class ProviderMetrics(TypedDict):
+    clients: int
+    hits: int
+    misses: int
+    requests: int
+    pending: int
+    errors: int
+    connections: int
+    idle_connections: int
+
+
+class _InstrumentedTransport(httpx.HTTPTransport):
+    def __init__(self, stats: ProviderStats, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+        self.stats.pending += 1
+        try:
+            return super().handle_request(request)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.pending -= 1
+
+
+class _InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, stats: ProviderStats, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+        self.stats.pending += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self.stats.pending -= 1
+
+
+class ModelClientPool:
+    """
+    Process-wide registry of chat model clients.
+
+    One client is handed out per (provider, model) - model params are fixed per
+    model in SUPPORTED_MODELS - and all clients of a provider share a keep-alive
+    HTTP connection pool, so connections and TLS sessions are reused across
+    chat turns.
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], ChatModel] = {}
+        self._http: Dict[str, Tuple[httpx.Client, httpx.AsyncClient]] = {}
+        self._stats: defaultdict[str, ProviderStats] = defaultdict(ProviderStats)
+
+    def get(self, model_name: str, provider: Optional[str] = None) -> ChatModel:
+        provider = provider or VENDOR_MODEL_MAPPING.get(model_name)
+        assert provider, "provider is required for model resolution!"
+
+        stats = self._stats[provider]
+        key = (provider, model_name)
+        client = self._clients.get(key)
+        if client is not None:
+            stats.hits += 1
+            return client
+
+        stats.misses += 1
+        client = self._build(provider, model_name)
+        self._clients[key] = client
+        stats.clients += 1
+        logger.info(f"created {provider} client for {model_name}")
+        return client
+
+    def _build(self, provider: str, model_name: str) -> ChatModel:
+        if provider == "antrophic":
+            http_client, http_async_client = self._http_clients(provider)
+            return antrophic_model_resolver(
+                model_name,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+        if provider == "google":
+            # vertex clients manage their own channels, we only reuse the instance
+            return google_model_resolver(model_name)
+        http_client, http_async_client = self._http_clients(provider)
+        return openai_model_resolver(
+            model_name,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+
+    def _http_clients(self, provider: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        if provider not in self._http:
+            stats = self._stats[provider]
+            limits = httpx.Limits(
+                max_connections=MODEL_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=MODEL_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=MODEL_HTTP_KEEPALIVE_EXPIRY,
+            )
+            timeout = httpx.Timeout(MODEL_HTTP_TIMEOUT, connect=10)
+            self._http[provider] = (
+                httpx.Client(
+                    transport=_InstrumentedTransport(stats, limits=limits),
+                    timeout=timeout,
+                ),
+                httpx.AsyncClient(
+                    transport=_InstrumentedAsyncTransport(stats, limits=limits),
+                    timeout=timeout,
+                ),
+            )
+        return self._http[provider]
+
+    async def warmup(self, model_names: Iterable[str]):
+        for model_name in model_names:
+            provider = VENDOR_MODEL_MAPPING.get(model_name)
+            if not provider:
+                logger.warning(f"skipping warmup of unsupported model {model_name}")
+                continue
+            client = self.get(model_name, provider)
+            base_url = _base_url(client)
+            if provider not in self._http or not base_url:
+                continue
+            try:
+                # open a connection so the first chat turn skips the TLS handshake
+                await self._http[provider][1].head(base_url)
+            except Exception as err:
+                logger.warning(f"failed to prime {provider} connection: {err}")
+        logger.info(f"model clients warmed up: {self.metrics()}")
+
+    def metrics(self) -> Dict[str, ProviderMetrics]:
+        out: Dict[str, ProviderMetrics] = {}
+        for provider, stats in self._stats.items():
+            connections: list[Any] = []
+            if provider in self._http:
+                for http in self._http[provider]:
+                    pool = getattr(http._transport, "_pool", None)
+                    connections.extend(getattr(pool, "connections", []))
+            out[provider] = ProviderMetrics(
+                clients=stats.clients,
+                hits=stats.hits,
+                misses=stats.misses,
+                requests=stats.requests,
+                pending=stats.pending,
+                errors=stats.errors,
+                connections=len(connections),
+                idle_connections=sum(1 for c in connections if c.is_idle()),
+            )
+        return out
+
+    async def close(self):
+        for http_client, http_async_client in self._http.values():
+            http_client.close()
+            await http_async_client.aclose()
+        self._http.clear()
+        self._clients.clear()
+
+
+def _base_url(client: ChatModel) -> Optional[str]:
+    if isinstance(client, ChatOpenAI):
+        return client.openai_api_base or "https://api.openai.com/v1"
+    if isinstance(client, ChatAnthropic):
+        return client.anthropic_api_url
+    return None
+
+
+model_pool = ModelClientPool()
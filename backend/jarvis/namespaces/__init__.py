@@ -1,4 +1,5 @@
 from .base import Base
 from .jarvis import Jarvis
+from .postgres_manager import AsyncPostgresManager
 
-__all__ = ["Base", "Jarvis"]
+__all__ = ["Base", "Jarvis", "AsyncPostgresManager"]
@@ -1,13 +1,17 @@
 from __future__ import annotations
-from typing import Coroutine, Optional, cast
+from typing import Any, Coroutine, Optional, cast
 import socketio
 from jarvis.auth.auth import validate_token
 from jarvis.context import Context
 from jarvis.context.context import FaithfullnessParams
+from jarvis.generation import generation_registry
 from jarvis.messages.type import Message, TextContent
+from jarvis.messages.stream import StreamMode, resolve_streamer
 from jarvis.messages.utils import convert_to_langchain_message
+from jarvis.models.caching import to_token_usage
 from jarvis.models.models import get_default_model
 from jarvis.queries.query_handlers import create_message
+from jarvis.scoring import ScoringJob, scoring_queue
 import logging
 from dotenv import load_dotenv
 import json
@@ -15,11 +19,9 @@ import asyncio
 from abc import ABC, abstractmethod
 from jarvis.agent.base import runner
 from langgraph.graph.state import CompiledStateGraph
-from ragas import SingleTurnSample
-from ragas.metrics import Faithfulness
-from ragas.llms import LangchainLLMWrapper
 from copy import deepcopy
 from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages.ai import UsageMetadata, add_usage
 
 
 load_dotenv()
@@ -49,12 +51,11 @@ class Base(socketio.AsyncNamespace, ABC):
     async def on_abort(self, sid, data):
         logger.debug(f"abort {json.dumps(data)}")
         room_id = data  # json.loads(data["data"])["chat_id"]
-        task = [task for task in asyncio.all_tasks() if task.get_name() == room_id]
-        if len(task) == 0:
+        if generation_registry.get(room_id) is None:
             return await self.emit(
                 "abort", "no task found", room=room_id, namespace=self.namespace
             )
-        ok = task[0].cancel()
+        ok = generation_registry.cancel(room_id)
         logger.debug(f"cancel: {ok}")
         return await self.emit("abort", "OK", room=room_id, namespace=self.namespace)
 
@@ -72,60 +73,95 @@ class Base(socketio.AsyncNamespace, ABC):
         messages: list[Message],
         resp: Message,
         chat_id: str,
+        ctx: Context,
+        sid: str,
+        stream_mode: StreamMode = "full",
     ):
-        async for chunk in runner(
-            app,
-            {"messages": list(map(convert_to_langchain_message, messages))},
-            event_name=chat_id,
-        ):
-            if isinstance(chunk["data"], str):
-                if (
-                    chunk["type"]["logical_type"] == "on_tool_start"
-                    and len(resp["content"]) > 0
-                ):
-                    cast(TextContent, resp["content"][-1])["text"] += (
-                        "\n" + chunk["data"]
-                    )
-                else:
-                    cast(TextContent, resp["content"][-1])["text"] += chunk["data"]
-            elif isinstance(chunk["data"], list) and "text" in chunk["data"][0]:
-                cast(TextContent, resp["content"][-1])["text"] += chunk["data"][0][
-                    "text"
-                ]
-            await self.emit(
-                "server_message",
-                resp,
+        async def emit_room(event: str, payload: Any):
+            return await self.emit(
+                event,
+                payload,
+                room=chat_id,
+                namespace=self.namespace,
+            )
+
+        async def emit_sender(event: str, payload: Any):
+            return await self.emit(event, payload, to=sid, namespace=self.namespace)
+
+        async def emit_others(event: str, payload: Any):
+            return await self.emit(
+                event,
+                payload,
                 room=chat_id,
+                skip_sid=sid,
                 namespace=self.namespace,
             )
 
-    async def calculate_faithfullness(
+        streamer = resolve_streamer(
+            stream_mode, resp, emit_room, emit_sender, emit_others
+        )
+        generation = generation_registry.get(chat_id)
+        usage: Optional[UsageMetadata] = None
+        try:
+            async for chunk in runner(
+                app,
+                {"messages": list(map(convert_to_langchain_message, messages))},
+                event_name=chat_id,
+                ctx=ctx,
+            ):
+                if "usage" in chunk:
+                    usage = add_usage(usage, chunk["usage"])
+                    continue
+                text = ""
+                if isinstance(chunk["data"], str):
+                    if (
+                        chunk["type"]["logical_type"] == "on_tool_start"
+                        and len(resp["content"]) > 0
+                    ):
+                        text = "\n" + chunk["data"]
+                    else:
+                        text = chunk["data"]
+                elif isinstance(chunk["data"], list) and "text" in chunk["data"][0]:
+                    text = chunk["data"][0]["text"]
+                cast(TextContent, resp["content"][-1])["text"] += text
+                if generation:
+                    generation.record(text)
+                await streamer.push(text)
+        finally:
+            resp["usage"] = to_token_usage(usage)
+            await streamer.close()
+
+    async def _faithfullness_job(
         self,
         ctx: Context,
         user_message: str,
         resp: Message,
         chat_id: str,
         llm: BaseChatModel,
-    ):
+    ) -> ScoringJob:
         retrieved_context = [o.page_content async for c in ctx for o in c.tool_output]
-        sample = SingleTurnSample(
-            user_input=user_message,
-            retrieved_contexts=retrieved_context,
+
+        async def on_score(score: float):
+            await self.emit(
+                "message_score",
+                {"id": resp["id"], "chatId": chat_id, "score": score},
+                room=chat_id,
+                namespace=self.namespace,
+            )
+
+        return ScoringJob(
+            message_id=resp["id"],
+            chat_id=chat_id,
+            user_message=user_message,
             response="".join(
                 map(
                     lambda x: cast(TextContent, x)["text"],
                     filter(lambda x: x["type"] == "text", resp["content"]),
                 )
             ),
-        )
-        scorer = Faithfulness(llm=LangchainLLMWrapper(llm))
-        score = await scorer.single_turn_ascore(sample)
-        resp["score"] = score * 100
-        await self.emit(
-            "server_message",
-            resp,
-            room=chat_id,
-            namespace=self.namespace,
+            retrieved_contexts=retrieved_context,
+            llm=llm,
+            on_score=on_score,
         )
 
     async def task_runner(
@@ -136,10 +172,15 @@ class Base(socketio.AsyncNamespace, ABC):
         resp: Message,
         calculate_faithfullness: bool = False,
         faithfullness_params: Optional[FaithfullnessParams] = None,
+        model_name: Optional[str] = None,
     ):
+        scoring_job: Optional[ScoringJob] = None
         try:
             task = asyncio.create_task(stream_future, name=chat_id)
-            await task
+            generation = generation_registry.register(
+                chat_id, resp["id"], task, user_id=resp["userId"], model=model_name
+            )
+            await generation_registry.wait(generation)
             if (
                 calculate_faithfullness
                 and faithfullness_params
@@ -147,7 +188,8 @@ class Base(socketio.AsyncNamespace, ABC):
             ):
                 logger.info("need to calculate context faithfullness")
                 ctx_copy = deepcopy(faithfullness_params["ctx"])
-                await self.calculate_faithfullness(
+                # scoring runs in the background once the message is persisted
+                scoring_job = await self._faithfullness_job(
                     ctx_copy,
                     faithfullness_params["user_message"],
                     resp,
@@ -173,8 +215,18 @@ class Base(socketio.AsyncNamespace, ABC):
                     )
         except asyncio.CancelledError:
             logger.info("Successfully cancelled task")
+        except TimeoutError:
+            logger.warning(f"generation for {chat_id} timed out")
+            scoring_job = None
+            cast(TextContent, resp["content"][-1])[
+                "text"
+            ] += f"\n\n**Generation timed out after {generation_registry.timeout:.0f}s.**"
+            await self.emit(
+                "server_message", resp, room=chat_id, namespace=self.namespace
+            )
         except Exception as err:
             logger.error(f"Unexpected error: {err}", exc_info=True)
+            scoring_job = None
             resp["content"] = [
                 TextContent(
                     text=f"Internal error: {err}.\n\n**Please include this error message when reporting the error.**",
@@ -185,7 +237,14 @@ class Base(socketio.AsyncNamespace, ABC):
                 "server_message", resp, room=chat_id, namespace=self.namespace
             )
         finally:
-            await create_message(resp)
+            try:
+                # committed before <done>, clients may reload the chat right after
+                await create_message(resp)
+                if scoring_job:
+                    # the score is written onto the row
+                    scoring_queue.submit(scoring_job)
+            except Exception as err:
+                logger.error(f"failed to persist response {resp['id']}: {err}")
             logger.info("task done")
             return await self.emit(
                 "server_message",
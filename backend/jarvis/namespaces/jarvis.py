@@ -1,7 +1,7 @@
-from collections import defaultdict
 from typing import Any, Optional, cast
 from jarvis.chat.chat_title import create_chat_title
 from jarvis.context.context import FaithfullnessParams
+from jarvis.generation import GenerationManager
 from jarvis.graphrag.graphrag import query_documents
 import logging
 from dotenv import load_dotenv
@@ -17,18 +17,20 @@ from jarvis.tools.tools import bootstrap_tools
 from jarvis.agent.base import build_graph
 from jarvis.namespaces import Base
 from jarvis.queries.query_handlers import (
-    create_chat,
     create_message,
-    get_chat_docs,
-    get_chat_model,
-    get_doc_tokens,
-    read_docs_helper,
+    get_chat_prompt_doc_ids,
+    read_doc_segments,
     set_chat_model,
     update_chat,
-    get_model_selection,
     update_chat_title,
     update_document_pack_status,
 )
+from jarvis.queries.turn_bootstrap import (
+    TurnBootstrap,
+    bootstrap_turn,
+    read_turn_docs,
+    turn_doc_tokens,
+)
 from jarvis.context import Context
 import asyncio
 from jarvis.models.models import model_factory
@@ -40,35 +42,8 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
-class GenerationManager:
-    generation_queue: defaultdict[str, asyncio.Queue] = defaultdict(
-        lambda: asyncio.Queue(1)
-    )
-
-    def __init__(self, chat_id: str):
-        self.chat_id = chat_id
-
-    async def __aenter__(self):
-        return self
-
-    async def __aexit__(self, exc_type, exc_value, exc_tb):
-        try:
-            self.generation_queue[self.chat_id].get_nowait()
-        except asyncio.QueueEmpty:
-            logger.warning(f"queue should not be empty - internal error")
-
-    async def acquire_nowait(self) -> bool:
-        try:
-            self.generation_queue[self.chat_id].put_nowait(None)
-            return True
-        except asyncio.QueueFull:
-            return False
-
-    async def acquire(self):
-        return await self.generation_queue[self.chat_id].put(None)
-
-
 class Jarvis(Base):
+    _prefetches: set[asyncio.Task] = set()
 
     async def on_join_pack_room(self, sid, data):
         logger.info(f"{sid} requesting to join room for pack {data['room_id']}")
@@ -137,10 +112,33 @@ class Jarvis(Base):
         async with run_manager:
             additional_data: dict[str, Any] = cast(dict[str, Any], data.get("data", {}))
 
+            first_message = bool(additional_data.get("first_message"))
+            # a new chat starts with a fresh session, nothing is cached yet
+            system_prompt = (
+                None if first_message else await self._check_system_prompt_cache(sid)
+            )
+            cached_prompt_available = system_prompt is not None
+
+            personality = additional_data.get("personality", {})
+            logger.info(f"personality: {personality.get("name")}")
+            chat_doc_ids: list[str] = additional_data.get("docs", [])
+            # documents are only needed if the system prompt may be (re)built
+            prompt_doc_ids = (
+                (personality.get("doc_ids") or []) + chat_doc_ids
+                if not cached_prompt_available or len(chat_doc_ids) > 0
+                else []
+            )
+
             try:
-                # create chat
-                if additional_data.get("first_message"):
-                    await self._create_chat(chat_id, user_id, sid)
+                # create chat and load the turn state in one round trip
+                turn = await bootstrap_turn(
+                    chat_id,
+                    user_id,
+                    create_chat=first_message,
+                    doc_ids=prompt_doc_ids,
+                )
+                if first_message:
+                    await self._init_chat_session(chat_id, user_id, sid)
             except Exception as err:
                 return await self._emit_error(chat_id, f"failed to create chat: {err}")
 
@@ -153,25 +151,18 @@ class Jarvis(Base):
                 namespace=self.namespace,
             )
 
-            # check if we have the system prompt cached
-            system_prompt = await self._check_system_prompt_cache(sid)
-            cached_prompt_available = system_prompt is not None
-
-            personality = additional_data.get("personality", {})
-            logger.info(f"personality: {personality.get("name")}")
-            chat_doc_ids: list[str] = additional_data.get("docs", [])
-
             try:
                 # generate system prompt if no cached prompt available or if new docs are available and system prompt needs update
                 if not cached_prompt_available or (
                     cached_prompt_available
                     and len(chat_doc_ids) > 0
                     and await self._additional_docs_available(
-                        sid, chat_id, chat_doc_ids
+                        sid, turn, chat_doc_ids
                     )
                 ):
                     system_prompt = await self._build_system_prompt(
                         sid,
+                        turn,
                         chat_doc_ids,
                         personality,
                         chat_id,
@@ -190,27 +181,21 @@ class Jarvis(Base):
                 )
 
             try:
-                # persist user message
+                # persist user message, batched with the messages of other chats
                 await create_message(data)
             except Exception as err:
                 return await self._emit_error(
                     chat_id, f"failed to persist user message: {err}"
                 )
 
-            try:
-                # start AI message generation
-                chat_model: Optional[str] = await get_chat_model(chat_id)
-            except Exception as err:
-                return await self._emit_error(
-                    chat_id, f"failed to get chat model: {err}"
-                )
             # resolve LLM model
+            chat_model: Optional[str] = turn["chat_model"]
             logger.info(f"{chat_model=}")
-            model_selection = ""
+            model_selection: str = ""
             try:
                 # models get deprecated we need to check if it is still a viable model
                 if not chat_model or chat_model not in ALL_SUPPORTED_MODELS:
-                    model_selection: str = await get_model_selection(user_id)
+                    model_selection = turn["model_selection"]
                 sess = await self.get_session(sid, self.namespace)
                 model = model_factory(
                     chat_model or model_selection, sess.get("docs_token_count", 0)
@@ -232,13 +217,26 @@ class Jarvis(Base):
                 tool_selection: list[str] = personality.get("tools", [])
                 # wire up the relevant agent
                 tools = bootstrap_tools(ctx=ctx, tool_names=tool_selection)
-                app = await build_graph(model["model_impl"], tools, chat_id, ctx)
+                app = await build_graph(
+                    model["model_impl"],
+                    tools,
+                    model["model_name"],
+                    personality.get("id") or personality.get("name"),
+                )
             except Exception as err:
                 return await self._emit_error(chat_id, f"agent build failed: {err}")
             # we prepare for response generation
             messages = [data]
             resp = new_server_message(chat_id, user_id)
-            stream_future = self.stream_response(app, messages, resp, chat_id)
+            stream_future = self.stream_response(
+                app,
+                messages,
+                resp,
+                chat_id,
+                ctx,
+                sid,
+                stream_mode=additional_data.get("stream_mode", "full"),
+            )
             await self.task_runner(
                 sid,
                 stream_future,
@@ -257,6 +255,7 @@ class Jarvis(Base):
                     ),
                     llm=model["model_impl"],
                 ),
+                model_name=model["model_name"],
             )
         # finalize and wrap things up
         if additional_data.get("first_message"):
@@ -306,9 +305,22 @@ class Jarvis(Base):
     async def on_join_chat_room(self, sid: str, data: dict[str, Any]):
         logger.info(f"{sid} requesting to join chat room {data['room_id']}")
         await self._room_resolver(sid, data["room_id"])
+        # warm the prompt cache while the user is still typing
+        prefetch = asyncio.create_task(self._prefetch_prompt_docs(data["room_id"]))
+        self._prefetches.add(prefetch)
+        prefetch.add_done_callback(self._prefetches.discard)
 
-    async def _create_chat(self, chat_id: str, user_id: str, sid: str):
-        await create_chat(chat_id, user_id)
+    async def _prefetch_prompt_docs(self, chat_id: str):
+        try:
+            # only documents attached to the chat, never ids supplied by the client
+            ids = await get_chat_prompt_doc_ids(chat_id)
+            if ids:
+                await read_doc_segments(ids)
+                logger.info(f"prefetched {len(ids)} prompt docs for {chat_id}")
+        except Exception as err:
+            logger.warning(f"prompt doc prefetch failed for {chat_id}: {err}")
+
+    async def _init_chat_session(self, chat_id: str, user_id: str, sid: str):
         await self.save_session(
             sid, {"chat_id": chat_id, "user_id": user_id}, namespace=self.namespace
         )
@@ -325,6 +337,7 @@ class Jarvis(Base):
     async def _build_system_prompt(
         self,
         sid: str,
+        turn: TurnBootstrap,
         chat_doc_ids: list[str],
         personality: dict[str, Any],
         chat_id: str,
@@ -343,12 +356,12 @@ class Jarvis(Base):
 
         # build system prompt
         current_sess["docs"] = set(chat_doc_ids)
-        current_sess["docs_token_count"] = await get_doc_tokens(chat_doc_ids)
+        current_sess["docs_token_count"] = turn_doc_tokens(turn, chat_doc_ids)
         logger.info("creating system message...")
         system_message_content = instruction
         doc_contents = await asyncio.gather(
-            read_docs_helper(personality_doc_ids),
-            read_docs_helper(chat_doc_ids),
+            read_turn_docs(turn, personality_doc_ids),
+            read_turn_docs(turn, chat_doc_ids),
         )
         docs = "\n\n".join(doc_contents) if personality_doc_ids or chat_doc_ids else ""
         system_message_content = (
@@ -370,7 +383,7 @@ class Jarvis(Base):
             return
 
         # persist in db
-        create_message_future = create_message(system_message)
+        create_message_future = create_message(system_message, durable=False)
         update_chat_future = update_chat(chat_id, personality, chat_doc_ids)
         await asyncio.gather(create_message_future, update_chat_future)
         # persist in cache
@@ -381,14 +394,14 @@ class Jarvis(Base):
     async def _additional_docs_available(
         self,
         sid: str,
-        chat_id: str,
+        turn: TurnBootstrap,
         chat_doc_ids: list[str],
     ) -> bool:
         sess = await self.get_session(sid, self.namespace)
-        existing_docs = sess.get("docs")
+        existing_docs: set[str] = sess.get("docs") or set()
         # we need to double check with db
         if not existing_docs:
-            existing_docs: set[str] = await get_chat_docs(chat_id)
+            existing_docs = turn["chat_docs"]
         current_docs: set[str] = set(chat_doc_ids)
         diff: set[str] = current_docs - existing_docs
         if len(diff):
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Optional
+import psycopg
+from psycopg import sql
+from engineio import json
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+# NOTIFY payloads are limited to 8000 bytes, larger messages are spilled to a table
+MAX_NOTIFY_PAYLOAD = 7500
+SPILL_TTL_SECONDS = 300
+
+
+class AsyncPostgresManager(AsyncPubSubManager):
+    """
+    Postgres based client manager for asyncio servers.
+
+    Messages are shared between replicas with LISTEN/NOTIFY. Payloads that do
+    not fit into a notification are written to `common.socketio_payloads` and
+    only the row id is sent over the channel. Notifications are sent in
+    batches on a dedicated connection, publish failures are logged and do not
+    fail the emit.
+
+    :param url: Postgres connection string used by the listener connection.
+    :param channel: The channel name on which the servers send and receive
+                    notifications. Must be the same in all the servers.
+    :param write_only: If set to ``True``, only initialize to emit events.
+    """
+
+    name = "postgres"
+
+    def __init__(
+        self,
+        url: str,
+        channel: str = "socketio",
+        write_only: bool = False,
+        logger: Any = None,
+        max_payload: int = MAX_NOTIFY_PAYLOAD,
+        spill_ttl: int = SPILL_TTL_SECONDS,
+    ):
+        self.url = url
+        self.max_payload = max_payload
+        self.spill_ttl = spill_ttl
+        self._last_purge = 0.0
+        self._pending: list[dict[str, Any]] = []
+        self._wakeup = asyncio.Event()
+        self._publisher: Optional[asyncio.Task] = None
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    async def _publish(self, data: dict[str, Any]):
+        # emits must neither wait for nor fail on the database, a background
+        # publisher sends everything queued since its last round trip
+        self._pending.append(data)
+        self._wakeup.set()
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(
+                self._run_publisher(), name="socketio_publisher"
+            )
+
+    async def _run_publisher(self):
+        conn: Optional[psycopg.AsyncConnection] = None
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                batch, self._pending = self._pending, []
+                if not batch:
+                    continue
+                try:
+                    if conn is None or conn.closed:
+                        conn = await psycopg.AsyncConnection.connect(
+                            self.url, autocommit=True
+                        )
+                    await self._send(conn, batch)
+                except Exception as err:
+                    self._get_logger().error(
+                        f"failed to publish {len(batch)} socketio messages: {err}"
+                    )
+                    if conn is not None:
+                        await conn.close()
+                    conn = None
+        finally:
+            if conn is not None:
+                await conn.close()
+
+    async def _send(self, conn: psycopg.AsyncConnection, batch: list[dict[str, Any]]):
+        # one round trip for the whole batch, notifications keep their order
+        async with conn.pipeline():
+            for data in batch:
+                payload = json.dumps(data)
+                if len(payload.encode("utf-8")) <= self.max_payload:
+                    await conn.execute(
+                        "SELECT pg_notify(%s, %s)",
+                        (self.channel, payload),
+                    )
+                else:
+                    await conn.execute(
+                        """
+                        WITH spilled AS (
+                            INSERT INTO common.socketio_payloads (id, payload)
+                            VALUES (gen_random_uuid(), %(payload)s)
+                            RETURNING id
+                        )
+                        SELECT pg_notify(
+                            %(channel)s,
+                            json_build_object(
+                                'spill', spilled.id,
+                                'method', %(method)s::text,
+                                'host_id', %(host_id)s::text
+                            )::text
+                        )
+                        FROM spilled
+                        """,
+                        {
+                            "payload": payload,
+                            "channel": self.channel,
+                            "method": data.get("method"),
+                            "host_id": data.get("host_id"),
+                        },
+                    )
+        await self._purge_spilled(conn)
+
+    async def close(self):
+        if self._publisher is not None:
+            self._publisher.cancel()
+            await asyncio.gather(self._publisher, return_exceptions=True)
+            self._publisher = None
+
+    async def _purge_spilled(self, conn: psycopg.AsyncConnection):
+        now = time.monotonic()
+        if now - self._last_purge < self.spill_ttl:
+            return
+        self._last_purge = now
+        await conn.execute(
+            """
+            DELETE FROM common.socketio_payloads
+            WHERE created_at < now() - make_interval(secs => %s)
+            """,
+            (self.spill_ttl,),
+        )
+
+    async def _read_spilled(
+        self, conn: psycopg.AsyncConnection, id: str
+    ) -> Optional[str]:
+        cur = await conn.execute(
+            "SELECT payload FROM common.socketio_payloads WHERE id = %s", (id,)
+        )
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def _listen(self) -> AsyncGenerator[str, None]:
+        retry_sleep = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    self.url, autocommit=True
+                ) as conn:
+                    await conn.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(self.channel))
+                    )
+                    async with await psycopg.AsyncConnection.connect(
+                        self.url, autocommit=True
+                    ) as reader:
+                        retry_sleep = 1
+                        async for notify in conn.notifies():
+                            message = await self._resolve(reader, notify.payload)
+                            if message is not None:
+                                yield message
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self._get_logger().error(
+                    f"postgres listener failed, retrying in {retry_sleep}s: {err}"
+                )
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+    async def _resolve(
+        self, reader: psycopg.AsyncConnection, payload: str
+    ) -> Optional[str]:
+        if not payload.startswith('{"spill"'):
+            return payload
+        notice = json.loads(payload)
+        # our own messages are handled locally, only callbacks are addressed by host
+        if notice.get("method") != "callback" and notice.get("host_id") == self.host_id:
+            return None
+        return await self._read_spilled(reader, notice["spill"])
@@ -0,0 +1,3 @@
+from .cache import PromptSegmentCache, prompt_cache
+
+__all__ = ["PromptSegmentCache", "prompt_cache"]
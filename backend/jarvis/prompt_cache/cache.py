@@ -0,0 +1,156 @@
+from __future__ import annotations
+import asyncio
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, TypedDict
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+
+class PromptCacheStats(TypedDict):
+    memory_entries: int
+    memory_bytes: int
+    disk_bytes: int
+    memory_hits: int
+    disk_hits: int
+    misses: int
+
+
+class PromptSegmentCache:
+    """
+    Two level (memory LRU + local disk) cache of assembled system prompt
+    segments. Entries are content addressed by document id and version, so a
+    changed document simply maps to a new entry.
+    """
+
+    def __init__(self, directory: str, max_memory_bytes: int, max_disk_bytes: int):
+        self.directory = Path(directory)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: Optional[int] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(document_id: str, version: str) -> str:
+        return hashlib.sha256(f"{document_id}:{version}".encode("utf-8")).hexdigest()
+
+    async def get_or_load(
+        self,
+        document_id: str,
+        version: str,
+        loader: Callable[[], Awaitable[str]],
+    ) -> str:
+        key = self.key(document_id, version)
+        segment = self._memory.get(key)
+        if segment is not None:
+            self.memory_hits += 1
+            self._memory.move_to_end(key)
+            return segment
+
+        # concurrent requests for the same document share one download
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[str]]) -> str:
+        segment = await asyncio.to_thread(self._disk_get, key)
+        if segment is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            segment = await loader()
+            try:
+                await asyncio.to_thread(self._disk_put, key, segment)
+            except OSError as err:
+                logger.warning(f"failed to write prompt segment to disk: {err}")
+        self._memory_put(key, segment)
+        return segment
+
+    def _memory_put(self, key: str, segment: str):
+        size = len(segment)
+        if size > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = segment
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.md"
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            segment = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        # refresh mtime, disk eviction removes the least recently used files
+        os.utime(path)
+        return segment
+
+    def _disk_put(self, key: str, segment: str):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(segment, encoding="utf-8")
+        os.replace(tmp, path)
+        if self._disk_bytes is None:
+            self._disk_bytes = self._scan_disk()
+        else:
+            self._disk_bytes += path.stat().st_size
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _files(self) -> list[os.stat_result]:
+        return [p.stat() for p in self.directory.glob("*/*.md")]
+
+    def _scan_disk(self) -> int:
+        return sum(s.st_size for s in self._files())
+
+    def _evict_disk(self):
+        files = sorted(self.directory.glob("*/*.md"), key=lambda p: p.stat().st_mtime)
+        target = int(self.max_disk_bytes * 0.9)
+        total = self._scan_disk()
+        for path in files:
+            if total <= target:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                total -= size
+            except FileNotFoundError:
+                continue
+        self._disk_bytes = total
+
+    def stats(self) -> PromptCacheStats:
+        return PromptCacheStats(
+            memory_entries=len(self._memory),
+            memory_bytes=self._memory_bytes,
+            disk_bytes=self._disk_bytes or 0,
+            memory_hits=self.memory_hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+        )
+
+
+prompt_cache = PromptSegmentCache(
+    directory=os.getenv("PROMPT_CACHE_DIR", "/tmp/jarvis/prompt_cache"),
+    max_memory_bytes=int(os.getenv("PROMPT_CACHE_MEMORY_MB", "256")) * 1024 * 1024,
+    max_disk_bytes=int(os.getenv("PROMPT_CACHE_DISK_MB", "2048")) * 1024 * 1024,
+)
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
+from jarvis.messages.type import Message
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+COLUMNS = (
+    "chat_id",
+    "content",
+    "id",
+    "role",
+    "data",
+    "score",
+    "context",
+    "input_tokens",
+    "output_tokens",
+    "cached_input_tokens",
+    "cache_creation_tokens",
+)
+
+CREATE_MESSAGE = statements.register(
+    "create_message",
+    """
+    INSERT INTO common.message_history (
+        chat_id, content, id, role, data, score, context,
+        input_tokens, output_tokens, cached_input_tokens, cache_creation_tokens,
+        created_at
+    ) VALUES (
+        %(chat_id)s, %(content)s, %(id)s, %(role)s, %(data)s, %(score)s, %(context)s,
+        %(input_tokens)s, %(output_tokens)s, %(cached_input_tokens)s, %(cache_creation_tokens)s,
+        clock_timestamp()
+    )
+    ON CONFLICT DO NOTHING
+    """,
+)
+
+
+def message_params(data: Message) -> Dict[str, Any]:
+    usage: Dict[str, Any] = dict(data.get("usage") or {})
+    return {
+        "id": data["id"],
+        "content": Jsonb(data["content"]),
+        "chat_id": data["chatId"],
+        "role": data["role"],
+        "data": Jsonb(data.get("data")),
+        "score": data.get("score"),
+        "context": data.get("context"),
+        "input_tokens": usage.get("input_tokens"),
+        "output_tokens": usage.get("output_tokens"),
+        "cached_input_tokens": usage.get("cached_input_tokens"),
+        "cache_creation_tokens": usage.get("cache_creation_tokens"),
+    }
+
+
+def _batch_insert(size: int) -> sql.Composed:
+    # clock_timestamp() advances per row, so created_at keeps the submit order
+    rows = (
+        sql.SQL("({}, clock_timestamp())").format(
+            sql.SQL(", ").join(sql.Placeholder(f"r{i}_{c}") for c in COLUMNS)
+        )
+        for i in range(size)
+    )
+    return sql.SQL(
+        "INSERT INTO common.message_history ({}, created_at) VALUES {} ON CONFLICT DO NOTHING"
+    ).format(
+        sql.SQL(", ").join(map(sql.Identifier, COLUMNS)),
+        sql.SQL(", ").join(rows),
+    )
+
+
+_PendingWrite = Tuple[Message, asyncio.Future]
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    Messages of all chats are queued and inserted by a single flusher as
+    multi-row INSERTs (group commit). An idle flusher writes a message right
+    away, messages submitted while a batch is in flight are written together
+    in the next one, up to `max_batch` per INSERT. Batches are written in
+    submit order, so messages of a chat keep their order. `submit` returns a
+    future that resolves once the message is durable.
+    """
+
+    def __init__(self, max_batch: int = 64):
+        self.max_batch = max_batch
+        self._pending: List[_PendingWrite] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="message_writer")
+
+    def submit(self, data: Message) -> asyncio.Future:
+        self._ensure_started()
+        assert self._wakeup is not None
+        fut = asyncio.get_running_loop().create_future()
+        # errors are logged by the writer, callers may not await the future
+        fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._pending.append((data, fut))
+        self._wakeup.set()
+        return fut
+
+    async def _run(self):
+        assert self._wakeup is not None
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # no linger, messages of concurrent chats queue up while this
+            # batch is written and join the next one
+            await self._flush()
+
+    async def _flush(self):
+        batch = self._pending[: self.max_batch]
+        self._pending = self._pending[self.max_batch :]
+        if not batch:
+            return
+        try:
+            await self._write(batch)
+        except asyncio.CancelledError:
+            # close() stopped the flusher mid batch and writes it again,
+            # rows that made it are skipped by ON CONFLICT DO NOTHING
+            self._pending[:0] = [(data, fut) for data, fut in batch if not fut.done()]
+            raise
+
+    async def _write(self, batch: List[_PendingWrite]):
+        try:
+            await self._insert([data for data, _ in batch])
+        except Exception as err:
+            logger.warning(
+                f"batched insert of {len(batch)} messages failed, retrying one by one: {err}"
+            )
+            for data, fut in batch:
+                try:
+                    await self._insert([data])
+                except Exception as row_err:
+                    self.failed += 1
+                    logger.error(
+                        f"failed to persist message {data['id']}: {row_err}",
+                        exc_info=True,
+                    )
+                    if not fut.done():
+                        fut.set_exception(row_err)
+                else:
+                    self._resolve([(data, fut)])
+            return
+        self._resolve(batch)
+
+    def _resolve(self, batch: List[_PendingWrite]):
+        self.written += len(batch)
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def _insert(self, messages: List[Message]):
+        self.batches += 1
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                if len(messages) == 1:
+                    await CREATE_MESSAGE.execute(cur, message_params(messages[0]))
+                    return
+                params = {
+                    f"r{i}_{key}": value
+                    for i, data in enumerate(messages)
+                    for key, value in message_params(data).items()
+                }
+                await cur.execute(_batch_insert(len(messages)), params)
+
+    async def close(self):
+        # the flusher may be in the middle of a batch, stop it before draining
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            await self._flush()
+
+
+message_writer = MessageWriter(
+    max_batch=int(os.getenv("MESSAGE_WRITER_BATCH_SIZE", "64")),
+)
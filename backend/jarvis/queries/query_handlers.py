@@ -1,3 +1,5 @@
+import asyncio
+from functools import partial
 import json
 import os
 from typing import Any, Dict, List, Optional, Sequence, Set, Union, cast
@@ -7,8 +9,11 @@ from psycopg import AsyncConnection
 from psycopg.rows import dict_row
 from jarvis.blob_storage import resolve_storage
 from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
+from jarvis.lookup_cache import lookup_cache
+from jarvis.prompt_cache import prompt_cache
+from jarvis.queries.message_writer import message_writer
 from dotenv import load_dotenv
-from psycopg.types.json import Jsonb
 from jarvis.messages.type import Message
 from jarvis.messages.utils import convert_to_langchain_message
 from jarvis.models.models import get_default_model
@@ -18,51 +23,53 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 
-async def create_chat(chat_id: str, owner_id: str):
-    query = """
+CREATE_CHAT = statements.register(
+    "create_chat",
+    """
     INSERT INTO common.chat_history (
         id, owner_email, allow_list 
     ) VALUES (
         (%s), (%s), (%s)
     )
     ON CONFLICT DO NOTHING
-    """
+    """,
+)
+
 
+async def create_chat(chat_id: str, owner_id: str):
     pool = await get_connection_pool()
 
     async with pool.connection() as conn:
         async with conn.transaction():
             async with conn.cursor() as cur:
                 # TODO: allow list
-                await cur.execute(query, (chat_id, owner_id, []))
+                await CREATE_CHAT.execute(cur, (chat_id, owner_id, []))
 
 
-async def create_message(data: Message):
+async def create_message(data: Message, durable: bool = True) -> asyncio.Future:
+    """
+    Queues the message on the write-behind writer. With `durable` the call
+    returns once the message is committed, otherwise the returned future can
+    be awaited later.
+    """
+    fut = message_writer.submit(data)
+    if durable:
+        await asyncio.shield(fut)
+    return fut
+
+
+async def update_message_score(id: str, score: float):
     query = """
-    INSERT INTO common.message_history (
-        chat_id, content, id, role, data, score, context
-    ) VALUES (
-        %(chat_id)s, %(content)s, %(id)s, %(role)s, %(data)s, %(score)s, %(context)s 
-    )
-    ON CONFLICT DO NOTHING 
+    UPDATE common.message_history
+    SET score = %(score)s
+    WHERE id = %(id)s
     """
 
-    pool = await get_connection_pool()
+    pool = await get_connection_pool("background")
     async with pool.connection() as conn:
         async with conn.transaction():
-            async with conn.cursor(row_factory=dict_row) as cur:
-                await cur.execute(
-                    query,
-                    {
-                        "id": data["id"],
-                        "content": Jsonb(data["content"]),
-                        "chat_id": data["chatId"],
-                        "role": data["role"],
-                        "data": Jsonb(data.get("data")),
-                        "score": data.get("score"),
-                        "context": data.get("context"),
-                    },
-                )
+            async with conn.cursor() as cur:
+                await cur.execute(query, {"id": id, "score": score})
 
 
 async def read_docs_helper(docs: Optional[Sequence[str]]) -> str:
@@ -73,36 +80,62 @@ async def read_docs_helper(docs: Optional[Sequence[str]]) -> str:
 
 
 async def read_docs(ids: Sequence[str]) -> str:
-    query = """
+    return "\n\n".join(await read_doc_segments(ids))
+
+
+READ_DOC_SEGMENTS = statements.register(
+    "read_doc_segments",
+    """
     SELECT 
         document_id, 
         document_name,
-        owner
+        owner,
+        updated_at,
+        num_tokens
     FROM common.document_repo
     WHERE document_id = ANY(%s)
-    """
+    ORDER BY created_at, document_id
+    """,
+)
+
 
+async def read_doc_segments(ids: Sequence[str]) -> List[str]:
+    # deterministic order keeps the system prompt a stable prefix for prompt caching
     pool = await get_connection_pool()
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=dict_row) as cur:
-            resp = await cur.execute(query, (list(ids),))
+            resp = await READ_DOC_SEGMENTS.execute(cur, (list(ids),))
             res = await resp.fetchall()
 
+    return await load_doc_segments(res)
+
+
+async def load_doc_segments(docs: Sequence[Dict[str, Any]]) -> List[str]:
+    """Loads the prompt segments of `READ_DOC_SEGMENTS` rows, in row order."""
     storage = resolve_storage()
-    out = []
 
-    for doc in res:
-        raw_content = storage.read(
-            f"parsed/{doc['owner']}/{doc['document_id']}/{doc['document_name']}.md"
+    async def load(doc: Dict[str, Any]) -> str:
+        raw_content = await asyncio.to_thread(
+            storage.read,
+            f"parsed/{doc['owner']}/{doc['document_id']}/{doc['document_name']}.md",
         )
         try:
             content = raw_content.decode("utf-8")
         except UnicodeDecodeError:
             content = raw_content.decode("windows-1252")  # Handle non-UTF-8 files
 
-        out.append(f"# Document Name: {doc['document_name']}\n\n{content}")
+        return f"# Document Name: {doc['document_name']}\n\n{content}"
 
-    return "\n\n".join(out)
+    return await asyncio.gather(
+        *[
+            prompt_cache.get_or_load(
+                str(doc["document_id"]),
+                doc["updated_at"].isoformat(),
+                partial(load, doc),
+            )
+            for doc in docs
+        ]
+    )
 
 
 async def update_document_pack_status(id: str, status: str):
@@ -112,7 +145,7 @@ async def update_document_pack_status(id: str, status: str):
     WHERE id = %(id)s
     """
 
-    pool = await get_connection_pool()
+    pool = await get_connection_pool("background")
 
     async with pool.connection() as conn:
         async with conn.transaction():
@@ -139,49 +172,76 @@ async def update_chat(id, personality, documents):
                         "id": id,
                     },
                 )
+    await lookup_cache.invalidate("chat_docs", str(id))
 
 
-async def get_model_selection(user) -> str:
-    query = """
+GET_MODEL_SELECTION = statements.register(
+    "get_model_selection",
+    """
     SELECT 
         model_name 
     FROM common.model_selection
     WHERE user_id = (%s)
-    """
+    """,
+)
+
+
+async def get_model_selection(user) -> str:
+    return await lookup_cache.get_or_load(
+        "model_selection", user, partial(_get_model_selection, user)
+    )
+
+
+async def _get_model_selection(user) -> str:
     pool = await get_connection_pool()
 
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=dict_row) as cur:
-            resp = await cur.execute(query, (user,))
+            resp = await GET_MODEL_SELECTION.execute(cur, (user,))
             res = await resp.fetchall()
 
-        if not res:
-            logger.info(
-                f"{user} has no model preference in the database, returning default model..."
-            )
-            return get_default_model()
+    return resolve_model_selection(user, res)
 
-        model_selection = res[0].get("model_name", get_default_model())
-        if not model_selection:
-            logger.warning(
-                f"model_selection for {user} is None and this should not happen! Returning default model"
-            )
-            return get_default_model()
-        return model_selection
 
+def resolve_model_selection(user, res: List[Dict[str, Any]]) -> str:
+    if not res:
+        logger.info(
+            f"{user} has no model preference in the database, returning default model..."
+        )
+        return get_default_model()
 
-async def get_chat_model(id) -> Optional[str]:
-    query = """
+    model_selection = res[0].get("model_name", get_default_model())
+    if not model_selection:
+        logger.warning(
+            f"model_selection for {user} is None and this should not happen! Returning default model"
+        )
+        return get_default_model()
+    return model_selection
+
+
+GET_CHAT_MODEL = statements.register(
+    "get_chat_model",
+    """
     SELECT
         model_name 
     FROM common.chat_history
     WHERE id = (%s)
-    """
+    """,
+)
+
+
+async def get_chat_model(id) -> Optional[str]:
+    return await lookup_cache.get_or_load(
+        "chat_model", str(id), partial(_get_chat_model, id)
+    )
+
+
+async def _get_chat_model(id) -> Optional[str]:
     pool = await get_connection_pool()
 
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=dict_row) as cur:
-            resp = await cur.execute(query, (id,))
+            resp = await GET_CHAT_MODEL.execute(cur, (id,))
             res = await resp.fetchall()
 
     return res[0]["model_name"] if res else None
@@ -204,6 +264,7 @@ async def set_chat_model(id, model_name):
                         id,
                     ),
                 )
+    await lookup_cache.invalidate("chat_model", str(id))
 
 
 async def insert_doc(document_id, document_name, owner, num_pages, num_tokens):
@@ -240,7 +301,7 @@ async def insert_doc_into_pack(document_name: str, pack_id: str, document_id: st
     )
     ON CONFLICT DO NOTHING
     """
-    pool = await get_connection_pool()
+    pool = await get_connection_pool("background")
     async with pool.connection() as conn:
         async with conn.transaction():
             async with conn.cursor(row_factory=dict_row) as cur:
@@ -254,9 +315,40 @@ async def insert_doc_into_pack(document_name: str, pack_id: str, document_id: st
                 )
 
 
+GET_CHAT_DOCS = statements.register(
+    "get_chat_docs",
+    """
+    SELECT 
+        documents
+    FROM common.chat_history
+    WHERE id = (%s)
+    """,
+)
+
+
 async def get_chat_docs(id: str) -> Set[str]:
+    # callers may modify the set, the cached list is never handed out
+    return set(
+        await lookup_cache.get_or_load(
+            "chat_docs", str(id), partial(_get_chat_docs, id)
+        )
+    )
+
+
+async def _get_chat_docs(id: str) -> List[str]:
+    pool = await get_connection_pool()
+
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            resp = await GET_CHAT_DOCS.execute(cur, (id,))
+            res = await resp.fetchall()
+    return list(res[0]["documents"])
+
+
+async def get_chat_prompt_doc_ids(id: str) -> List[str]:
     query = """
     SELECT 
+        personality,
         documents
     FROM common.chat_history
     WHERE id = (%s)
@@ -266,8 +358,11 @@ async def get_chat_docs(id: str) -> Set[str]:
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=dict_row) as cur:
             resp = await cur.execute(query, (id,))
-            res = await resp.fetchall()
-    return set(res[0]["documents"])
+            res = await resp.fetchone()
+    if not res:
+        return []
+    personality = json.loads(res["personality"]) if res["personality"] else {}
+    return list(personality.get("doc_ids") or []) + list(res["documents"] or [])
 
 
 async def update_chat_title(id: str, title: str):
@@ -313,22 +408,36 @@ async def get_message_history(chat_id: str) -> list[Union[AIMessage, HumanMessag
     )
 
 
-async def get_doc_tokens(doc_ids: List[str]):
-    query = """
+GET_DOC_TOKENS = statements.register(
+    "get_doc_tokens",
+    """
         SELECT 
-            SUM(num_tokens) AS total
+            document_id,
+            num_tokens
         FROM common.document_repo
         WHERE document_id = ANY(%s)
-    """
+    """,
+)
+
+
+async def get_doc_tokens(doc_ids: List[str]):
+    # cached per document so that chats sharing documents share entries
+    tokens = await lookup_cache.get_or_load_many(
+        "doc_tokens", [str(id) for id in doc_ids], _get_doc_tokens
+    )
+    counts = [t for t in tokens.values() if t is not None]
+    return sum(counts) if counts else None
+
 
+async def _get_doc_tokens(doc_ids: List[str]) -> Dict[str, Optional[int]]:
     pool = await get_connection_pool()
 
     async with pool.connection() as conn:
         async with conn.cursor(row_factory=dict_row) as cur:
-            resp = await cur.execute(query, (doc_ids,))
+            resp = await GET_DOC_TOKENS.execute(cur, (doc_ids,))
             res = await resp.fetchall()
 
-    return res[0]["total"]
+    return {str(r["document_id"]): r["num_tokens"] for r in res}
 
 
 async def register_transaction(
@@ -0,0 +1,124 @@
+from __future__ import annotations
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, TypedDict
+from psycopg import AsyncCursor
+from psycopg.rows import DictRow, dict_row
+from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
+from jarvis.lookup_cache import lookup_cache
+from jarvis.queries.query_handlers import (
+    CREATE_CHAT,
+    GET_MODEL_SELECTION,
+    READ_DOC_SEGMENTS,
+    load_doc_segments,
+    resolve_model_selection,
+)
+
+logger = logging.getLogger(__name__)
+
+GET_CHAT_STATE = statements.register(
+    "get_chat_state",
+    """
+    SELECT
+        model_name,
+        documents
+    FROM common.chat_history
+    WHERE id = (%s)
+    """,
+)
+
+
+class TurnBootstrap(TypedDict):
+    chat_model: Optional[str]
+    chat_docs: Set[str]
+    model_selection: str
+    # READ_DOC_SEGMENTS rows of the requested documents
+    docs: List[Dict[str, Any]]
+
+
+async def bootstrap_turn(
+    chat_id: str,
+    user_id: str,
+    create_chat: bool = False,
+    doc_ids: Sequence[str] = (),
+) -> TurnBootstrap:
+    """
+    Loads everything a chat turn needs before streaming in a single round
+    trip: the statements are pipelined on one connection and only lookups
+    that miss the lookup cache are sent. With `create_chat` the chat row is
+    inserted first. The pools are autocommit, but the statements up to a
+    pipeline sync run as one implicit transaction, a failed read rolls the
+    insert back.
+    """
+    epoch = lookup_cache.epoch
+    model_hit, chat_model = lookup_cache.lookup("chat_model", chat_id)
+    docs_hit, chat_docs = lookup_cache.lookup("chat_docs", chat_id)
+    selection_hit, model_selection = lookup_cache.lookup("model_selection", user_id)
+    load_chat = create_chat or not (model_hit and docs_hit)
+    results: Dict[str, List[Dict[str, Any]]] = {}
+
+    if load_chat or not selection_hit or doc_ids:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            async with conn.pipeline() as pipeline:
+                cursors: Dict[str, AsyncCursor[DictRow]] = {}
+
+                async def queue(name: str, statement, params):
+                    cur = conn.cursor(row_factory=dict_row)
+                    await statement.execute(cur, params)
+                    cursors[name] = cur
+
+                if create_chat:
+                    await CREATE_CHAT.execute(conn.cursor(), (chat_id, user_id, []))
+                if load_chat:
+                    await queue("chat", GET_CHAT_STATE, (chat_id,))
+                if not selection_hit:
+                    await queue("selection", GET_MODEL_SELECTION, (user_id,))
+                if doc_ids:
+                    await queue("docs", READ_DOC_SEGMENTS, (list(doc_ids),))
+
+                # single round trip, results are buffered on the cursors
+                await pipeline.sync()
+                for name, cur in cursors.items():
+                    results[name] = await cur.fetchall()
+
+        if load_chat:
+            chat = results["chat"][0] if results["chat"] else None
+            chat_model = chat["model_name"] if chat else None
+            chat_docs = list(chat["documents"] or []) if chat else []
+            if chat:
+                lookup_cache.store("chat_model", chat_id, chat_model, epoch)
+                lookup_cache.store("chat_docs", chat_id, chat_docs, epoch)
+        if not selection_hit:
+            model_selection = resolve_model_selection(user_id, results["selection"])
+            lookup_cache.store("model_selection", user_id, model_selection, epoch)
+        for doc in results.get("docs", []):
+            lookup_cache.store(
+                "doc_tokens", str(doc["document_id"]), doc["num_tokens"], epoch
+            )
+
+    return TurnBootstrap(
+        chat_model=chat_model,
+        chat_docs=set(chat_docs or []),
+        model_selection=model_selection,
+        docs=results.get("docs", []),
+    )
+
+
+def turn_doc_tokens(turn: TurnBootstrap, ids: Sequence[str]) -> Optional[int]:
+    wanted = set(map(str, ids))
+    counts = [
+        doc["num_tokens"]
+        for doc in turn["docs"]
+        if str(doc["document_id"]) in wanted and doc["num_tokens"] is not None
+    ]
+    return sum(counts) if counts else None
+
+
+async def read_turn_docs(turn: TurnBootstrap, ids: Optional[Sequence[str]]) -> str:
+    """Same as `read_docs_helper`, but from the rows loaded by `bootstrap_turn`."""
+    if not ids:
+        return ""
+    wanted = set(map(str, ids))
+    docs = [doc for doc in turn["docs"] if str(doc["document_id"]) in wanted]
+    return "\n\n".join(await load_doc_segments(docs))
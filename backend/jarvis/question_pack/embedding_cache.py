@@ -0,0 +1,141 @@
+from __future__ import annotations
+import asyncio
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+from typing import Awaitable, Callable, Dict, TypedDict
+import unicodedata
+import numpy as np
+from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+GET_EMBEDDING = statements.register(
+    "get_cached_embedding",
+    """
+    SELECT embedding
+    FROM common.embedding_cache
+    WHERE model = %s AND text_hash = %s
+    """,
+)
+
+PUT_EMBEDDING = statements.register(
+    "put_cached_embedding",
+    """
+    INSERT INTO common.embedding_cache (model, text_hash, embedding)
+    VALUES (%s, %s, %s)
+    ON CONFLICT DO NOTHING
+    """,
+)
+
+
+class EmbeddingCacheStats(TypedDict):
+    memory_entries: int
+    memory_hits: int
+    db_hits: int
+    misses: int
+
+
+def normalize(text: str) -> str:
+    # whitespace and unicode form differences do not change the query
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class EmbeddingCache:
+    """
+    Query embeddings keyed by model and normalized text hash. An in-memory
+    LRU sits in front of `common.embedding_cache`, which is shared by all
+    replicas and survives restarts. Embeddings are read-only float32 arrays,
+    shared between callers.
+    """
+
+    def __init__(self, max_memory_entries: int = 2048):
+        self.max_memory_entries = max_memory_entries
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+    async def get_or_embed(
+        self, model: str, text: str, embed: Callable[[str], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        key = self.key(text)
+        memory_key = f"{model}:{key}"
+        cached = self._memory.get(memory_key)
+        if cached is not None:
+            self.memory_hits += 1
+            self._memory.move_to_end(memory_key)
+            return cached
+
+        # concurrent requests for the same query share one embedding call
+        task = self._inflight.get(memory_key)
+        if task is None:
+            task = asyncio.create_task(self._load(model, key, text, embed))
+            self._inflight[memory_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(memory_key, None))
+        vector = await asyncio.shield(task)
+        self._memory_put(memory_key, vector)
+        return vector
+
+    async def _load(
+        self,
+        model: str,
+        key: str,
+        text: str,
+        embed: Callable[[str], Awaitable[np.ndarray]],
+    ) -> np.ndarray:
+        try:
+            pool = await get_connection_pool("agent")
+            async with pool.connection() as conn:
+                async with conn.cursor(binary=True) as cur:
+                    resp = await GET_EMBEDDING.execute(cur, (model, key))
+                    row = await resp.fetchone()
+            if row is not None:
+                self.db_hits += 1
+                return self._freeze(row[0])
+        except Exception as err:
+            logger.warning(f"failed to read cached embedding: {err}")
+
+        self.misses += 1
+        vector = self._freeze(await embed(normalize(text)))
+        try:
+            pool = await get_connection_pool("agent")
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    await PUT_EMBEDDING.execute(cur, (model, key, vector))
+        except Exception as err:
+            logger.warning(f"failed to persist embedding: {err}")
+        return vector
+
+    @staticmethod
+    def _freeze(vector: np.ndarray) -> np.ndarray:
+        vector.flags.writeable = False
+        return vector
+
+    def _memory_put(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> EmbeddingCacheStats:
+        return EmbeddingCacheStats(
+            memory_entries=len(self._memory),
+            memory_hits=self.memory_hits,
+            db_hits=self.db_hits,
+            misses=self.misses,
+        )
+
+
+embedding_cache = EmbeddingCache(
+    max_memory_entries=int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "2048")),
+)
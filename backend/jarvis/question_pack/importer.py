@@ -0,0 +1,370 @@
+from __future__ import annotations
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set, TypedDict
+from uuid import NAMESPACE_URL, UUID, uuid4, uuid5
+from psycopg.rows import dict_row
+from jarvis.blob_storage import resolve_storage
+from jarvis.db.db import get_connection_pool
+from jarvis.db.vector import as_vector
+from jarvis.lookup_cache import lookup_cache
+from jarvis.question_pack.embedding_cache import normalize
+from jarvis.question_pack.retriever import embedding
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+# questions per embedding request and per COPY transaction
+IMPORT_BATCH_SIZE = int(os.getenv("QUESTION_IMPORT_BATCH_SIZE", "256"))
+# batches embedded and written at the same time by one import
+IMPORT_CONCURRENCY = int(os.getenv("QUESTION_IMPORT_CONCURRENCY", "4"))
+# a running import that made no progress for this long is considered dead and may be resumed
+IMPORT_STALE_SECONDS = int(os.getenv("QUESTION_IMPORT_STALE_SECONDS", "300"))
+
+SUPPORTED_FORMATS = (".csv", ".jsonl", ".ndjson")
+CSV_COLUMNS = ("question", "answer", "tags", "metadata")
+QUESTION_PAIR_TYPES = ("uuid", "uuid", "text", "text", "text", "text", "vector")
+
+# keeps a reference to running imports, tasks are otherwise only weakly held by the loop
+_running: Set[asyncio.Task] = set()
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+class QuestionRow(TypedDict):
+    question: str
+    answer: str
+    metadata: Optional[str]
+    tags: List[str]
+    additional_info: Dict[str, str]
+
+
+class QuestionImport(TypedDict):
+    id: UUID
+    pack_id: UUID
+    status: str
+    total_rows: int
+    imported_rows: int
+    error: Optional[str]
+
+
+def _question_import(row: Dict[str, Any]) -> QuestionImport:
+    return QuestionImport(
+        id=row["id"],
+        pack_id=row["pack_id"],
+        status=row["status"],
+        total_rows=row["total_rows"],
+        imported_rows=row["imported_rows"],
+        error=row["error"],
+    )
+
+
+def _split_tags(tags: Any) -> List[str]:
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return list(dict.fromkeys(t.strip() for t in tags or [] if t and t.strip()))
+
+
+def _question_row(line: int, data: Dict[str, Any]) -> QuestionRow:
+    question = data.get("question")
+    answer = data.get("answer")
+    if not isinstance(question, str) or not question.strip():
+        raise ImportFormatError(f"row {line}: 'question' is missing")
+    if not isinstance(answer, str) or not answer.strip():
+        raise ImportFormatError(f"row {line}: 'answer' is missing")
+    additional_info = data.get("additional_info") or {}
+    if not isinstance(additional_info, dict):
+        raise ImportFormatError(f"row {line}: 'additional_info' should be an object")
+    return QuestionRow(
+        question=question,
+        answer=answer,
+        metadata=data.get("metadata") or None,
+        tags=_split_tags(data.get("tags")),
+        additional_info={str(k): str(v) for k, v in additional_info.items()},
+    )
+
+
+def parse_questions(filename: str, content: bytes) -> List[QuestionRow]:
+    """
+    CSV needs `question` and `answer` columns, `tags` is comma separated and
+    any other non-empty column is stored as additional info. JSONL lines are
+    objects with `question`, `answer`, optional `tags` (list or comma
+    separated), `metadata` and an `additional_info` object.
+    """
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFormatError("file is not utf-8 encoded")
+
+    rows: List[QuestionRow] = []
+    if filename.lower().endswith(".csv"):
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or not {"question", "answer"} <= set(
+            reader.fieldnames
+        ):
+            raise ImportFormatError("csv header needs 'question' and 'answer' columns")
+        for data in reader:
+            rows.append(
+                _question_row(
+                    reader.line_num,
+                    {
+                        **{k: data.get(k) for k in CSV_COLUMNS},
+                        "additional_info": {
+                            k: v
+                            for k, v in data.items()
+                            if k and k not in CSV_COLUMNS and v
+                        },
+                    },
+                )
+            )
+    elif filename.lower().endswith(SUPPORTED_FORMATS):
+        for line, raw in enumerate(text.splitlines(), start=1):
+            if not raw.strip():
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError as err:
+                raise ImportFormatError(f"row {line}: invalid json, {err}")
+            if not isinstance(data, dict):
+                raise ImportFormatError(f"row {line}: expected an object")
+            rows.append(_question_row(line, data))
+    else:
+        raise ImportFormatError(
+            f"unsupported file type, expected one of {', '.join(SUPPORTED_FORMATS)}"
+        )
+
+    if not rows:
+        raise ImportFormatError("file contains no questions")
+    return rows
+
+
+def _source_path(pack_id: str, import_id: str, filename: str) -> str:
+    return f"question_packs/{pack_id}/imports/{import_id}/{filename}"
+
+
+def _question_id(import_id: str, index: int) -> UUID:
+    # stable per source row, a resumed import skips the rows it already wrote
+    return uuid5(NAMESPACE_URL, f"question-import:{import_id}:{index}")
+
+
+async def get_import(pack_id: str, import_id: str) -> Optional[QuestionImport]:
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            resp = await cur.execute(
+                """
+                SELECT id, pack_id, status, total_rows, imported_rows, error
+                FROM common.question_imports
+                WHERE id = %s AND pack_id = %s
+                """,
+                (import_id, pack_id),
+            )
+            row = await resp.fetchone()
+    return _question_import(row) if row else None
+
+
+async def start_import(
+    pack_id: str, user_id: str, filename: str, content: bytes
+) -> QuestionImport:
+    """
+    Validates the file, keeps it in blob storage so that the import can be
+    resumed, and imports it in the background. Progress is tracked in
+    `common.question_imports`.
+    """
+    rows = parse_questions(filename, content)
+    import_id = str(uuid4())
+    source = _source_path(pack_id, import_id, os.path.basename(filename))
+    await asyncio.to_thread(resolve_storage().write, io.BytesIO(content), source)
+
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            resp = await cur.execute(
+                """
+                INSERT INTO common.question_imports (id, pack_id, owner, source, status, total_rows)
+                VALUES (%s, %s, %s, %s, 'running', %s)
+                RETURNING id, pack_id, status, total_rows, imported_rows, error
+                """,
+                (import_id, pack_id, user_id, source, len(rows)),
+            )
+            job = await resp.fetchone()
+    assert job is not None
+
+    _spawn(import_id, pack_id, user_id, rows)
+    return _question_import(job)
+
+
+async def resume_import(pack_id: str, import_id: str) -> Optional[QuestionImport]:
+    """
+    Restarts a failed import, or a running one that stopped making progress
+    (e.g. the replica running it went away). Returns None if the import
+    cannot be resumed.
+    """
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            # claims the import, concurrent resumes of the same import do not both run
+            resp = await cur.execute(
+                """
+                UPDATE common.question_imports
+                SET status = 'running', error = NULL, updated_at = now()
+                WHERE id = %s AND pack_id = %s AND (
+                    status = 'failed'
+                    OR (status = 'running' AND updated_at < now() - make_interval(secs => %s))
+                )
+                RETURNING id, pack_id, owner, source, status, total_rows, imported_rows, error
+                """,
+                (import_id, pack_id, IMPORT_STALE_SECONDS),
+            )
+            job = await resp.fetchone()
+    if job is None:
+        return None
+
+    try:
+        content = await asyncio.to_thread(resolve_storage().read, job["source"])
+        rows = parse_questions(job["source"], content)
+    except Exception as err:
+        await _finish(import_id, "failed", f"failed to read import source: {err}")
+        raise
+
+    _spawn(import_id, pack_id, job["owner"], rows)
+    return _question_import(job)
+
+
+def _spawn(import_id: str, pack_id: str, user_id: str, rows: List[QuestionRow]):
+    task = asyncio.create_task(
+        _run_import(import_id, pack_id, user_id, rows),
+        name=f"question_import_{import_id}",
+    )
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def _run_import(
+    import_id: str, pack_id: str, user_id: str, rows: List[QuestionRow]
+):
+    logger.info(f"importing {len(rows)} questions into pack {pack_id} ({import_id})")
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    indexed = list(enumerate(rows))
+    tasks = [
+        asyncio.create_task(
+            _import_batch(
+                semaphore,
+                import_id,
+                pack_id,
+                user_id,
+                indexed[i : i + IMPORT_BATCH_SIZE],
+            )
+        )
+        for i in range(0, len(indexed), IMPORT_BATCH_SIZE)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception as err:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.error(f"question import {import_id} failed: {err}", exc_info=True)
+        await _finish(import_id, "failed", str(err))
+        return
+    await _finish(import_id, "completed")
+    logger.info(f"question import {import_id} completed")
+
+
+async def _import_batch(
+    semaphore: asyncio.Semaphore,
+    import_id: str,
+    pack_id: str,
+    user_id: str,
+    batch: List[tuple[int, QuestionRow]],
+):
+    async with semaphore:
+        pool = await get_connection_pool("background")
+        ids = [_question_id(import_id, index) for index, _ in batch]
+        async with pool.connection() as conn:
+            cur = await conn.execute(
+                "SELECT id FROM common.question_pairs WHERE id = ANY(%s)", (ids,)
+            )
+            written = {r[0] for r in await cur.fetchall()}
+        pending = [(id, row) for id, (_, row) in zip(ids, batch) if id not in written]
+        if not pending:
+            return
+
+        # the connection is not held while waiting for the embeddings
+        vectors = await embedding.aembed_documents(
+            [normalize(row["question"]) for _, row in pending]
+        )
+
+        async with pool.connection() as conn:
+            async with conn.transaction():
+                cur = conn.cursor()
+                async with cur.copy(
+                    """
+                    COPY common.question_pairs
+                        (id, pack_id, question, answer, updated_by, metadata, question_embedding)
+                    FROM STDIN (FORMAT BINARY)
+                    """
+                ) as copy:
+                    # embeddings are sent in the pgvector binary format
+                    copy.set_types(QUESTION_PAIR_TYPES)
+                    for (id, row), vector in zip(pending, vectors):
+                        await copy.write_row(
+                            (
+                                id,
+                                UUID(pack_id),
+                                row["question"],
+                                row["answer"],
+                                user_id,
+                                row["metadata"],
+                                as_vector(vector),
+                            )
+                        )
+                async with cur.copy(
+                    "COPY common.question_tags (id, question_id, tag, pack_id) FROM STDIN"
+                ) as copy:
+                    for id, row in pending:
+                        for tag in row["tags"]:
+                            await copy.write_row((uuid4(), id, tag, pack_id))
+                async with cur.copy(
+                    """
+                    COPY common.question_additional_info (id, question_id, key, value, pack_id)
+                    FROM STDIN
+                    """
+                ) as copy:
+                    for id, row in pending:
+                        for key, value in row["additional_info"].items():
+                            await copy.write_row((uuid4(), id, key, value, pack_id))
+                # progress is committed with the rows it counts
+                await cur.execute(
+                    """
+                    UPDATE common.question_imports
+                    SET imported_rows = imported_rows + %s, updated_at = now()
+                    WHERE id = %s
+                    """,
+                    (len(pending), import_id),
+                )
+        await lookup_cache.invalidate("question_pack_size", pack_id)
+        await lookup_cache.invalidate("question_count", pack_id)
+
+
+async def _finish(import_id: str, status: str, error: Optional[str] = None):
+    try:
+        pool = await get_connection_pool("background")
+        async with pool.connection() as conn:
+            await conn.execute(
+                """
+                UPDATE common.question_imports
+                SET status = %s, error = %s, updated_at = now()
+                WHERE id = %s
+                """,
+                (status, error, import_id),
+            )
+    except Exception as err:
+        logger.error(f"failed to update question import {import_id}: {err}")
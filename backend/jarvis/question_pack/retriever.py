@@ -1,64 +1,345 @@
-from typing import Any, Dict, List
+from __future__ import annotations
+from dataclasses import asdict, dataclass, fields, replace
+import logging
+import os
+from typing import Any, Dict, List, Literal, Optional, TypedDict
+from uuid import UUID
+import numpy as np
 from jarvis.db.db import get_connection_pool
+from jarvis.db.statements import statements
+from jarvis.db.vector import as_vector
+from jarvis.lookup_cache import lookup_cache
+from jarvis.question_pack.embedding_cache import embedding_cache
 from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
 from langchain_openai import OpenAIEmbeddings
+from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+load_dotenv()
 
-embedding = OpenAIEmbeddings(model="text-embedding-3-small")
-
-
-async def retrieve(
-    pack_id: str, query_embedding: str, query: str
-) -> List[Dict[str, Any]]:
-    pool = await get_connection_pool()
-    async with pool.connection() as conn:
-        async with conn.cursor(row_factory=dict_row) as cur:
-            resp = await cur.execute(
-                """
-                WITH tags AS (
-                    SELECT
-                        question_id, 
-                        STRING_AGG(tag, ',') AS tags
-                    FROM common.question_tags
-                    WHERE pack_id = %(pack_id)s
-                    GROUP BY question_id 
-                ),
-                additional_info_array AS (
-                    SELECT
-                        question_id,
-                        JSON_AGG(JSON_BUILD_OBJECT(key, value)) AS additional_info
-                    FROM common.question_additional_info
-                    WHERE pack_id = %(pack_id)s
-                    GROUP BY question_id
+EMBEDDING_MODEL = "text-embedding-3-small"
+embedding = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+
+
+VECTOR_CANDIDATES = statements.register(
+    "retrieve_vector_candidates",
+    """
+    SELECT
+        id,
+        1 - (question_embedding <=> %(query_embedding)s) AS vector_similarity,
+        ts_rank_cd(question_tsv, plainto_tsquery('english', %(query)s)) AS text_rank
+    FROM common.question_pairs
+    WHERE pack_id = %(pack_id)s AND deleted = %(deleted)s AND question_embedding IS NOT NULL
+    ORDER BY question_embedding <=> %(query_embedding)s
+    LIMIT %(k)s
+    """,
+)
+
+# same candidates without the index, the order expression does not match the hnsw operator
+EXACT_VECTOR_CANDIDATES = statements.register(
+    "retrieve_exact_vector_candidates",
+    """
+    SELECT
+        id,
+        1 - (question_embedding <=> %(query_embedding)s) AS vector_similarity,
+        ts_rank_cd(question_tsv, plainto_tsquery('english', %(query)s)) AS text_rank
+    FROM common.question_pairs
+    WHERE pack_id = %(pack_id)s AND deleted = %(deleted)s AND question_embedding IS NOT NULL
+    ORDER BY vector_similarity DESC
+    LIMIT %(k)s
+    """,
+)
+
+TEXT_CANDIDATES = statements.register(
+    "retrieve_text_candidates",
+    """
+    SELECT
+        id,
+        COALESCE(1 - (question_embedding <=> %(query_embedding)s), 0) AS vector_similarity,
+        ts_rank_cd(question_tsv, q) AS text_rank
+    FROM common.question_pairs, plainto_tsquery('english', %(query)s) q
+    WHERE pack_id = %(pack_id)s AND deleted = %(deleted)s AND question_tsv @@ q
+    ORDER BY text_rank DESC
+    LIMIT %(k)s
+    """,
+)
+
+QUESTION_DETAILS = statements.register(
+    "retrieve_question_details",
+    """
+    SELECT
+        x.id,
+        x.question,
+        x.answer,
+        (
+            SELECT STRING_AGG(tag, ',')
+            FROM common.question_tags
+            WHERE question_id = x.id
+        ) AS tags,
+        (
+            SELECT JSON_AGG(JSON_BUILD_OBJECT(key, value))
+            FROM common.question_additional_info
+            WHERE question_id = x.id
+        ) AS additional_info
+    FROM common.question_pairs x
+    WHERE x.id = ANY(%(ids)s)
+    """,
+)
+
+PACK_SIZE = statements.register(
+    "question_pack_size",
+    """
+    SELECT deleted, COUNT(*)
+    FROM common.question_pairs
+    WHERE pack_id = %s
+    GROUP BY deleted
+    """,
+)
+
+GET_RETRIEVAL_CONFIG = statements.register(
+    "get_question_pack_retrieval_config",
+    """
+    SELECT retrieval_config
+    FROM common.question_packs
+    WHERE id = %s
+    """,
+)
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    """
+    Per question pack ranking of the vector and full text candidates.
+
+    `weighted` scores `vector_weight * cosine similarity + text_weight *
+    ts_rank_cd`, `rrf` (reciprocal rank fusion) scores `vector_weight /
+    (rrf_k + vector rank) + text_weight / (rrf_k + text rank)` and does not
+    depend on the scale of either measure. Questions scoring below
+    `min_score` are dropped, so the cutoff depends on the strategy.
+    """
+
+    strategy: Literal["weighted", "rrf"] = "weighted"
+    vector_weight: float = 0.7
+    text_weight: float = 0.3
+    rrf_k: int = 60
+    top_k: int = 5
+    min_score: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> RetrievalConfig:
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (data or {}).items() if k in known})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class ScoredQuestion(TypedDict):
+    id: UUID
+    score: float
+
+
+def fuse(
+    config: RetrievalConfig,
+    vector_candidates: List[Dict[str, Any]],
+    text_candidates: List[Dict[str, Any]],
+) -> List[ScoredQuestion]:
+    """Merges the candidates of both stages, which are ordered best first."""
+    if config.strategy == "rrf":
+        scores: Dict[UUID, float] = {}
+        for weight, candidates in (
+            (config.vector_weight, vector_candidates),
+            (config.text_weight, text_candidates),
+        ):
+            for rank, r in enumerate(candidates, start=1):
+                scores[r["id"]] = scores.get(r["id"], 0.0) + weight / (
+                    config.rrf_k + rank
                 )
-                SELECT 
-                    x.id,
-                    x.question,
-                    x.answer,
-                    0.7 * (1 - (x.question_embedding <=> %(query_embedding)s::vector)) + 0.3 * ts_rank_cd(x.question_tsv, plainto_tsquery('english', %(query)s)) AS similarity,
-                    y.tags,
-                    z.additional_info
-                FROM common.question_pairs x
-                LEFT JOIN tags y
-                ON x.id = y.question_id
-                LEFT JOIN additional_info_array z
-                ON x.id = z.question_id
-                WHERE pack_id = %(pack_id)s AND deleted = false
-                ORDER BY similarity DESC 
-                LIMIT 5
-                """,
-                {
-                    "pack_id": pack_id,
-                    "query_embedding": query_embedding,
-                    "query": query,
-                },
+    else:
+        # both stages select both measures, a candidate is scored the same by either
+        scores = {
+            r["id"]: config.vector_weight * r["vector_similarity"]
+            + config.text_weight * r["text_rank"]
+            for r in (*vector_candidates, *text_candidates)
+        }
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [
+        ScoredQuestion(id=id, score=score)
+        for id, score in ranked
+        if score >= config.min_score
+    ][: config.top_k]
+
+
+class RetrievalEngine:
+    """
+    Hybrid vector and full text search over a question pack, shared by the
+    question pack tool and the question listing.
+
+    Candidates are fetched by vector distance and by full text rank and fused
+    with the pack's `RetrievalConfig`. In `two_stage` mode the vector stage
+    uses the hnsw index, in `exact` mode it scans the pack, `auto` scans packs
+    of up to `exact_max_questions` questions.
+    """
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        exact_max_questions: int = 5000,
+        candidates: int = 100,
+        ef_search: int = 200,
+        iterative_scan: Optional[str] = None,
+    ):
+        self.mode = mode
+        self.exact_max_questions = exact_max_questions
+        self.candidates = candidates
+        self.ef_search = ef_search
+        self.iterative_scan = iterative_scan
+
+    async def get_config(self, pack_id: str) -> RetrievalConfig:
+        async def load() -> RetrievalConfig:
+            pool = await get_connection_pool("agent")
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    resp = await GET_RETRIEVAL_CONFIG.execute(cur, (pack_id,))
+                    row = await resp.fetchone()
+            return RetrievalConfig.from_dict(row[0] if row else None)
+
+        return await lookup_cache.get_or_load(
+            "question_pack_retrieval_config", pack_id, load
+        )
+
+    async def set_config(self, pack_id: str, config: RetrievalConfig) -> bool:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cur = await conn.execute(
+                "UPDATE common.question_packs SET retrieval_config = %s WHERE id = %s RETURNING id",
+                (Jsonb(config.to_dict()), pack_id),
             )
-            res = await resp.fetchall()
-            return res
+            updated = await cur.fetchone() is not None
+        await lookup_cache.invalidate("question_pack_retrieval_config", pack_id)
+        return updated
+
+    async def get_pack_size(self, pack_id: str, deleted: bool = False) -> int:
+        async def load() -> Dict[bool, int]:
+            pool = await get_connection_pool("agent")
+            async with pool.connection() as conn:
+                async with conn.cursor() as cur:
+                    resp = await PACK_SIZE.execute(cur, (pack_id,))
+                    return dict(await resp.fetchall())
+
+        # decides whether a short vector stage falls back to the exact scan,
+        # writes to the questions of a pack invalidate it
+        sizes = await lookup_cache.get_or_load("question_pack_size", pack_id, load)
+        return sizes.get(deleted, 0)
+
+    async def search(
+        self,
+        pack_id: str,
+        query: str,
+        query_embedding: Optional[np.ndarray] = None,
+        top_k: Optional[int] = None,
+        deleted: bool = False,
+    ) -> List[ScoredQuestion]:
+        """Ranked question ids, `top_k` overrides the one of the pack's config."""
+        config = await self.get_config(pack_id)
+        if top_k is not None:
+            config = replace(config, top_k=top_k)
+        if query_embedding is None:
+            query_embedding = await generate_embedding(query)
+
+        size = await self.get_pack_size(pack_id, deleted)
+        mode = self.mode
+        if mode == "auto":
+            mode = "exact" if size <= self.exact_max_questions else "two_stage"
+
+        k = max(self.candidates, config.top_k)
+        params = {
+            "pack_id": pack_id,
+            "query_embedding": query_embedding,
+            "query": query,
+            "deleted": deleted,
+            "k": k,
+        }
+        pool = await get_connection_pool("agent")
+        async with pool.connection() as conn:
+            async with conn.transaction():
+                async with conn.pipeline() as pipeline:
+                    # transaction scoped, the pooled connection is left untouched
+                    await conn.execute(
+                        "SELECT set_config('hnsw.ef_search', %s, true)",
+                        (str(self.ef_search),),
+                    )
+                    if self.iterative_scan:
+                        await conn.execute(
+                            "SELECT set_config('hnsw.iterative_scan', %s, true)",
+                            (self.iterative_scan,),
+                        )
+                    vector_cur = conn.cursor(row_factory=dict_row)
+                    text_cur = conn.cursor(row_factory=dict_row)
+                    await (
+                        EXACT_VECTOR_CANDIDATES
+                        if mode == "exact"
+                        else VECTOR_CANDIDATES
+                    ).execute(vector_cur, params)
+                    await TEXT_CANDIDATES.execute(text_cur, params)
+                    await pipeline.sync()
+                    vector_candidates = await vector_cur.fetchall()
+                    text_candidates = await text_cur.fetchall()
+
+                if mode != "exact" and len(vector_candidates) < min(k, size):
+                    # the index is shared by all packs and filtered after the scan,
+                    # a small pack in a large table may come back short. Packs
+                    # with fewer than k questions are short anyway.
+                    async with conn.cursor(row_factory=dict_row) as cur:
+                        resp = await EXACT_VECTOR_CANDIDATES.execute(cur, params)
+                        vector_candidates = await resp.fetchall()
+
+        return fuse(config, vector_candidates, text_candidates)
+
+    async def retrieve(
+        self,
+        pack_id: str,
+        query: str,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[Dict[str, Any]]:
+        """Best questions of the pack with their answers, tags and additional info."""
+        ranked = await self.search(pack_id, query, query_embedding)
+        if not ranked:
+            return []
+
+        pool = await get_connection_pool("agent")
+        async with pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                resp = await QUESTION_DETAILS.execute(
+                    cur, {"ids": [r["id"] for r in ranked]}
+                )
+                details = {r["id"]: r for r in await resp.fetchall()}
+
+        return [
+            {**details[r["id"]], "similarity": r["score"]}
+            for r in ranked
+            if r["id"] in details
+        ]
+
+
+retrieval_engine = RetrievalEngine(
+    mode=os.getenv("QUESTION_RETRIEVAL_MODE", "auto"),
+    exact_max_questions=int(
+        os.getenv("QUESTION_RETRIEVAL_EXACT_MAX_QUESTIONS", "5000")
+    ),
+    candidates=int(os.getenv("QUESTION_RETRIEVAL_CANDIDATES", "100")),
+    ef_search=int(os.getenv("QUESTION_RETRIEVAL_EF_SEARCH", "200")),
+    # e.g. "relaxed_order", requires pgvector >= 0.8
+    iterative_scan=os.getenv("QUESTION_RETRIEVAL_ITERATIVE_SCAN"),
+)
+
+
+async def generate_embedding(query: str) -> np.ndarray:
+    return await embedding_cache.get_or_embed(EMBEDDING_MODEL, query, _embed)
 
 
-async def generate_embedding(query: str) -> str:
-    res = (
-        "[" + ",".join(map(lambda x: str(x), await embedding.aembed_query(query))) + "]"
-    )
-    return res
+async def _embed(query: str) -> np.ndarray:
+    # bound as a binary pgvector parameter, see jarvis.db.vector
+    return as_vector(await embedding.aembed_query(query))
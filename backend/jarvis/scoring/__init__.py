@@ -0,0 +1,3 @@
+from .faithfulness import ScoringJob, ScoringQueue, scoring_queue
+
+__all__ = ["ScoringJob", "ScoringQueue", "scoring_queue"]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+import logging
+import os
+import random
+from typing import Awaitable, Callable, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from ragas import SingleTurnSample
+from ragas.metrics import Faithfulness
+from ragas.llms import LangchainLLMWrapper
+from jarvis.queries.query_handlers import update_message_score
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+load_dotenv()
+
+
+@dataclass
+class ScoringJob:
+    message_id: str
+    chat_id: str
+    user_message: str
+    response: str
+    retrieved_contexts: list[str]
+    llm: BaseChatModel
+    on_score: Optional[Callable[[float], Awaitable]] = None
+
+
+async def calculate_faithfullness(job: ScoringJob) -> float:
+    sample = SingleTurnSample(
+        user_input=job.user_message,
+        retrieved_contexts=job.retrieved_contexts,
+        response=job.response,
+    )
+    scorer = Faithfulness(llm=LangchainLLMWrapper(job.llm))
+    score = await scorer.single_turn_ascore(sample)
+    return score * 100
+
+
+class ScoringQueue:
+    """
+    Bounded background worker pool for faithfulness scoring.
+
+    Scores are persisted to `message_history.score` and pushed through the
+    job callback once ready, so generations do not wait for the scorer.
+    """
+
+    def __init__(
+        self, concurrency: int = 2, max_size: int = 100, sample_rate: float = 1.0
+    ):
+        self.concurrency = concurrency
+        self.max_size = max_size
+        self.sample_rate = sample_rate
+        self._queue: Optional[asyncio.Queue[ScoringJob]] = None
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_size)
+        self._workers = [w for w in self._workers if not w.done()]
+        for i in range(len(self._workers), self.concurrency):
+            self._workers.append(
+                asyncio.create_task(self._worker(), name=f"faithfulness_scorer_{i}")
+            )
+
+    def submit(self, job: ScoringJob) -> bool:
+        if random.random() >= self.sample_rate:
+            logger.info(f"faithfulness scoring skipped for {job.message_id} (sampling)")
+            return False
+        self._ensure_workers()
+        assert self._queue is not None
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            logger.warning(f"scoring queue is full, dropping job for {job.message_id}")
+            return False
+        return True
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            try:
+                score = await calculate_faithfullness(job)
+                await update_message_score(job.message_id, score)
+                if job.on_score:
+                    await job.on_score(score)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.error(
+                    f"faithfulness scoring failed for {job.message_id}: {err}",
+                    exc_info=True,
+                )
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+scoring_queue = ScoringQueue(
+    concurrency=int(os.getenv("FAITHFULNESS_CONCURRENCY", "2")),
+    max_size=int(os.getenv("FAITHFULNESS_QUEUE_SIZE", "100")),
+    sample_rate=float(os.getenv("FAITHFULNESS_SAMPLE_RATE", "1.0")),
+)
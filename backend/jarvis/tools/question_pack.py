@@ -6,7 +6,7 @@ from jarvis.context.context import ToolContext
 import re
 from markdownify import markdownify as md
 
-from jarvis.question_pack.retriever import generate_embedding, retrieve
+from jarvis.question_pack.retriever import retrieval_engine
 
 
 async def question_pack_retriever(
@@ -14,10 +14,9 @@ async def question_pack_retriever(
     pack_id: str,
     ctx: Optional[Context] = None,
 ) -> Dict[str, Any]:
-    query_embedding = await generate_embedding(query)
-    res = await retrieve(pack_id, query_embedding, query)
+    res = await retrieval_engine.retrieve(pack_id, query)
     image_pattern = r'<img\s+[^>]*src=["\']([^"\']+)["\'][^>]*>'
-    resp = {"content": []}
+    resp: Dict[str, Any] = {"content": []}
     docs = []
 
     for r in res:
@@ -4,6 +4,7 @@ from dotenv import load_dotenv
 import logging
 from typing import Any, Dict, List
 from jarvis.context import Context
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import StructuredTool
 from jarvis.tools.document_pack import document_pack_retriever
 from jarvis.tools.question_pack import question_pack_retriever
@@ -14,12 +15,14 @@ logger = logging.getLogger(__name__)
 
 
 def bootstrap_tools(ctx: Context, tool_names: List[str]) -> List[StructuredTool]:
+    # tools are shared by cached agent graphs, so the chat context has to be
+    # resolved from the runnable config at invocation time
     tool_bundles = {}
 
     if top5_results is not None:
 
-        async def top5_results_partial(query: str) -> str:
-            return await top5_results(query=query, ctx=ctx)
+        async def top5_results_partial(query: str, config: RunnableConfig) -> str:
+            return await top5_results(query=query, ctx=Context.from_config(config))
 
         tool_bundles["Google Search"] = [
             {
@@ -34,8 +37,11 @@ def bootstrap_tools(ctx: Context, tool_names: List[str]) -> List[StructuredTool]
         tool_name = "Question-Pack-Retriever"
         tool_index_name = "Question Pack Retriever"
 
-        async def question_pack_retriever_partial(query: str) -> Dict[str, Any]:
-            return await question_pack_retriever(query, ctx.question_pack["id"], ctx)  # type: ignore
+        async def question_pack_retriever_partial(
+            query: str, config: RunnableConfig
+        ) -> Dict[str, Any]:
+            run_ctx = Context.from_config(config)
+            return await question_pack_retriever(query, run_ctx.question_pack["id"], run_ctx)  # type: ignore
 
         question_pack_retriever_partial.__doc__ = f"""
         Retrieves the most relevant question-answer pairs from a specified question pack 
@@ -74,8 +80,11 @@ def bootstrap_tools(ctx: Context, tool_names: List[str]) -> List[StructuredTool]
         tool_name = "Document-Pack-Retriever"
         tool_index_name = "Document Pack Retriever"
 
-        async def document_pack_retriever_partial(query: str) -> Dict[str, Any]:
-            return await document_pack_retriever(query, ctx.document_pack["id"], ctx)
+        async def document_pack_retriever_partial(
+            query: str, config: RunnableConfig
+        ) -> Dict[str, Any]:
+            run_ctx = Context.from_config(config)
+            return await document_pack_retriever(query, run_ctx.document_pack["id"], run_ctx)  # type: ignore
 
         document_pack_retriever_partial.__doc__ = f"""
         Retrieves the most relevant document passages from a specified document pack  
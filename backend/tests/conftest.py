@@ -0,0 +1,19 @@
+import os
+import pytest_asyncio
+
+# tests that need Postgres are skipped unless a disposable database is configured,
+# the migrations are applied to it
+TEST_DB_URI = os.getenv("TEST_DB_URI")
+if TEST_DB_URI:
+    # jarvis.db.db reads DB_URI on import
+    os.environ["DB_URI"] = TEST_DB_URI
+
+
+@pytest_asyncio.fixture(scope="session")
+async def db_uri():
+    from jarvis.db.db import close_connection_pool
+    from jarvis.db.migrations import run_migrations
+
+    await run_migrations()
+    yield TEST_DB_URI
+    await close_connection_pool()
@@ -0,0 +1,143 @@
+import os
+from typing import Any, Dict, Set
+import psycopg
+import pytest
+import pytest_asyncio
+
+if not os.getenv("TEST_DB_URI"):
+    pytest.skip("TEST_DB_URI is not set", allow_module_level=True)
+
+from jarvis.api.routers.chat import GET_ALL_USER_CHATS, GET_CHAT_MESSAGES
+from jarvis.api.routers.doc import GET_USER_DOCS
+from jarvis.api.routers.personality import GET_USER_PERSONALITIES
+from jarvis.api.routers.question_pack import question_listing_queries
+
+pytestmark = pytest.mark.asyncio
+
+PACK_ID = "00000000-0000-0000-0000-000000000001"
+CHAT_ID = "00000000-0000-0000-0000-000000000002"
+
+# enough rows per table that the planner prefers the listing indexes over a
+# sequential scan
+SEED = f"""
+INSERT INTO common.chat_history (id, owner_email, allow_list, deleted, updated_at)
+SELECT gen_random_uuid(), 'user-' || (i % 1000), '{{}}', i % 10 = 0, now() - i * interval '1 minute'
+FROM generate_series(1, 20000) i;
+INSERT INTO common.chat_history (id, owner_email, allow_list) VALUES ('{CHAT_ID}', 'user-1', '{{}}');
+
+INSERT INTO common.document_repo (document_id, document_name, owner, deleted, updated_at)
+SELECT gen_random_uuid(), 'doc', 'user-' || (i % 1000), i % 10 = 0, now() - i * interval '1 minute'
+FROM generate_series(1, 20000) i;
+
+INSERT INTO common.personalities (id, owner, name, description, instructions, deleted, updated_at)
+SELECT gen_random_uuid(), 'user-' || (i % 1000), 'p', 'd', 'i', i % 10 = 0, now() - i * interval '1 minute'
+FROM generate_series(1, 20000) i;
+
+INSERT INTO common.question_packs (id, owner, name, description)
+SELECT gen_random_uuid(), 'user-' || i, 'p', 'd'
+FROM generate_series(1, 19) i;
+INSERT INTO common.question_packs (id, owner, name, description) VALUES ('{PACK_ID}', 'user-1', 'p', 'd');
+
+INSERT INTO common.question_pairs (id, pack_id, question, answer, updated_by, updated_at)
+SELECT gen_random_uuid(), p.id, 'q', 'a', 'user-1', now() - i * interval '1 minute'
+FROM (SELECT id FROM common.question_packs ORDER BY id LIMIT 20) p, generate_series(1, 2000) i;
+INSERT INTO common.question_tags (id, question_id, tag, pack_id)
+SELECT gen_random_uuid(), id, 'tag-' || ((row_number() OVER () + i) % 5), pack_id
+FROM common.question_pairs, generate_series(1, 3) i;
+INSERT INTO common.question_additional_info (id, question_id, key, value, pack_id)
+SELECT gen_random_uuid(), id, 'key-' || i, 'value-' || (row_number() OVER () % 5), pack_id
+FROM common.question_pairs, generate_series(1, 3) i;
+
+INSERT INTO common.message_history (id, chat_id, role, created_at)
+SELECT gen_random_uuid(), c.id, 'user', now() - i * interval '1 second'
+FROM (SELECT id FROM common.chat_history ORDER BY id LIMIT 1000) c, generate_series(1, 40) i;
+"""
+
+SEEDED_TABLES = (
+    "chat_history",
+    "document_repo",
+    "personalities",
+    "question_packs",
+    "question_pairs",
+    "question_tags",
+    "question_additional_info",
+    "message_history",
+)
+
+QUESTION_PARAMS = {
+    "deleted": False,
+    "question_pack_id": PACK_ID,
+    "limit": 11,
+    "offset": 0,
+}
+
+
+@pytest_asyncio.fixture(scope="module")
+async def seeded(db_uri):
+    # seeded and analyzed in one transaction that is rolled back afterwards
+    async with await psycopg.AsyncConnection.connect(db_uri) as conn:
+        await conn.execute(SEED)
+        for table in SEEDED_TABLES:
+            await conn.execute(f"ANALYZE common.{table}")
+        yield conn
+        await conn.rollback()
+
+
+async def plan_indexes(
+    conn: psycopg.AsyncConnection, query: str, params: Dict[str, Any]
+) -> Set[str]:
+    cur = await conn.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+    plan = (await cur.fetchone())[0][0]["Plan"]
+    names: Set[str] = set()
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return names
+
+
+@pytest.mark.parametrize(
+    "query, params, index",
+    [
+        pytest.param(
+            GET_ALL_USER_CHATS.sql,
+            {"user_id": "user-1", "deleted": False},
+            "chat_history_owner_listing_index",
+            id="chats",
+        ),
+        pytest.param(
+            GET_USER_DOCS.sql,
+            {"user_id": "user-1", "deleted": False},
+            "document_repo_owner_listing_index",
+            id="documents",
+        ),
+        pytest.param(
+            GET_USER_PERSONALITIES.sql,
+            {"user_id": "user-1"},
+            "personalities_owner_active_index",
+            id="personalities",
+        ),
+        pytest.param(
+            question_listing_queries(tags=True)[0],
+            {**QUESTION_PARAMS, "tags": ["tag-1"]},
+            "question_tags_question_index",
+            id="questions_by_tag",
+        ),
+        pytest.param(
+            question_listing_queries(additional_info=1)[0],
+            {**QUESTION_PARAMS, "key0": "key-1", "value0": ["value-1"]},
+            "question_additional_info_question_index",
+            id="questions_by_additional_info",
+        ),
+        pytest.param(
+            GET_CHAT_MESSAGES.sql,
+            {"chat_id": CHAT_ID},
+            "message_history_chat_created_index",
+            id="messages",
+        ),
+    ],
+)
+async def test_listing_uses_index(seeded, query, params, index):
+    assert index in await plan_indexes(seeded, query, params)
@@ -0,0 +1,92 @@
+import asyncio
+import os
+from uuid import uuid4
+import pytest
+import pytest_asyncio
+
+if not os.getenv("TEST_DB_URI"):
+    pytest.skip("TEST_DB_URI is not set", allow_module_level=True)
+
+from jarvis.namespaces.postgres_manager import AsyncPostgresManager
+
+pytestmark = pytest.mark.asyncio
+
+
+class RecordingManager(AsyncPostgresManager):
+    """Records the emits it would deliver to its local clients."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received: asyncio.Queue = asyncio.Queue()
+
+    async def _handle_emit(self, message):
+        await self.received.put(message)
+
+
+async def _next(manager: RecordingManager, event: str) -> dict:
+    while True:
+        message = await asyncio.wait_for(manager.received.get(), timeout=5)
+        if message["event"] == event:
+            return message
+
+
+@pytest_asyncio.fixture
+async def managers(db_uri):
+    channel = f"socketio_test_{uuid4().hex}"
+    sender = RecordingManager(db_uri, channel=channel, max_payload=200)
+    receiver = RecordingManager(db_uri, channel=channel, max_payload=200)
+    listener = asyncio.create_task(receiver._thread())
+
+    # LISTEN is issued in the background, emit until the receiver is subscribed
+    for _ in range(50):
+        await sender.emit("ready", {})
+        try:
+            await asyncio.wait_for(_next(receiver, "ready"), timeout=0.1)
+            break
+        except asyncio.TimeoutError:
+            continue
+    else:
+        pytest.fail("receiver did not subscribe to the channel")
+
+    yield sender, receiver
+
+    listener.cancel()
+    await asyncio.gather(listener, return_exceptions=True)
+    await sender.close()
+    await receiver.close()
+
+
+async def test_room_emit_reaches_other_manager(managers):
+    sender, receiver = managers
+
+    await sender.emit("server_message", {"id": "1"}, room="chat", skip_sid="sid")
+
+    message = await _next(receiver, "server_message")
+    assert message["room"] == "chat"
+    assert message["skip_sid"] == "sid"
+    assert message["data"] == {"id": "1"}
+    assert message["host_id"] == sender.host_id
+    # the sender delivers locally and ignores its own notification
+    assert (await _next(sender, "server_message"))["host_id"] == sender.host_id
+    assert sender.received.empty()
+
+
+async def test_large_payload_is_spilled(managers, db_uri):
+    sender, receiver = managers
+    data = {"text": "x" * 1000}
+
+    await sender.emit("server_message", data, room="chat")
+
+    message = await _next(receiver, "server_message")
+    assert message["data"] == data
+    assert message["room"] == "chat"
+
+    from jarvis.db.db import get_connection_pool
+
+    pool = await get_connection_pool("background")
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            "SELECT count(*) FROM common.socketio_payloads WHERE payload LIKE %s",
+            (f"%{sender.host_id}%",),
+        )
+        assert (await cur.fetchone())[0] == 1
@@ -231,6 +231,20 @@ export function useSocketHandlers(
       });
     });
 
+    socket.on(
+      "message_score",
+      (resp: { id: string; chatId: string; score: number }) => {
+        if (resp.chatId !== id) {
+          return;
+        }
+        setMessages((currentMessages) =>
+          (currentMessages || []).map((m) =>
+            m.id === resp.id ? { ...m, score: resp.score } : m
+          )
+        );
+      }
+    );
+
     socket.on("chat_broadcast", (msg: Message) => {
       dispatch({
         type: "UPDATE_CHAT_STATUS",
@@ -242,6 +256,7 @@ export function useSocketHandlers(
     });
     return () => {
       socket.off("server_message");
+      socket.off("message_score");
       socket.off("chat_broadcast");
       socket.off("autogen_chat_title");
     };